@@ -1,44 +1,327 @@
+import asyncio
+import functools
 import hashlib
 import inspect
-from collections.abc import Callable
-from datetime import timedelta
+import threading
+import weakref
+from collections.abc import Callable, Iterator, Mapping
 from pathlib import Path
-from typing import Any, ParamSpec, TypeVar
+from types import CodeType
+from typing import Any, NamedTuple, ParamSpec, TypeVar
 
 from cachetools import LRUCache, TLRUCache, TTLCache, cached
-from langutil_infra.cache import TTICache
+from langutil_infra import stats
+from langutil_infra.cache import ShardedCache, TTICache
+from langutil_infra.disk import DiskCache, TieredCache
+from langutil_infra.stats import instrumented
 
 CacheLike = (
-    LRUCache[Any, Any] | TLRUCache[Any, Any] | TTLCache[Any, Any] | TTICache[Any, Any]
+    LRUCache[Any, Any]
+    | TLRUCache[Any, Any]
+    | TTLCache[Any, Any]
+    | TTICache[Any, Any]
+    | ShardedCache[Any, Any]
+    | TieredCache[Any, Any]
 )
 
 
-def _ttu(_key: Any, _value: Any, now: float) -> float:
-    return now + timedelta(hours=6).total_seconds()
+class CacheEntry(NamedTuple):
+    fingerprint: str
+    name: str
+    cache: CacheLike
+    budget: int | None
 
 
-cache_set = TLRUCache(maxsize=1024, ttu=_ttu)
+class CacheRegistry(Mapping[str, CacheLike]):
+    """Registry of the caches created by ``lfx_cache``, keyed by fingerprint.
+
+    Registered caches are never evicted behind a live function's back. Each
+    function name keeps at most ``max_versions`` fingerprints: beyond that,
+    the oldest versions whose functions have all been garbage collected are
+    dropped, when registering a newer one or when a function is collected.
+    Versions still in use are only dropped by ``drop`` or ``invalidate``. A
+    cache may not be larger than its budget, which defaults to
+    ``default_budget``.
+    """
+
+    def __init__(
+        self, max_versions: int = 4, default_budget: int | None = None
+    ) -> None:
+        self.max_versions = max_versions
+        self.default_budget = default_budget
+        self.__entries: dict[str, CacheEntry] = {}
+        self.__versions: dict[str, list[str]] = {}
+        self.__owners: dict[str, weakref.WeakSet[Any]] = {}
+        self.__lock = threading.RLock()
+
+    def __getitem__(self, fingerprint: str) -> CacheLike:
+        return self.__entries[fingerprint].cache
+
+    def __delitem__(self, fingerprint: str) -> None:
+        if not self.drop(fingerprint):
+            raise KeyError(fingerprint)
+
+    def __iter__(self) -> Iterator[str]:
+        with self.__lock:
+            return iter(list(self.__entries))
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def register(
+        self,
+        fingerprint: str,
+        factory: Callable[[], CacheLike],
+        name: str,
+        budget: int | None = None,
+        owner: Callable[..., Any] | None = None,
+    ) -> CacheLike:
+        """Return the cache registered for ``fingerprint``, creating it with
+        ``factory`` if needed. The version stays registered while ``owner``,
+        the function using it, is alive."""
+        with self.__lock:
+            entry = self.__entries.get(fingerprint)
+            if entry is not None:
+                self.__own(fingerprint, owner)
+                return entry.cache
+
+            budget = self.default_budget if budget is None else budget
+            cache = factory()
+            if budget is not None:
+                maxsize = getattr(cache, "maxsize", None)
+                if maxsize is None or maxsize > budget:
+                    raise ValueError(
+                        f"Cache for {name} has maxsize {maxsize}, "
+                        f"which exceeds its budget of {budget}."
+                    )
+
+            self.__entries[fingerprint] = CacheEntry(fingerprint, name, cache, budget)
+            self.__versions.setdefault(name, []).append(fingerprint)
+            self.__own(fingerprint, owner)
+            self.__prune(name)
+            return cache
+
+    def entries(self, name: str | None = None) -> list[CacheEntry]:
+        """List the registered caches, optionally only those of ``name``."""
+        with self.__lock:
+            return [e for e in self.__entries.values() if name in (None, e.name)]
+
+    def drop(self, fingerprint: str) -> bool:
+        """Unregister and clear the cache of ``fingerprint``."""
+        with self.__lock:
+            entry = self.__entries.pop(fingerprint, None)
+            if entry is None:
+                return False
+            versions = self.__versions[entry.name]
+            versions.remove(fingerprint)
+            if not versions:
+                del self.__versions[entry.name]
+            self.__owners.pop(fingerprint, None)
+        entry.cache.clear()
+        stats.discard(fingerprint)
+        return True
+
+    def invalidate(self, name: str, keep: str | None = None) -> int:
+        """Drop every cache registered for ``name`` except ``keep``, e.g. after
+        the component's source changed. Returns the number of caches dropped."""
+        with self.__lock:
+            stale = [f for f in self.__versions.get(name, ()) if f != keep]
+            for fingerprint in stale:
+                self.drop(fingerprint)
+            return len(stale)
+
+    def clear(self) -> None:
+        with self.__lock:
+            for fingerprint in list(self.__entries):
+                self.drop(fingerprint)
+
+    def __own(self, fingerprint: str, owner: Callable[..., Any] | None) -> None:
+        if owner is None:
+            return
+        owners = self.__owners.setdefault(fingerprint, weakref.WeakSet())
+        try:
+            if owner in owners:
+                return
+            owners.add(owner)
+        except TypeError:
+            return  # not weak-referenceable: never pins its version
+        weakref.finalize(owner, self.__collected, self.__entries[fingerprint].name)
+
+    def __collected(self, name: str) -> None:
+        with self.__lock:
+            self.__prune(name)
+
+    def __prune(self, name: str) -> None:
+        """Drop the oldest unused versions of ``name`` beyond ``max_versions``."""
+        versions = self.__versions.get(name, [])
+        excess = len(versions) - self.max_versions
+        for fingerprint in list(versions):
+            if excess <= 0:
+                break
+            # Iterating skips owners already collected but not yet removed
+            if not any(True for _ in self.__owners.get(fingerprint, ())):
+                self.drop(fingerprint)
+                excess -= 1
+
+
+cache_set = CacheRegistry()
 
 R = TypeVar("R")
 P = ParamSpec("P")
 
 
-def lfx_cache(cache_factory: Callable[[], CacheLike], key: Callable[..., int]):
+def lfx_cache(
+    cache_factory: Callable[[], CacheLike],
+    key: Callable[..., int],
+    *,
+    concurrent: bool = False,
+    shards: int = 16,
+    budget: int | None = None,
+    persist: str | Path | None = None,
+):
+    """Cache ``function`` results in a cache shared by every decoration of the
+    same source code.
+
+    With ``concurrent=True`` the cache is a ``ShardedCache`` of ``shards``
+    caches built by ``cache_factory`` (size limits apply per shard), safe to
+    use from many threads, and concurrent misses of one key run ``function``
+    only once.
+
+    Coroutine functions cache their awaited result; concurrent awaiters of the
+    same key share one task, and failures are not cached.
+
+    The cache is registered in ``cache_set`` under the function's fingerprint,
+    with an optional ``budget`` capping its ``maxsize``. Its hit/miss stats are
+    exported by ``langutil_infra.stats.snapshot()`` under the same fingerprint.
+
+    With ``persist`` set to a SQLite file path, the in-memory cache (all its
+    shards) is backed by one ``DiskCache`` namespaced by the fingerprint, so results survive
+    restarts and a code change starts from an empty namespace. The disk level
+    follows the TTL/TTI of the in-memory cache. Keys must then be stable
+    across processes (``hash()`` of a ``str`` is not).
+    """
+
     def decorator(function: Callable[P, R]) -> Callable[P, R]:
         module = _make_module_fingerprint(function)
-        if module not in cache_set:
-            cache_set[module] = cache_factory()
-        cache = cache_set[module]
-        return cached(cache=cache, key=key)(function)
+        factory = cache_factory
+        if concurrent:
+            factory = functools.partial(ShardedCache, cache_factory, shards)
+        if persist is not None:
+            # One disk namespace behind the whole front, sharded or not
+            factory = functools.partial(_persistent, factory, persist, module)
+        cache = cache_set.register(
+            module,
+            factory,
+            name=f"{function.__module__}.{function.__qualname__}",
+            budget=budget,
+            owner=function,
+        )
+        if inspect.iscoroutinefunction(function):
+            decorate = _async_cached(cache, key)
+        elif concurrent:
+            decorate = _single_flight(cache, key)
+        else:
+            decorate = cached(cache=cache, key=key)
+        return instrumented(module, cache, decorate)(function)
 
     return decorator
 
 
-def _make_module_fingerprint(fn: Callable[..., Any]):
-    module = inspect.getmodule(fn)
-    file_path = getattr(module, "__file__", None)
+def _persistent(
+    cache_factory: Callable[[], CacheLike], path: str | Path, namespace: str
+) -> TieredCache[Any, Any]:
+    front = cache_factory()
+    level = front.shards[0] if isinstance(front, ShardedCache) else front
+    ttl = getattr(level, "ttl", None)
+    back = DiskCache(
+        path, namespace=namespace, ttl=ttl, tti=isinstance(level, TTICache)
+    )
+    return TieredCache(front, back)
+
 
-    if file_path and Path(file_path).exists():
+def _single_flight(
+    cache: ShardedCache[Any, Any] | TieredCache[Any, Any], key: Callable[..., Any]
+):
+    def decorator(function: Callable[P, R]) -> Callable[P, R]:
+        @functools.wraps(function)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            return cache.get_or_compute(
+                key(*args, **kwargs), lambda: function(*args, **kwargs)
+            )
+
+        wrapper.cache = cache  # type: ignore[attr-defined]
+        wrapper.cache_key = key  # type: ignore[attr-defined]
+        wrapper.cache_clear = cache.clear  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
+
+
+def _async_cached(cache: CacheLike, key: Callable[..., Any]):
+    def decorator(function: Callable[P, Any]) -> Callable[P, Any]:
+        pending: dict[Any, asyncio.Task[Any]] = {}
+
+        async def fill(k: Any, *args: P.args, **kwargs: P.kwargs) -> Any:
+            try:
+                value = await function(*args, **kwargs)
+                try:
+                    cache[k] = value
+                except ValueError:
+                    pass  # value too large
+                return value
+            finally:
+                if pending.get(k) is asyncio.current_task():
+                    del pending[k]
+
+        @functools.wraps(function)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> Any:
+            k = key(*args, **kwargs)
+            try:
+                return cache[k]
+            except KeyError:
+                pass  # key not found
+            task = pending.get(k)
+            if task is None or task.get_loop() is not asyncio.get_running_loop():
+                task = pending[k] = asyncio.ensure_future(fill(k, *args, **kwargs))
+            # Shield the shared task so one cancelled awaiter does not cancel it
+            # for everyone else.
+            return await asyncio.shield(task)
+
+        wrapper.cache = cache  # type: ignore[attr-defined]
+        wrapper.cache_key = key  # type: ignore[attr-defined]
+        wrapper.cache_clear = cache.clear  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
+
+
+_fingerprints: LRUCache[tuple[Any, ...], str] = LRUCache(maxsize=4096)
+_fingerprints_lock = threading.Lock()
+
+
+def _make_module_fingerprint(fn: Callable[..., Any]) -> str:
+    code = getattr(fn, "__code__", None)
+    if not isinstance(code, CodeType):
+        return hashlib.sha256(repr(fn).encode()).hexdigest()
+
+    # Memoized per code object and source file mtime, so re-decorating the same
+    # code costs one stat() instead of reading and hashing the source again.
+    try:
+        mtime = Path(code.co_filename).stat().st_mtime_ns
+    except OSError:
+        mtime = None
+    memo_key = (code, fn.__qualname__, code.co_filename, mtime)
+    with _fingerprints_lock:
+        fingerprint = _fingerprints.get(memo_key)
+    if fingerprint is None:
+        fingerprint = _compute_fingerprint(fn, code, has_source=mtime is not None)
+        with _fingerprints_lock:
+            _fingerprints[memo_key] = fingerprint
+    return fingerprint
+
+
+def _compute_fingerprint(fn: Callable[..., Any], code: CodeType, has_source: bool):
+    if has_source:
         try:
             source_content = inspect.getsource(fn).encode("utf-8")
             return hashlib.sha256(source_content).hexdigest()
@@ -47,15 +330,19 @@ def _make_module_fingerprint(fn: Callable[..., Any]):
 
     # NOTE: Code dynamically created via exec/eval does not have accessible source code text.
     # Therefore, we use a hash based on the bytecode and other attributes to robustly identify functions.
-    try:
-        code = fn.__code__
-        features = [
-            code.co_code,
-            str(code.co_consts),
-            str(code.co_names),
-            fn.__qualname__,
-        ]
-        fingerprint = "|".join(map(str, features)).encode("utf-8")
-        return hashlib.sha256(fingerprint).hexdigest()
-    except Exception:
-        return hashlib.sha256(repr(fn).encode()).hexdigest()
+    h = hashlib.sha256(fn.__qualname__.encode())
+    _hash_code(h, code)
+    return h.hexdigest()
+
+
+def _hash_code(h: Any, code: CodeType) -> None:
+    h.update(code.co_code)
+    h.update("|".join(code.co_names).encode())
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            # str() of a nested code object contains its memory address
+            _hash_code(h, const)
+        elif isinstance(const, frozenset):
+            h.update(repr(sorted(map(repr, const))).encode())
+        else:
+            h.update(repr(const).encode())
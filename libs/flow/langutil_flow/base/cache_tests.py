@@ -1,9 +1,19 @@
+import asyncio
+import gc
+import inspect
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import Any
 
 import pytest
 from cachetools import LRUCache, TTLCache
+from langutil_infra import stats
+from langutil_infra.cache import TTICache
+from langutil_infra.disk import DiskCache
 
-from .cache import cache_set, lfx_cache
+from .cache import CacheRegistry, _make_module_fingerprint, cache_set, lfx_cache
 
 
 @pytest.fixture(autouse=True)
@@ -105,3 +115,299 @@ def test_ttl():
 
     assert f(3) == 6
     assert f(3) == 6
+
+
+def test_concurrent_single_flight():
+    call_count = 0
+
+    @lfx_cache(
+        cache_factory=lambda: LRUCache(maxsize=64), key=lambda x: x, concurrent=True
+    )
+    def slow(_x: int) -> object:
+        nonlocal call_count
+        call_count += 1
+        time.sleep(0.1)
+        return object()
+
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        results = list(executor.map(slow, [1] * 64))
+
+    assert call_count == 1
+    assert all(r is results[0] for r in results)
+
+
+def test_concurrent_stress():
+    calls: dict[int, int] = {}
+    lock = threading.Lock()
+
+    @lfx_cache(
+        cache_factory=lambda: TTICache(maxsize=1024, ttl=60),
+        key=lambda x: x,
+        concurrent=True,
+        shards=8,
+    )
+    def compute(x: int) -> int:
+        with lock:
+            calls[x] = calls.get(x, 0) + 1
+        time.sleep(0.001)
+        return x * x
+
+    keys = [i % 100 for i in range(5000)]
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        results = list(executor.map(compute, keys))
+
+    assert results == [k * k for k in keys]
+    assert calls == dict.fromkeys(range(100), 1)
+    assert len(compute.cache) == 100
+
+
+def test_concurrent_failure_not_cached():
+    call_count = 0
+
+    @lfx_cache(
+        cache_factory=lambda: LRUCache(maxsize=8), key=lambda x: x, concurrent=True
+    )
+    def flaky(x: int) -> int:
+        nonlocal call_count
+        call_count += 1
+        if call_count == 1:
+            raise RuntimeError("boom")
+        return x
+
+    with pytest.raises(RuntimeError):
+        flaky(1)
+    assert flaky(1) == 1
+    assert flaky(1) == 1
+    assert call_count == 2
+
+
+def test_async():
+    call_count = 0
+
+    @lfx_cache(cache_factory=lambda: LRUCache(maxsize=64), key=lambda x: x)
+    async def f(x: int) -> int:
+        nonlocal call_count
+        call_count += 1
+        await asyncio.sleep(0.05)
+        return x * 2
+
+    async def main():
+        results = await asyncio.gather(*(f(3) for _ in range(16)))
+        assert results == [6] * 16
+        assert await f(3) == 6
+        assert await f(4) == 8
+
+    asyncio.run(main())
+    assert call_count == 2
+
+
+@pytest.mark.parametrize(
+    "cache_factory",
+    [
+        lambda: TTICache(maxsize=64, ttl=60),
+        lambda: TTLCache(maxsize=64, ttl=60),
+    ],
+)
+def test_async_failure_not_cached(cache_factory: Any):
+    call_count = 0
+
+    @lfx_cache(cache_factory=cache_factory, key=lambda x: x)
+    async def flaky(x: int) -> int:
+        nonlocal call_count
+        call_count += 1
+        await asyncio.sleep(0.01)
+        if call_count == 1:
+            raise RuntimeError("boom")
+        return x
+
+    async def main():
+        results = await asyncio.gather(
+            *(flaky(1) for _ in range(4)), return_exceptions=True
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert await flaky(1) == 1
+        assert await flaky(1) == 1
+
+    asyncio.run(main())
+    assert call_count == 2
+
+
+_COMPONENT_SOURCE = """
+def build(x):
+    return [(lambda y: y in {"a", "b"})(x), VERSION]
+"""
+
+
+def _exec_component(version: int):
+    ns: dict[str, Any] = {"__name__": "lfx.component", "VERSION": version}
+    exec(_COMPONENT_SOURCE.replace("VERSION", str(version)), ns)
+    return ns["build"]
+
+
+def test_fingerprint_stable_for_exec_code():
+    a = _make_module_fingerprint(_exec_component(1))
+    b = _make_module_fingerprint(_exec_component(1))
+    c = _make_module_fingerprint(_exec_component(2))
+    assert a == b
+    assert a != c
+
+
+def test_registry_versions():
+    registry = CacheRegistry(max_versions=2)
+    for version in range(3):
+        registry.register(
+            f"fp{version}", lambda: LRUCache(maxsize=8), name="lfx.component.build"
+        )
+
+    assert list(registry) == ["fp1", "fp2"]
+    assert [e.fingerprint for e in registry.entries("lfx.component.build")] == [
+        "fp1",
+        "fp2",
+    ]
+    assert registry.invalidate("lfx.component.build", keep="fp2") == 1
+    assert list(registry) == ["fp2"]
+    assert registry.drop("fp2")
+    assert not registry.drop("fp2")
+    assert len(registry) == 0
+
+
+def test_registry_budget():
+    registry = CacheRegistry(default_budget=16)
+    registry.register("small", lambda: LRUCache(maxsize=16), name="small")
+    with pytest.raises(ValueError):
+        registry.register("large", lambda: LRUCache(maxsize=17), name="large")
+    cache = registry.register(
+        "large", lambda: LRUCache(maxsize=64), name="large", budget=64
+    )
+    assert cache.maxsize == 64
+
+
+def test_registry_drop_clears_cache():
+    @lfx_cache(cache_factory=lambda: LRUCache(maxsize=8), key=lambda x: x)
+    def f(x: int) -> int:
+        return x
+
+    f(1)
+    [entry] = cache_set.entries(f"{__name__}.{f.__qualname__}")
+    assert len(entry.cache) == 1
+    cache_set.invalidate(entry.name)
+    assert len(entry.cache) == 0
+    assert entry.fingerprint not in cache_set
+
+
+def test_persist(tmp_path: Path):
+    path = tmp_path / "lfx.db"
+    call_count = 0
+
+    @lfx_cache(
+        cache_factory=lambda: TTICache(maxsize=8, ttl=60),
+        key=lambda x: x,
+        persist=path,
+    )
+    def f(x: int) -> int:
+        nonlocal call_count
+        call_count += 1
+        return x * 2
+
+    assert f(2) == 4
+    assert f(2) == 4
+    assert call_count == 1
+
+    # Simulate a restart: the in-memory level is gone, the disk level is not.
+    f.cache.front.clear()
+    assert f(2) == 4
+    assert call_count == 1
+
+    namespace = _make_module_fingerprint(inspect.unwrap(f))
+    assert DiskCache(path, namespace=namespace)[2] == 4
+    assert 2 not in DiskCache(path, namespace="stale-fingerprint")
+
+
+def test_stats():
+    @lfx_cache(cache_factory=lambda: LRUCache(maxsize=8), key=lambda x: x)
+    def tracked(x: int) -> int:
+        return x
+
+    tracked(1)
+    tracked(1)
+    tracked(2)
+    fingerprint = _make_module_fingerprint(inspect.unwrap(tracked))
+    snapshot = stats.snapshot()[fingerprint]
+    assert snapshot["hits"] == 1
+    assert snapshot["misses"] == 2
+    assert snapshot["size"] == 2
+
+
+def test_registry_keeps_live_versions():
+    registry = CacheRegistry(max_versions=2)
+    live = [_exec_component(version) for version in range(5)]
+    for version, fn in enumerate(live):
+        registry.register(
+            f"fp{version}",
+            lambda: LRUCache(maxsize=8),
+            name="lfx.component.build",
+            owner=fn,
+        )
+    # Every version is still in use, so none is dropped
+    assert list(registry) == [f"fp{version}" for version in range(5)]
+    registry["fp0"][1] = 1
+
+    del live[1:4]
+    gc.collect()
+    assert list(registry) == ["fp0", "fp4"]
+    assert registry["fp0"][1] == 1
+
+    registry.register("fp5", lambda: LRUCache(maxsize=8), name="lfx.component.build")
+    assert list(registry) == ["fp0", "fp4"]
+
+
+def test_same_qualname_components_keep_their_caches():
+    builds = [_exec_component(version) for version in range(5)]
+    cached_builds = [
+        lfx_cache(cache_factory=lambda: LRUCache(maxsize=8), key=lambda x: x)(build)
+        for build in builds
+    ]
+    assert cached_builds[0](1) == cached_builds[0](1)
+    assert len(cached_builds[0].cache) == 1
+    assert len(cache_set.entries("lfx.component.build")) == 5
+
+
+def test_persist_concurrent(tmp_path: Path):
+    call_count = 0
+
+    @lfx_cache(
+        cache_factory=lambda: TTICache(maxsize=8, ttl=60),
+        key=lambda x: x,
+        concurrent=True,
+        persist=tmp_path / "lfx.db",
+    )
+    def f(x: int) -> int:
+        nonlocal call_count
+        call_count += 1
+        time.sleep(0.05)
+        return x * 2
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert list(executor.map(f, [1] * 8)) == [2] * 8
+    assert call_count == 1
+    f(2)
+    f(3)
+
+    # One disk level behind all the shards
+    assert len(f.cache) == 3
+    assert sorted(f.cache) == [1, 2, 3]
+    f.cache.front.clear()
+    assert f(3) == 6
+    assert call_count == 3
+
+
+def test_registry_drop_removes_stats():
+    @lfx_cache(cache_factory=lambda: LRUCache(maxsize=8), key=lambda x: x)
+    def f(x: int) -> int:
+        return x
+
+    f(1)
+    fingerprint = _make_module_fingerprint(inspect.unwrap(f))
+    assert fingerprint in stats.snapshot()
+    cache_set.drop(fingerprint)
+    assert fingerprint not in stats.snapshot()
@@ -1,8 +1,17 @@
 import json
+import threading
+from collections.abc import Iterator
+from itertools import batched
+from typing import Any
 
 import jq
+import orjson
+import pandas as pd
+from cachetools import LRUCache
+from langutil_infra.stats import cached
+from langutil_llm.jsonparse import parse_json
 from lfx.custom.custom_component.component import Component
-from lfx.inputs.inputs import HandleInput, MessageTextInput
+from lfx.inputs.inputs import BoolInput, HandleInput, IntInput, MessageTextInput
 from lfx.io import Output
 from lfx.log.logger import logger
 from lfx.schema.data import Data
@@ -10,6 +19,52 @@ from lfx.schema.dataframe import DataFrame
 from lfx.schema.message import Message
 
 
+@cached(
+    LRUCache(maxsize=256),
+    key=lambda query: query,
+    lock=threading.Lock(),
+    name="langutil_flow.jq.compile",
+)
+def compile_query(query: str) -> Any:
+    """Compile a JQ expression, sharing compiled programs process-wide."""
+    return jq.compile(query)
+
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+def iter_json_records(text: str) -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array, or the values of NDJSON
+    lines, decoding one record at a time."""
+    i = len(text) - len(text.lstrip(_WHITESPACE))
+    if not text.startswith("[", i):
+        start = i
+        while start < len(text):
+            end = text.find("\n", start)
+            end = len(text) if end == -1 else end
+            line = text[start:end].strip(_WHITESPACE)
+            if line:
+                yield orjson.loads(line)
+            start = end + 1
+        return
+
+    i += 1
+    while True:
+        while i < len(text) and text[i] in _WHITESPACE:
+            i += 1
+        if text.startswith("]", i):
+            return
+        record, i = _decoder.raw_decode(text, i)
+        yield record
+        while i < len(text) and text[i] in _WHITESPACE:
+            i += 1
+        if text.startswith(",", i):
+            i += 1
+        elif not text.startswith("]", i):
+            raise ValueError(f"Expected ',' or ']' at position {i} of the JSON array.")
+
+
 class JQComponentMixin(Component):
     name = "JQ"
     display_name = "JQ JSON Query"
@@ -32,6 +87,20 @@ class JQComponentMixin(Component):
             placeholder="e.g., .properties.id",
             required=True,
         ),
+        BoolInput(
+            name="stream",
+            display_name="Stream Records",
+            info="Apply the expression to each element of a top-level JSON array or each NDJSON line, without loading the whole input. Use for large inputs.",
+            value=False,
+            advanced=True,
+        ),
+        IntInput(
+            name="chunk_size",
+            display_name="DataFrame Chunk Size",
+            info="Number of streamed results converted to a DataFrame at a time.",
+            value=10000,
+            advanced=True,
+        ),
     ]
 
     outputs = [
@@ -42,7 +111,7 @@ class JQComponentMixin(Component):
     ]
 
     def build_data(self) -> Data:
-        result = self.json_query()
+        result = self.stream_query_all() if self.stream else self.json_query()
         data = (
             Data(data=result)
             if isinstance(result, dict)
@@ -52,6 +121,22 @@ class JQComponentMixin(Component):
         return data
 
     def build_dataframe(self) -> DataFrame:
+        """Build the query result as a DataFrame.
+
+        In streaming mode the input is parsed and queried one record at a time
+        and converted in chunks of ``chunk_size`` rows, but the output is still
+        a single DataFrame: streaming bounds the parse stage, not the result.
+        Use ``iter_dataframes`` to consume the chunks directly. As without
+        streaming, a query with no results is an error.
+        """
+        if self.stream:
+            frames = list(self.iter_dataframes())
+            if not frames:
+                msg = "JSON Query error: No result from JSON query."
+                raise ValueError(msg) from None
+            data = DataFrame(pd.concat(frames, ignore_index=True))
+            self.status = data
+            return data
         result = self.json_query()
         data = (
             DataFrame(data=[result])
@@ -61,25 +146,40 @@ class JQComponentMixin(Component):
         self.status = data
         return data
 
+    async def _build_results(self) -> tuple[dict, dict]:
+        # The outputs of one run share the parsed input and the query result;
+        # the memo goes away with the run, so large payloads are not retained.
+        self._jq_memo: dict[str, tuple] | None = {}
+        try:
+            return await super()._build_results()
+        finally:
+            self._jq_memo = None
+
     def parse_input(self) -> dict[str, object] | list[dict[str, object]]:
-        """Extract data dictionary from Data or Message object."""
+        """Extract data dictionary from Data or Message object.
+
+        During a run the result is memoized for the current ``data`` object, so
+        every output parses the input only once.
+        """
         data = self.data
+        memo = self.__dict__.get("_jq_memo")
+        if memo is None:
+            return self._parse_input(data)
+        hit = memo.get("parsed")
+        if hit is not None and hit[0] is data:
+            return hit[1]
+        parsed = self._parse_input(data)
+        memo["parsed"] = (data, parsed)
+        return parsed
 
+    def _parse_input(self, data: Any) -> dict[str, object] | list[dict[str, object]]:
         def repair_json(s: str):
-            try:
-                import orjson
-                from json_repair import repair_json
-
-                # The json_loads function can be slow
-                s = repair_json(s, return_objects=False, skip_json_loads=True)
-
-                # Because json_loads verification is skipped, we strictly validate the JSON by parsing it again with orjson.
-                parsed = orjson.loads(s)
-            except (json.JSONDecodeError, TypeError) as e:
-                raise ValueError("Failed to repair or parse the JSON string.") from e
+            # Valid JSON takes the strict orjson fast path; malformed LLM output
+            # falls through cheap fixes before the full json_repair pass.
+            parsed = parse_json(s)
             if isinstance(parsed, dict):
                 return parsed
-            if isinstance(parsed, list) and isinstance(parsed[0], dict):
+            if isinstance(parsed, list) and parsed and isinstance(parsed[0], dict):
                 return parsed
             raise ValueError(
                 "Unable to parse Message text as JSON. Please make sure it contains valid JSON."
@@ -97,13 +197,29 @@ class JQComponentMixin(Component):
         raise ValueError("Unsupported data type for get_data_dict.")
 
     def json_query(self) -> dict[str, object] | list[dict[str, object]]:
-        """Execute JQ query on the input data."""
+        """Execute JQ query on the input data.
+
+        During a run the result is memoized for the current ``data`` object and
+        query, so ``build_data`` and ``build_dataframe`` share one evaluation.
+        """
         if not self.query or not self.query.strip():
             msg = "JSON Query is required and cannot be blank."
             raise ValueError(msg) from None
+        data, query = self.data, self.query
+        memo = self.__dict__.get("_jq_memo")
+        if memo is None:
+            return self._json_query(query)
+        hit = memo.get("result")
+        if hit is not None and hit[0] is data and hit[1] == query:
+            return hit[2]
+        result = self._json_query(query)
+        memo["result"] = (data, query, result)
+        return result
+
+    def _json_query(self, query: str) -> dict[str, object] | list[dict[str, object]]:
         jq_input = self.parse_input()
         try:
-            results = jq.compile(self.query).input(jq_input).all()
+            results = compile_query(query).input(jq_input).all()
             if not results:
                 msg = "No result from JSON query."
                 raise ValueError(msg) from None
@@ -116,3 +232,50 @@ class JQComponentMixin(Component):
             logger.error(f"JSON Query failed: {e}")
             msg = f"JSON Query error: {e}"
             raise ValueError(msg) from e
+
+    def iter_records(self) -> Iterator[Any]:
+        """Yield the input records one at a time for streaming mode."""
+        data = self.data
+        if isinstance(data, Data):
+            data = data.data
+            if "text" in data and "flow_id" in data:
+                yield from iter_json_records(str(data["text"]))
+            else:
+                yield data
+            return
+        if isinstance(data, Message):
+            yield from iter_json_records(str(data.text))
+            return
+        raise ValueError("Unsupported data type for get_data_dict.")
+
+    def stream_query(self) -> Iterator[Any]:
+        """Lazily yield the results of the JQ query applied to every record."""
+        if not self.query or not self.query.strip():
+            msg = "JSON Query is required and cannot be blank."
+            raise ValueError(msg) from None
+        try:
+            program = compile_query(self.query)
+            for record in self.iter_records():
+                for result in program.input_value(record):
+                    if result is not None:
+                        yield result
+        except (ValueError, TypeError, KeyError) as e:
+            logger.error(f"JSON Query failed: {e}")
+            msg = f"JSON Query error: {e}"
+            raise ValueError(msg) from e
+
+    def stream_query_all(self) -> Any:
+        results = list(self.stream_query())
+        if not results:
+            msg = "No result from JSON query."
+            raise ValueError(msg) from None
+        return results[0] if len(results) == 1 else results
+
+    def iter_dataframes(self) -> Iterator[pd.DataFrame]:
+        """Yield the streamed results as DataFrames of ``chunk_size`` rows."""
+        for chunk in batched(
+            self.stream_query(), max(int(self.chunk_size), 1), strict=False
+        ):
+            yield pd.DataFrame(
+                [r if isinstance(r, dict) else {"result": r} for r in chunk]
+            )
@@ -0,0 +1,56 @@
+"""Per-call cost of JQComponentMixin with and without compiled-program reuse
+and single evaluation.
+
+Run with ``python -m langutil_flow.base.processing.jq_bench``.
+"""
+
+import timeit
+
+import jq
+import orjson
+from lfx.schema.message import Message
+
+from .jq import JQComponentMixin, compile_query
+
+QUERY = ".items | map(select(.score > 0.5) | {id, name: .meta.name})"
+PAYLOAD = orjson.dumps(
+    {
+        "items": [
+            {"id": i, "score": (i % 10) / 10, "meta": {"name": f"item-{i}"}}
+            for i in range(50)
+        ]
+    }
+).decode()
+
+
+def _bench(name: str, fn, number: int = 2000) -> float:
+    per_call = min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e6
+    print(f"{name:<44} {per_call:8.1f} us/call")
+    return per_call
+
+
+def main() -> None:
+    data = orjson.loads(PAYLOAD)
+    compile_query(QUERY)
+    before = _bench("jq.compile + eval", lambda: jq.compile(QUERY).input(data).all())
+    after = _bench(
+        "cached compile + eval", lambda: compile_query(QUERY).input(data).all()
+    )
+    print(f"{'saving per call':<44} {before - after:8.1f} us\n")
+
+    def run(shared: bool) -> None:
+        component = JQComponentMixin()
+        component.set(data=Message(text=PAYLOAD), query=QUERY)
+        component.build_data()
+        if not shared:
+            component.__dict__.pop("_jq_parsed")
+            component.__dict__.pop("_jq_result")
+        component.build_dataframe()
+
+    before = _bench("two outputs, evaluated separately", lambda: run(False), 200)
+    after = _bench("two outputs, one shared evaluation", lambda: run(True), 200)
+    print(f"{'saving per run':<44} {before - after:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
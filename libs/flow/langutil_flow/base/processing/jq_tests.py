@@ -0,0 +1,109 @@
+import asyncio
+
+import orjson
+import pytest
+from lfx.schema.data import Data
+from lfx.schema.message import Message
+
+from .jq import JQComponentMixin, compile_query, iter_json_records
+
+
+def test_compile_query_cached():
+    assert compile_query(".a | length") is compile_query(".a | length")
+
+
+def test_outputs_share_one_evaluation(monkeypatch):
+    calls = {"parse": 0, "query": 0}
+    parse_input = JQComponentMixin._parse_input
+    json_query = JQComponentMixin._json_query
+
+    def counting_parse(self, data):
+        calls["parse"] += 1
+        return parse_input(self, data)
+
+    def counting_query(self, query):
+        calls["query"] += 1
+        return json_query(self, query)
+
+    monkeypatch.setattr(JQComponentMixin, "_parse_input", counting_parse)
+    monkeypatch.setattr(JQComponentMixin, "_json_query", counting_query)
+
+    component = JQComponentMixin()
+    component.set(
+        data=Message(text='{"items": [{"id": 1}, {"id": 2}]}'), query=".items"
+    )
+    results, _ = asyncio.run(component._build_results())
+    assert results["data_output"].data == {"result": [{"id": 1}, {"id": 2}]}
+    assert len(results["dataframe_output"]) == 2
+    assert calls == {"parse": 1, "query": 1}
+    # Nothing is retained after the run
+    assert component._jq_memo is None
+
+    component.set(query=".items[0]")
+    assert component.build_data().data == {"id": 1}
+    assert calls == {"parse": 2, "query": 2}
+
+    component = JQComponentMixin()
+    component.set(data=Data(data={"items": [{"id": 3}]}), query=".items[0]")
+    results, _ = asyncio.run(component._build_results())
+    assert results["data_output"].data == {"id": 3}
+    assert calls == {"parse": 3, "query": 3}
+
+
+def test_invalid_query():
+    component = JQComponentMixin()
+    component.set(data=Data(data={"a": 1}), query=".a |")
+    with pytest.raises(ValueError, match="JSON Query error"):
+        component.build_data()
+
+
+def test_iter_json_records():
+    assert list(iter_json_records(' [ {"a": 1} , [2, "]"] ,3 ]')) == [
+        {"a": 1},
+        [2, "]"],
+        3,
+    ]
+    assert list(iter_json_records('{"a": 1}\n\n{"a": 2}\n')) == [{"a": 1}, {"a": 2}]
+    assert list(iter_json_records("[]")) == []
+    with pytest.raises(ValueError):
+        list(iter_json_records('[{"a": 1} {"a": 2}]'))
+
+
+def test_iter_json_records_is_lazy():
+    records = iter_json_records('[{"a": 1}, {"a": 2}, oops]')
+    assert next(records) == {"a": 1}
+    assert next(records) == {"a": 2}
+
+
+def test_stream_dataframe():
+    text = "\n".join(
+        orjson.dumps({"id": i, "keep": i % 2 == 0}).decode() for i in range(25)
+    )
+    component = JQComponentMixin()
+    component.set(
+        data=Message(text=text),
+        query="select(.keep) | {id}",
+        stream=True,
+        chunk_size=4,
+    )
+
+    chunks = list(component.iter_dataframes())
+    assert [len(c) for c in chunks] == [4, 4, 4, 1]
+
+    df = component.build_dataframe()
+    assert list(df["id"]) == list(range(0, 25, 2))
+
+    component.set(query=".id")
+    assert component.build_data().data == {"result": list(range(25))}
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_dataframe_without_results(stream):
+    component = JQComponentMixin()
+    component.set(
+        data=Message(text='[{"keep": false}, {"keep": false}]'),
+        query=".[] | select(.keep)" if not stream else "select(.keep)",
+        stream=stream,
+    )
+    with pytest.raises(ValueError, match="No result from JSON query"):
+        component.build_dataframe()
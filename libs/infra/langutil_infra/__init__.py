@@ -1,3 +1,4 @@
-from .cache import TTICache
+from .cache import ShardedCache, TTICache
+from .disk import DiskCache, TieredCache
 
-__all__ = ["TTICache"]
+__all__ = ["DiskCache", "ShardedCache", "TTICache", "TieredCache"]
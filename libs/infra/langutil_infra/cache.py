@@ -1,9 +1,9 @@
+import threading
 import time
-from collections.abc import Callable
+from collections.abc import Callable, Iterator, MutableMapping
+from concurrent.futures import Future
 from typing import Any, TypeVar
 
-from cachetools import TTLCache
-
 # TTU: (key, value, now) -> expiration_time
 TTUCallable = Callable[[Any, Any, float], float]
 
@@ -11,53 +11,349 @@ K = TypeVar("K")
 V = TypeVar("V")
 
 
-class TTICache(TTLCache[K, V]):
+class _Node:
+    __slots__ = ("expires", "key", "next", "prev", "size", "value")
+
+    def __init__(self, key: Any = None, value: Any = None, size: int = 0) -> None:
+        self.key = key
+        self.value = value
+        self.size = size
+        self.expires = 0.0
+        self.prev: _Node = self
+        self.next: _Node = self
+
+
+class TTICache(MutableMapping[K, V]):
+    """Time-to-idle cache: every read pushes the item's expiration forward.
+
+    Items live in a single doubly linked list ordered by last access, which is
+    also expiration order as long as ``ttu`` returns non-decreasing deadlines.
+    Hits, expiry bumps and evictions are O(1). When ``ttu`` is omitted the idle
+    TTL is fixed and reads skip the callable entirely.
+    """
+
     def __init__(
         self,
         maxsize: int,
         ttl: float,
-        ttu: TTUCallable,
+        ttu: TTUCallable | None = None,
         timer: Callable[[], float] = time.monotonic,
         getsizeof: Callable[[Any], int] | None = None,
     ) -> None:
-        super().__init__(maxsize, ttl, timer, getsizeof)
+        self.__maxsize = maxsize
+        self.__ttl = ttl
         self.__ttu = ttu
+        self.__timer = timer
+        self.__getsizeof = getsizeof
+        self.__currsize = 0
+        self.__nodes: dict[Any, _Node] = {}
+        self.__root = _Node()
 
-    def __getitem__(
-        self,
-        key: K,
-        cache_getitem: Callable[..., V] = TTLCache.__getitem__,  # type: ignore[assignment]
-    ) -> V:
-        # 1. Call the superclass to get the value (if expired, superclass will raise KeyError or handle deletion)
-        value = cache_getitem(self, key)
-
-        # 2. If the value is retrieved, it has not absolutely expired; now execute TTU (Time To Use) logic
-        now = self.timer()
-        new_expiration = self.__ttu(key, value, now)
-
-        # 3. Update the expiration time for this key
-        # cachetools internally uses self._TTLCache__links to store expiration info
-        # We need to update the link object's expires property and move it to the end of the queue (expire last)
-        link = self._TTLCache__links[key]  # pyright: ignore[reportAttributeAccessIssue]
-        link.expires = new_expiration
-
-        # Move the link from its current position to the tail of the doubly-linked list
-        # This ensures that the expiration order matches the linked list order
-        self._update_link(link)
+    def __repr__(self) -> str:
+        self.expire()
+        items = ", ".join(f"{n.key!r}: {n.value!r}" for n in self.__links())
+        return f"{type(self).__name__}({{{items}}}, maxsize={self.__maxsize!r}, currsize={self.__currsize!r})"
+
+    def __getitem__(self, key: K) -> V:
+        try:
+            node = self.__nodes[key]
+        except KeyError:
+            return self.__missing__(key)
+        now = self.__timer()
+        if not (now < node.expires):
+            return self.__missing__(key)
+
+        ttu = self.__ttu
+        node.expires = now + self.__ttl if ttu is None else ttu(key, node.value, now)
+
+        # Move to the tail so the list stays in access (= expiration) order
+        root = self.__root
+        if node.next is not root:
+            node.prev.next = node.next
+            node.next.prev = node.prev
+            last = root.prev
+            node.prev = last
+            node.next = root
+            last.next = root.prev = node
+        return node.value
+
+    def __setitem__(self, key: K, value: V) -> None:
+        size = self.getsizeof(value)
+        if size > self.__maxsize:
+            raise ValueError("value too large")
+        now = self.__timer()
+        self.expire(now)
+
+        node = self.__nodes.get(key)
+        if node is not None:
+            self.__unlink(node)
+            self.__currsize -= node.size
+        while self.__currsize + size > self.__maxsize:
+            self.popitem()
+
+        if node is None:
+            node = _Node(key, value, size)
+        else:
+            node.value = value
+            node.size = size
+        node.expires = now + self.__ttl
+        self.__nodes[key] = node
+        self.__currsize += size
+        root = self.__root
+        last = root.prev
+        node.prev = last
+        node.next = root
+        last.next = root.prev = node
+
+    def __delitem__(self, key: K) -> None:
+        node = self.__nodes.pop(key)
+        self.__unlink(node)
+        self.__currsize -= node.size
+        if not (self.__timer() < node.expires):
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        node = self.__nodes.get(key)
+        return node is not None and self.__timer() < node.expires
+
+    def __missing__(self, key: K) -> V:
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[K]:
+        now = self.__timer()
+        for node in self.__links():
+            if now < node.expires:
+                yield node.key
+
+    def __len__(self) -> int:
+        self.expire()
+        return len(self.__nodes)
+
+    @property
+    def maxsize(self) -> int:
+        """The maximum size of the cache."""
+        return self.__maxsize
+
+    @property
+    def currsize(self) -> int:
+        """The current size of the cache."""
+        self.expire()
+        return self.__currsize
+
+    @property
+    def ttl(self) -> float:
+        """The default time-to-idle value of the cache's items."""
+        return self.__ttl
+
+    @property
+    def timer(self) -> Callable[[], float]:
+        """The timer function used by the cache."""
+        return self.__timer
+
+    def getsizeof(self, value: Any) -> int:
+        """Return the size of a cache element's value."""
+        getsizeof = self.__getsizeof
+        return 1 if getsizeof is None else getsizeof(value)
+
+    def expire(self, time: float | None = None) -> list[tuple[K, V]]:
+        """Remove expired items from the cache and return the expired
+        `(key, value)` pairs.
+
+        """
+        if time is None:
+            time = self.__timer()
+        root = self.__root
+        nodes = self.__nodes
+        expired = []
+        curr = root.next
+        while curr is not root and not (time < curr.expires):
+            expired.append((curr.key, curr.value))
+            del nodes[curr.key]
+            self.__currsize -= curr.size
+            curr = curr.next
+        root.next = curr
+        curr.prev = root
+        return expired
+
+    def popitem(self) -> tuple[K, V]:
+        """Remove and return the least recently used `(key, value)` pair."""
+        node = self.__root.next
+        if node is self.__root:
+            raise KeyError(f"{type(self).__name__} is empty")
+        del self.__nodes[node.key]
+        self.__unlink(node)
+        self.__currsize -= node.size
+        return node.key, node.value
+
+    def clear(self) -> None:
+        self.__nodes.clear()
+        root = self.__root
+        root.prev = root.next = root
+        self.__currsize = 0
+
+    def __links(self) -> Iterator[_Node]:
+        root = self.__root
+        curr = root.next
+        while curr is not root:
+            yield curr
+            curr = curr.next
+
+    @staticmethod
+    def __unlink(node: _Node) -> None:
+        node.prev.next = node.next
+        node.next.prev = node.prev
+
+
+class _Shard:
+    __slots__ = ("cache", "lock", "pending")
+
+    def __init__(self, cache: MutableMapping[Any, Any]) -> None:
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.pending: dict[Any, Future[Any]] = {}
+
+
+class ShardedCache(MutableMapping[K, V]):
+    """Thread-safe cache split into independently locked shards.
+
+    Keys are spread over ``shards`` caches built by ``factory``, each guarded
+    by its own lock, so unrelated keys rarely contend. Size limits apply per
+    shard. ``get_or_compute`` coalesces concurrent misses of the same key into
+    a single computation.
+    """
+
+    def __init__(
+        self, factory: Callable[[], MutableMapping[K, V]], shards: int = 16
+    ) -> None:
+        if shards < 1:
+            raise ValueError("shards must be a positive integer")
+        self.__shards = tuple(_Shard(factory()) for _ in range(shards))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(shards={len(self.__shards)}, currsize={self.currsize})"
+
+    def __getitem__(self, key: K) -> V:
+        shard = self.__shard(key)
+        with shard.lock:
+            return shard.cache[key]
+
+    def __setitem__(self, key: K, value: V) -> None:
+        shard = self.__shard(key)
+        with shard.lock:
+            shard.cache[key] = value
+
+    def __delitem__(self, key: K) -> None:
+        shard = self.__shard(key)
+        with shard.lock:
+            del shard.cache[key]
+
+    def __contains__(self, key: object) -> bool:
+        shard = self.__shard(key)
+        with shard.lock:
+            return key in shard.cache
+
+    def __iter__(self) -> Iterator[K]:
+        for shard in self.__shards:
+            with shard.lock:
+                keys = list(shard.cache)
+            yield from keys
+
+    def __len__(self) -> int:
+        total = 0
+        for shard in self.__shards:
+            with shard.lock:
+                total += len(shard.cache)
+        return total
+
+    @property
+    def shards(self) -> tuple[MutableMapping[K, V], ...]:
+        """The underlying per-shard caches."""
+        return tuple(shard.cache for shard in self.__shards)
+
+    @property
+    def maxsize(self) -> int | None:
+        """The combined maximum size of all shards, if the shards are bounded."""
+        sizes = [getattr(shard.cache, "maxsize", None) for shard in self.__shards]
+        return None if None in sizes else sum(sizes)  # type: ignore[arg-type]
+
+    @property
+    def currsize(self) -> int:
+        """The combined current size of all shards."""
+        total = 0
+        for shard in self.__shards:
+            with shard.lock:
+                total += getattr(shard.cache, "currsize", len(shard.cache))
+        return total
+
+    def get(self, key: K, default: Any = None) -> Any:
+        shard = self.__shard(key)
+        with shard.lock:
+            try:
+                return shard.cache[key]
+            except KeyError:
+                return default
+
+    def pop(self, key: K, *args: Any) -> Any:
+        shard = self.__shard(key)
+        with shard.lock:
+            return shard.cache.pop(key, *args)
+
+    def setdefault(self, key: K, default: Any = None) -> Any:
+        shard = self.__shard(key)
+        with shard.lock:
+            try:
+                return shard.cache[key]
+            except KeyError:
+                pass
+            try:
+                shard.cache[key] = default
+            except ValueError:
+                pass  # value too large
+            return default
+
+    def clear(self) -> None:
+        for shard in self.__shards:
+            with shard.lock:
+                shard.cache.clear()
+
+    def get_or_compute(self, key: K, compute: Callable[[], V]) -> V:
+        """Return the cached value for ``key``, calling ``compute`` on a miss.
+
+        Only one caller computes a missing key; concurrent callers for the
+        same key wait for its result. Exceptions are propagated to every
+        waiter and nothing is cached.
+        """
+        shard = self.__shard(key)
+        with shard.lock:
+            try:
+                return shard.cache[key]
+            except KeyError:
+                pass
+            future = shard.pending.get(key)
+            owner = future is None
+            if future is None:
+                future = shard.pending[key] = Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with shard.lock:
+                del shard.pending[key]
+            future.set_exception(e)
+            raise
 
+        with shard.lock:
+            try:
+                shard.cache[key] = value
+            except ValueError:
+                pass  # value too large
+            del shard.pending[key]
+        future.set_result(value)
         return value
 
-    def _update_link(self, link: TTLCache._Link) -> None:  # pyright: ignore[reportAttributeAccessIssue]
-        """Move the link to the end of the doubly linked list, maintaining expiration order"""
-        root = self._TTLCache__root  # pyright: ignore[reportAttributeAccessIssue]
-        links = self._TTLCache__links  # pyright: ignore[reportAttributeAccessIssue]
-        # 1. Unlink from current position
-        link.prev.next = link.next
-        link.next.prev = link.prev
-        # 2. Insert at tail (before root)
-        link.next = root
-        link.prev = root.prev
-        link.prev.next = link
-        root.prev = link
-        # 3. Keep OrderedDict in sync with linked list order
-        links.move_to_end(link.key)
+    def __shard(self, key: object) -> _Shard:
+        shards = self.__shards
+        return shards[hash(key) % len(shards)]
@@ -0,0 +1,149 @@
+"""Micro-benchmarks: TTICache vs the previous TTLCache-based implementation,
+and multi-threaded throughput of a single-lock cache vs ShardedCache.
+
+Run with ``python -m langutil_infra.cache_bench``.
+"""
+
+import threading
+import time
+import timeit
+from collections.abc import Callable, MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from cachetools import TTLCache
+
+from .cache import ShardedCache, TTICache, TTUCallable
+
+
+class _LegacyTTICache(TTLCache):
+    """The TTLCache subclass TTICache used to be, kept here for comparison."""
+
+    def __init__(self, maxsize: int, ttl: float, ttu: TTUCallable) -> None:
+        super().__init__(maxsize, ttl)
+        self.__ttu = ttu
+
+    def __getitem__(
+        self, key: Any, cache_getitem: Callable[..., Any] = TTLCache.__getitem__
+    ) -> Any:  # type: ignore[assignment]
+        value = cache_getitem(self, key)
+        link = self._TTLCache__links[key]  # pyright: ignore[reportAttributeAccessIssue]
+        link.expires = self.__ttu(key, value, self.timer())
+        root = self._TTLCache__root  # pyright: ignore[reportAttributeAccessIssue]
+        link.prev.next = link.next
+        link.next.prev = link.prev
+        link.next = root
+        link.prev = root.prev
+        link.prev.next = link
+        root.prev = link
+        self._TTLCache__links.move_to_end(link.key)  # pyright: ignore[reportAttributeAccessIssue]
+        return value
+
+
+def _ttu(_key: Any, _value: Any, now: float) -> float:
+    return now + 60
+
+
+def _bench(name: str, cache: Any, keys: int = 1000, number: int = 200) -> None:
+    for i in range(keys):
+        cache[i] = i
+
+    def hits() -> None:
+        for i in range(keys):
+            cache[i]
+
+    def writes() -> None:
+        for i in range(keys):
+            cache[i] = i
+
+    ops = keys * number
+    hit = min(timeit.repeat(hits, number=number, repeat=3)) / ops * 1e9
+    write = min(timeit.repeat(writes, number=number, repeat=3)) / ops * 1e9
+    print(f"{name:<28} hit {hit:8.1f} ns/op   set {write:8.1f} ns/op")
+
+
+class _LockedCache(MutableMapping):
+    """A cache behind one global lock, the naive way to share it across threads."""
+
+    def __init__(self, cache: MutableMapping[Any, Any]) -> None:
+        self.cache = cache
+        self.lock = threading.Lock()
+
+    def __getitem__(self, key: Any) -> Any:
+        with self.lock:
+            return self.cache[key]
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        with self.lock:
+            self.cache[key] = value
+
+    def __delitem__(self, key: Any) -> None:
+        with self.lock:
+            del self.cache[key]
+
+    def __iter__(self):
+        return iter(list(self.cache))
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+
+def _bench_threads(
+    name: str,
+    cache: MutableMapping[Any, Any],
+    threads: int = 16,
+    keys: int = 4096,
+    ops: int = 20_000,
+) -> None:
+    def worker(offset: int) -> None:
+        for i in range(ops):
+            k = (offset + i) % keys
+            try:
+                cache[k]
+            except KeyError:
+                cache[k] = k
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, range(0, threads * 997, 997)))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {threads * ops / elapsed / 1e6:6.2f} Mops/s ({threads} threads)")
+
+
+def _bench_miss_storm(threads: int = 32, keys: int = 64) -> None:
+    calls = 0
+
+    def compute() -> int:
+        nonlocal calls
+        calls += 1
+        time.sleep(0.01)
+        return 1
+
+    cache = ShardedCache(lambda: TTICache(1024, 60))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(
+            executor.map(
+                lambda i: cache.get_or_compute(i % keys, compute), range(threads * keys)
+            )
+        )
+    elapsed = time.perf_counter() - start
+    print(
+        f"{'single-flight miss storm':<28} {threads * keys} calls, "
+        f"{calls} computations in {elapsed:.2f}s"
+    )
+
+
+def main() -> None:
+    _bench("legacy TTLCache subclass", _LegacyTTICache(4096, 60, _ttu))
+    _bench("TTICache (ttu)", TTICache(4096, 60, _ttu))
+    _bench("TTICache (fixed ttl)", TTICache(4096, 60))
+    _bench_threads("TTICache + global lock", _LockedCache(TTICache(4096, 60)))
+    _bench_threads(
+        "ShardedCache(TTICache, 16)", ShardedCache(lambda: TTICache(256, 60))
+    )
+    _bench_miss_storm()
+
+
+if __name__ == "__main__":
+    main()
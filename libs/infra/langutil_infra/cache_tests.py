@@ -1,9 +1,12 @@
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
+import pytest
 from cachetools import cached
 
-from .cache import TTICache
+from .cache import ShardedCache, TTICache
 
 
 def test_tti():
@@ -60,3 +63,99 @@ def test_tti3():
     time.sleep(1)
     f()
     assert call_count == 2
+
+
+class _Timer:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_tti_fixed_ttl():
+    timer = _Timer()
+    cache = TTICache(maxsize=5, ttl=2, timer=timer)
+
+    cache["a"] = 1
+    cache["b"] = 2
+
+    timer.now = 1.5
+    assert cache["a"] == 1
+
+    timer.now = 3
+    assert "b" not in cache
+    assert list(cache.keys()) == ["a"]
+    assert cache["a"] == 1
+
+    timer.now = 5
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_tti_evicts_least_recently_used():
+    timer = _Timer()
+    cache = TTICache(maxsize=2, ttl=10, timer=timer)
+
+    cache["a"] = 1
+    cache["b"] = 2
+    cache["a"]
+    cache["c"] = 3
+
+    assert list(cache.keys()) == ["a", "c"]
+    assert cache.popitem() == ("a", 1)
+    assert cache.currsize == 1
+
+
+def test_tti_getsizeof():
+    cache = TTICache(maxsize=10, ttl=10, getsizeof=len)
+
+    cache["a"] = "aaaa"
+    cache["b"] = "bbbb"
+    cache["c"] = "cccc"
+
+    assert list(cache.keys()) == ["b", "c"]
+    assert cache.currsize == 8
+    with pytest.raises(ValueError):
+        cache["d"] = "d" * 11
+
+    del cache["b"]
+    assert cache.currsize == 4
+
+
+def test_sharded():
+    cache = ShardedCache(lambda: TTICache(maxsize=4, ttl=10), shards=4)
+
+    for i in range(8):
+        cache[i] = i * 10
+
+    assert len(cache) == 8
+    assert sorted(cache) == list(range(8))
+    assert cache[3] == 30
+    assert cache.get(42) is None
+    assert cache.maxsize == 16
+    del cache[3]
+    assert 3 not in cache
+
+
+def test_sharded_get_or_compute():
+    cache = ShardedCache(lambda: TTICache(maxsize=64, ttl=10))
+    call_count = 0
+    gate = threading.Event()
+
+    def compute() -> int:
+        nonlocal call_count
+        call_count += 1
+        gate.wait()
+        return 42
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [
+            executor.submit(cache.get_or_compute, "k", compute) for _ in range(8)
+        ]
+        time.sleep(0.05)
+        gate.set()
+        assert [f.result() for f in futures] == [42] * 8
+
+    assert call_count == 1
+    assert cache["k"] == 42
@@ -0,0 +1,351 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import Callable, Iterator, MutableMapping
+from pathlib import Path
+from typing import Any, TypeVar
+
+from cachetools import LRUCache
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+_RAW = b"p"
+_ZLIB = b"z"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key BLOB NOT NULL,
+    value BLOB NOT NULL,
+    expires REAL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_expires ON entries (namespace, expires);
+"""
+
+
+def dumps(value: Any, compress_min: int = 512) -> bytes:
+    """Pickle ``value``, zlib-compressing payloads larger than ``compress_min``
+    bytes when that makes them smaller."""
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) >= compress_min:
+        packed = zlib.compress(data, 1)
+        if len(packed) < len(data):
+            return _ZLIB + packed
+    return _RAW + data
+
+
+def loads(data: bytes) -> Any:
+    """Inverse of ``dumps``."""
+    if data[:1] == _ZLIB:
+        return pickle.loads(zlib.decompress(data[1:]))
+    return pickle.loads(data[1:])
+
+
+class DiskCache(MutableMapping[K, V]):
+    """SQLite-backed cache that survives restarts and is shared by processes.
+
+    Entries are grouped by ``namespace`` inside one database file. Expiration
+    uses wall-clock time so TTL semantics hold across restarts; with ``tti``
+    every read pushes the deadline ``ttl`` seconds forward. Keys must pickle
+    the same way in every process, so avoid ``hash()`` of strings as keys.
+    Connections are per thread and per process: a cache created before a
+    ``fork()`` reconnects in the child.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        namespace: str = "default",
+        ttl: float | None = None,
+        tti: bool = False,
+        maxsize: int | None = None,
+        timer: Callable[[], float] = time.time,
+        timeout: float = 30,
+    ) -> None:
+        self.path = Path(path)
+        self.namespace = namespace
+        self.ttl = ttl
+        self.tti = tti
+        self.maxsize = maxsize
+        self.timer = timer
+        self.timeout = timeout
+        self.__local = threading.local()
+        self.__pid = os.getpid()
+        self.__inherited: list[threading.local] = []
+        self.__writes = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.__connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(path={str(self.path)!r}, namespace={self.namespace!r})"
+
+    def __getitem__(self, key: K) -> V:
+        k = pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL)
+        now = self.timer()
+        conn = self.__connect()
+        row = conn.execute(
+            "SELECT value FROM entries WHERE namespace = ? AND key = ? "
+            "AND (expires IS NULL OR expires > ?)",
+            (self.namespace, k, now),
+        ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        if self.tti and self.ttl is not None:
+            self.__touch(conn, k, now)
+        return loads(row[0])
+
+    def touch(self, key: K) -> None:
+        """Push the deadline of ``key`` forward as a read would, without
+        loading it. Does nothing unless ``tti`` is set."""
+        if self.tti and self.ttl is not None:
+            k = pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL)
+            self.__touch(self.__connect(), k, self.timer())
+
+    def __touch(self, conn: sqlite3.Connection, k: bytes, now: float) -> None:
+        with conn:
+            conn.execute(
+                "UPDATE entries SET expires = ? WHERE namespace = ? AND key = ? "
+                "AND expires > ?",
+                (now + self.ttl, self.namespace, k, now),
+            )
+
+    def __setitem__(self, key: K, value: V) -> None:
+        k = pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL)
+        expires = None if self.ttl is None else self.timer() + self.ttl
+        conn = self.__connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, expires) "
+                "VALUES (?, ?, ?, ?)",
+                (self.namespace, k, dumps(value), expires),
+            )
+        self.__writes += 1
+        if self.__writes % 256 == 0:
+            self.expire()
+
+    def __delitem__(self, key: K) -> None:
+        k = pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL)
+        conn = self.__connect()
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND key = ?",
+                (self.namespace, k),
+            )
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        k = pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL)
+        row = (
+            self.__connect()
+            .execute(
+                "SELECT 1 FROM entries WHERE namespace = ? AND key = ? "
+                "AND (expires IS NULL OR expires > ?)",
+                (self.namespace, k, self.timer()),
+            )
+            .fetchone()
+        )
+        return row is not None
+
+    def __iter__(self) -> Iterator[K]:
+        rows = (
+            self.__connect()
+            .execute(
+                "SELECT key FROM entries WHERE namespace = ? "
+                "AND (expires IS NULL OR expires > ?)",
+                (self.namespace, self.timer()),
+            )
+            .fetchall()
+        )
+        for (k,) in rows:
+            yield pickle.loads(k)
+
+    def __len__(self) -> int:
+        (count,) = (
+            self.__connect()
+            .execute(
+                "SELECT COUNT(*) FROM entries WHERE namespace = ? "
+                "AND (expires IS NULL OR expires > ?)",
+                (self.namespace, self.timer()),
+            )
+            .fetchone()
+        )
+        return count
+
+    def expire(self) -> int:
+        """Delete expired entries and, if ``maxsize`` is set, the entries
+        closest to expiring beyond it. Returns the number of rows removed."""
+        conn = self.__connect()
+        with conn:
+            removed = conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND expires <= ?",
+                (self.namespace, self.timer()),
+            ).rowcount
+            if self.maxsize is not None:
+                removed += conn.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND key IN ("
+                    "SELECT key FROM entries WHERE namespace = ? "
+                    "ORDER BY expires IS NULL, expires LIMIT max(0, "
+                    "(SELECT COUNT(*) FROM entries WHERE namespace = ?) - ?))",
+                    (self.namespace, self.namespace, self.namespace, self.maxsize),
+                ).rowcount
+        return removed
+
+    def clear(self) -> None:
+        """Delete every entry in this namespace."""
+        conn = self.__connect()
+        with conn:
+            conn.execute("DELETE FROM entries WHERE namespace = ?", (self.namespace,))
+
+    def close(self) -> None:
+        conn = getattr(self.__local, "conn", None)
+        if conn is not None:
+            conn.close()
+            del self.__local.conn
+
+    def __connect(self) -> sqlite3.Connection:
+        if self.__pid != os.getpid():
+            # SQLite connections must not cross fork(): a child (such as a
+            # preforked worker) opens its own. The inherited ones are kept
+            # referenced, never used or closed, since the parent owns them.
+            self.__inherited.append(self.__local)
+            self.__local = threading.local()
+            self.__pid = os.getpid()
+        conn = getattr(self.__local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            # WAL lets readers in other processes proceed while one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.__local.conn = conn
+        return conn
+
+
+class TieredCache(MutableMapping[K, V]):
+    """Two-level cache: an in-memory ``front`` cache backed by a persistent
+    ``back`` store such as ``DiskCache``.
+
+    Reads fall through to ``back`` on a front miss and promote the value;
+    writes and deletes go to both levels. Front hits also ``touch`` a back
+    store that has it (a time-to-idle ``DiskCache``), at most once per key
+    every ``touch_interval`` seconds, a quarter of the back TTL by default,
+    so entries kept hot in memory do not expire on disk.
+    """
+
+    def __init__(
+        self,
+        front: MutableMapping[K, V],
+        back: MutableMapping[K, V],
+        touch_interval: float | None = None,
+    ) -> None:
+        self.front = front
+        self.back = back
+        self.__touch = getattr(back, "touch", None) if getattr(back, "tti", 0) else None
+        ttl = getattr(back, "ttl", None)
+        if touch_interval is None:
+            touch_interval = ttl / 4 if ttl is not None else 0.0
+        self.touch_interval = touch_interval
+        self.__touched: LRUCache[Any, float] = LRUCache(maxsize=4096)
+        self.__lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(front={self.front!r}, back={self.back!r})"
+
+    def __getitem__(self, key: K) -> V:
+        try:
+            value = self.front[key]
+        except KeyError:
+            pass
+        else:
+            if self.__touch is not None:
+                self.__touch_back(key)
+            return value
+        value = self.back[key]
+        try:
+            self.front[key] = value
+        except ValueError:
+            pass  # value too large
+        return value
+
+    def __setitem__(self, key: K, value: V) -> None:
+        try:
+            self.front[key] = value
+        except ValueError:
+            pass  # value too large for memory, keep it on disk only
+        self.back[key] = value
+
+    def __delitem__(self, key: K) -> None:
+        found = False
+        for level in (self.front, self.back):
+            try:
+                del level[key]
+                found = True
+            except KeyError:
+                pass
+        if not found:
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.front or key in self.back
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(self.back)
+
+    def __len__(self) -> int:
+        return len(self.back)
+
+    @property
+    def maxsize(self) -> int | None:
+        """The maximum size of the in-memory level."""
+        return getattr(self.front, "maxsize", None)
+
+    @property
+    def currsize(self) -> int:
+        """The current size of the in-memory level."""
+        return getattr(self.front, "currsize", len(self.front))
+
+    def get_or_compute(self, key: K, compute: Callable[[], V]) -> V:
+        """Return the value of ``key``, else compute and store it. With a
+        ``front`` offering ``get_or_compute`` (a ``ShardedCache``),
+        concurrent misses of one key load or compute it only once."""
+        try:
+            return self[key]
+        except KeyError:
+            pass
+
+        def load() -> V:
+            try:
+                return self.back[key]
+            except KeyError:
+                value = compute()
+                self.back[key] = value
+                return value
+
+        get_or_compute = getattr(self.front, "get_or_compute", None)
+        if get_or_compute is not None:
+            return get_or_compute(key, load)
+        value = load()
+        try:
+            self.front[key] = value
+        except ValueError:
+            pass  # value too large
+        return value
+
+    def clear(self) -> None:
+        self.front.clear()
+        self.back.clear()
+
+    def __touch_back(self, key: K) -> None:
+        now = time.monotonic()
+        with self.__lock:
+            last = self.__touched.get(key)
+            if last is not None and now - last < self.touch_interval:
+                return
+            self.__touched[key] = now
+        self.__touch(key)  # type: ignore[misc]
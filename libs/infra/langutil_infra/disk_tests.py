@@ -0,0 +1,168 @@
+import multiprocessing
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from .cache import TTICache
+from .disk import DiskCache, TieredCache, dumps, loads
+
+
+class _Timer:
+    def __init__(self) -> None:
+        self.now = 1_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_serialization():
+    small = {"a": 1}
+    large = ["x" * 10] * 1000
+    assert loads(dumps(small)) == small
+    assert loads(dumps(large)) == large
+    assert len(dumps(large)) < 1000
+
+
+def test_persistence(tmp_path: Path):
+    path = tmp_path / "cache.db"
+    cache = DiskCache(path, namespace="ns")
+    cache["a"] = {"vector": [1.0, 2.0]}
+    cache[("b", 1)] = 2
+    cache.close()
+
+    reopened = DiskCache(path, namespace="ns")
+    assert reopened["a"] == {"vector": [1.0, 2.0]}
+    assert reopened[("b", 1)] == 2
+    assert sorted(map(str, reopened)) == ["('b', 1)", "a"]
+    assert "a" not in DiskCache(path, namespace="other")
+
+    del reopened["a"]
+    assert "a" not in reopened
+    with pytest.raises(KeyError):
+        del reopened["a"]
+
+
+def test_ttl(tmp_path: Path):
+    timer = _Timer()
+    cache = DiskCache(tmp_path / "cache.db", ttl=10, timer=timer)
+    cache["a"] = 1
+
+    timer.now += 9
+    assert cache["a"] == 1
+    timer.now += 2
+    assert "a" not in cache
+    assert cache.expire() == 1
+
+
+def test_tti(tmp_path: Path):
+    timer = _Timer()
+    cache = DiskCache(tmp_path / "cache.db", ttl=10, tti=True, timer=timer)
+    cache["a"] = 1
+
+    for _ in range(3):
+        timer.now += 9
+        assert cache["a"] == 1
+    timer.now += 11
+    with pytest.raises(KeyError):
+        cache["a"]
+
+
+def test_maxsize(tmp_path: Path):
+    timer = _Timer()
+    cache = DiskCache(tmp_path / "cache.db", ttl=10, maxsize=2, timer=timer)
+    for i in range(4):
+        timer.now += 1
+        cache[i] = i
+    assert cache.expire() == 2
+    assert sorted(cache) == [2, 3]
+
+
+def test_tiered(tmp_path: Path):
+    path = tmp_path / "cache.db"
+    cache = TieredCache(TTICache(maxsize=2, ttl=60), DiskCache(path, ttl=60))
+    for i in range(4):
+        cache[i] = i * 10
+
+    assert list(cache.front) == [2, 3]
+    assert cache[0] == 0
+    assert 0 in cache.front
+
+    restarted = TieredCache(TTICache(maxsize=2, ttl=60), DiskCache(path, ttl=60))
+    assert len(restarted.front) == 0
+    assert restarted[1] == 10
+    assert len(restarted) == 4
+
+
+def test_tiered_front_hits_keep_disk_entries(tmp_path: Path):
+    timer = _Timer()
+    back = DiskCache(tmp_path / "cache.db", ttl=10, tti=True, timer=timer)
+    cache = TieredCache(TTICache(maxsize=2, ttl=60), back, touch_interval=0)
+    cache["a"] = 1
+    for _ in range(3):
+        timer.now += 9
+        assert cache["a"] == 1
+    assert "a" in back
+
+    # Throttled: one touch per interval, and expired rows are not revived
+    cache = TieredCache(TTICache(maxsize=2, ttl=60), back, touch_interval=3600)
+    cache["b"] = 2
+    cache["b"]
+    timer.now += 9
+    cache["b"]
+    timer.now += 2
+    assert "b" not in back
+    back.touch("b")
+    assert "b" not in back
+
+
+def _write(args: tuple[str, int]) -> int:
+    path, worker = args
+    cache = DiskCache(path, namespace="shared")
+    for i in range(50):
+        cache[(worker, i)] = i
+    return len(cache)
+
+
+def test_multiprocess(tmp_path: Path):
+    path = str(tmp_path / "cache.db")
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(_write, [(path, w) for w in range(4)]))
+    assert len(DiskCache(path, namespace="shared")) == 200
+
+
+_forked: DiskCache | None = None
+_connects: list[int] = []
+
+
+def _forked_write(_: int) -> tuple[int, int, bool]:
+    assert _forked is not None
+    _forked[("child", os.getpid())] = 1
+    return os.getpid(), len(_forked), os.getpid() in _connects
+
+
+def test_fork_reconnects(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    global _forked
+    connect = sqlite3.connect
+
+    def recording_connect(*args, **kwargs):
+        _connects.append(os.getpid())
+        return connect(*args, **kwargs)
+
+    monkeypatch.setattr(sqlite3, "connect", recording_connect)
+    _connects.clear()
+    # Opened in the parent before the workers fork, like a cache created at
+    # import time in a preforking server
+    cache = _forked = DiskCache(tmp_path / "cache.db", namespace="forked")
+    cache["parent"] = 0
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=2, mp_context=context) as executor:
+        results = list(executor.map(_forked_write, range(4)))
+    # Every child opened its own connection; the parent kept its one
+    assert all(size >= 2 and reconnected for _, size, reconnected in results)
+    assert cache["parent"] == 0
+    assert _connects == [os.getpid()]
+    # One worker may have run every task
+    assert len(cache) == 1 + len({pid for pid, _, _ in results})
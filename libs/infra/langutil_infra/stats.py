@@ -0,0 +1,309 @@
+import functools
+import inspect
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from collections.abc import Callable, MutableMapping
+from typing import Any
+
+from cachetools import Cache
+from cachetools import cached as _cached
+
+from .cache import ShardedCache, TTICache
+from .disk import TieredCache
+
+# Upper bounds, in seconds, of the miss latency histogram buckets
+LATENCY_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+    10.0,
+    float("inf"),
+)
+
+_enabled = os.getenv("LANGUTIL_CACHE_STATS", "1").lower() not in ("0", "false", "off")
+
+
+def enable() -> None:
+    """Turn cache instrumentation on for every cache."""
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    """Turn cache instrumentation off. Functions decorated while disabled are
+    not instrumented at all; the others stop counting."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+class Histogram:
+    __slots__ = ("bounds", "count", "counts", "sum")
+
+    def __init__(self, bounds: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts, strict=True):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.bounds[-1]
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip(map(str, self.bounds), self.counts, strict=True)),
+        }
+
+
+class CacheStats:
+    """Counters for one logical cache. Updates are unlocked, so counts are
+    approximate under heavy thread contention."""
+
+    __slots__ = (
+        "__weakref__",
+        "caches",
+        "calls",
+        "evictions",
+        "expirations",
+        "latency",
+        "misses",
+        "name",
+    )
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.calls = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.latency = Histogram()
+        self.caches: list[weakref.ref[MutableMapping[Any, Any]]] = []
+
+    @property
+    def hits(self) -> int:
+        return max(self.calls - self.misses, 0)
+
+    @property
+    def size(self) -> int:
+        total = 0
+        for ref in self.caches:
+            cache = ref()
+            if cache is not None:
+                total += getattr(cache, "currsize", None) or len(cache)
+        return total
+
+    def attach(self, cache: MutableMapping[Any, Any]) -> None:
+        """Report ``cache``'s size and count its expirations and evictions.
+        The stats are unregistered once every attached cache is collected."""
+        self.caches = [ref for ref in self.caches if ref() is not None]
+        if any(ref() is cache for ref in self.caches):
+            return
+        self.caches.append(weakref.ref(cache))
+        weakref.finalize(cache, _collected, self)
+        _hook(cache, self)
+
+    def reset(self) -> None:
+        self.calls = self.misses = self.expirations = self.evictions = 0
+        self.latency = Histogram()
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / self.calls if self.calls else 0.0,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "size": self.size,
+            "latency": self.latency.snapshot(),
+        }
+
+
+_stats: dict[str, CacheStats] = {}
+# Reentrant: a garbage collection while the lock is held can run the
+# ``_collected`` finalizer of another cache on the same thread
+_stats_lock = threading.RLock()
+
+
+def cache_stats(name: str, cache: MutableMapping[Any, Any] | None = None) -> CacheStats:
+    """Return the stats registered under ``name``, attaching ``cache`` to it."""
+    with _stats_lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = CacheStats(name)
+        if cache is not None:
+            stats.attach(cache)
+            # in case a collection during attach unregistered the stats
+            _stats.setdefault(name, stats)
+    return stats
+
+
+def discard(name: str) -> None:
+    """Unregister the stats of ``name``, e.g. when its cache is dropped."""
+    with _stats_lock:
+        _stats.pop(name, None)
+
+
+def _collected(stats: CacheStats) -> None:
+    with _stats_lock:
+        stats.caches = [ref for ref in stats.caches if ref() is not None]
+        if not stats.caches and _stats.get(stats.name) is stats:
+            del _stats[stats.name]
+
+
+def snapshot() -> dict[str, dict[str, Any]]:
+    """Export the stats of every instrumented cache, keyed by name."""
+    with _stats_lock:
+        stats = list(_stats.values())
+    return {s.name: s.snapshot() for s in stats}
+
+
+def reset() -> None:
+    """Forget all registered stats."""
+    with _stats_lock:
+        _stats.clear()
+
+
+def record_misses[**P, R](
+    stats: CacheStats, function: Callable[P, R]
+) -> Callable[P, R]:
+    """Wrap the uncached ``function`` so every call counts as a miss and its
+    latency is recorded."""
+    if inspect.iscoroutinefunction(function):
+
+        @functools.wraps(function)
+        async def async_wrapper(*args: P.args, **kwargs: P.kwargs) -> Any:
+            if not _enabled:
+                return await function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                stats.misses += 1
+                stats.latency.observe(time.perf_counter() - start)
+
+        return async_wrapper  # type: ignore[return-value]
+
+    @functools.wraps(function)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        if not _enabled:
+            return function(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stats.misses += 1
+            stats.latency.observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+def record_calls[**P, R](stats: CacheStats, function: Callable[P, R]) -> Callable[P, R]:
+    """Wrap the cached ``function`` so every call is counted; hits are the
+    calls that did not reach ``record_misses``."""
+    if inspect.iscoroutinefunction(function):
+
+        @functools.wraps(function)
+        async def async_wrapper(*args: P.args, **kwargs: P.kwargs) -> Any:
+            if _enabled:
+                stats.calls += 1
+            return await function(*args, **kwargs)
+
+        return async_wrapper  # type: ignore[return-value]
+
+    @functools.wraps(function)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        if _enabled:
+            stats.calls += 1
+        return function(*args, **kwargs)
+
+    return wrapper
+
+
+def instrumented[**P, R](
+    name: str,
+    cache: MutableMapping[Any, Any],
+    decorate: Callable[[Callable[P, R]], Callable[P, R]],
+) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """Apply the caching decorator ``decorate`` with stats recorded under
+    ``name``. When instrumentation is disabled this is just ``decorate``."""
+
+    def decorator(function: Callable[P, R]) -> Callable[P, R]:
+        if not _enabled:
+            return decorate(function)
+        stats = cache_stats(name, cache)
+        return record_calls(stats, decorate(record_misses(stats, function)))
+
+    return decorator
+
+
+def cached[**P, R](
+    cache: MutableMapping[Any, Any], key: Callable[..., Any], name: str, **kwargs: Any
+) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """``cachetools.cached`` with stats recorded under ``name``."""
+    return instrumented(name, cache, _cached(cache, key=key, **kwargs))
+
+
+def _hook(cache: MutableMapping[Any, Any], stats: CacheStats) -> None:
+    if isinstance(cache, ShardedCache):
+        for shard in cache.shards:
+            _hook(shard, stats)
+        return
+    if isinstance(cache, TieredCache):
+        _hook(cache.front, stats)
+        return
+    if not isinstance(cache, Cache | TTICache):
+        return
+
+    # Both cachetools caches and TTICache evict through self.popitem() and
+    # expire through self.expire(), so instance attributes intercept them.
+    popitem = cache.popitem
+
+    def counted_popitem() -> Any:
+        item = popitem()
+        if _enabled:
+            stats.evictions += 1
+        return item
+
+    cache.popitem = counted_popitem  # type: ignore[method-assign]
+
+    expire = getattr(cache, "expire", None)
+    if expire is not None:
+
+        def counted_expire(*args: Any, **kwargs: Any) -> Any:
+            expired = expire(*args, **kwargs)
+            if _enabled and expired:
+                stats.expirations += len(expired)
+            return expired
+
+        cache.expire = counted_expire  # type: ignore[attr-defined]
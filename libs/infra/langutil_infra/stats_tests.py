@@ -0,0 +1,135 @@
+import asyncio
+import gc
+import threading
+
+import pytest
+from cachetools import LRUCache, TTLCache
+
+from . import stats
+from .cache import ShardedCache, TTICache
+
+
+class _Timer:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def reset_stats():
+    stats.reset()
+    stats.enable()
+    yield
+    stats.reset()
+    stats.enable()
+
+
+def test_hits_misses_evictions():
+    cache = LRUCache(maxsize=2)
+
+    @stats.cached(cache, key=lambda x: x, name="square")
+    def square(x: int) -> int:
+        return x * x
+
+    for x in [1, 1, 2, 3, 1]:
+        square(x)
+
+    snapshot = stats.snapshot()["square"]
+    assert snapshot["hits"] == 1
+    assert snapshot["misses"] == 4
+    assert snapshot["evictions"] == 2
+    assert snapshot["size"] == 2
+    assert snapshot["latency"]["count"] == 4
+
+
+@pytest.mark.parametrize(
+    "make_cache",
+    [
+        lambda timer: TTICache(maxsize=8, ttl=10, timer=timer),
+        lambda timer: TTLCache(maxsize=8, ttl=10, timer=timer),
+        lambda timer: ShardedCache(lambda: TTICache(maxsize=8, ttl=10, timer=timer)),
+    ],
+)
+def test_expirations(make_cache):
+    timer = _Timer()
+    cache = make_cache(timer)
+
+    @stats.cached(cache, key=lambda x: x, name="identity")
+    def identity(x: int) -> int:
+        return x
+
+    identity(1)
+    identity(2)
+    timer.now = 20
+    assert len(cache) == 0
+
+    snapshot = stats.snapshot()["identity"]
+    assert snapshot["expirations"] == 2
+    assert snapshot["size"] == 0
+
+
+def test_async():
+    cache = LRUCache(maxsize=8)
+    s = stats.cache_stats("async", cache)
+
+    async def double(x: int) -> int:
+        return x * 2
+
+    wrapped = stats.record_calls(s, stats.record_misses(s, double))
+
+    async def main():
+        assert await wrapped(1) == 2
+
+    asyncio.run(main())
+    assert stats.snapshot()["async"]["misses"] == 1
+
+
+def test_disable():
+    stats.disable()
+    cache = LRUCache(maxsize=8)
+
+    @stats.cached(cache, key=lambda x: x, name="off")
+    def identity(x: int) -> int:
+        return x
+
+    identity(1)
+    assert "off" not in stats.snapshot()
+    assert "popitem" not in vars(cache)
+
+
+def test_stats_removed_with_their_cache():
+    cache = LRUCache(maxsize=4)
+
+    @stats.cached(cache, key=lambda x: x, name="dropped")
+    def f(x: int) -> int:
+        return x
+
+    f(1)
+    assert "dropped" in stats.snapshot()
+    del f, cache
+    gc.collect()
+    assert "dropped" not in stats.snapshot()
+
+    stats.cache_stats("discarded", LRUCache(maxsize=4))
+    kept = LRUCache(maxsize=4)
+    stats.cache_stats("kept", kept)
+    stats.discard("discarded")
+    assert list(stats.snapshot()) == ["kept"]
+
+
+def test_collection_while_registering():
+    cache = LRUCache(maxsize=4)
+    s = stats.cache_stats("collected", cache)
+
+    def collect_under_lock() -> None:
+        # What a garbage collection inside cache_stats does
+        with stats._stats_lock:
+            stats._collected(s)
+
+    thread = threading.Thread(target=collect_under_lock, daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert "collected" in stats.snapshot()
@@ -1,9 +1,16 @@
-from .embeddings import EmbeddingProvider, emb_factory
+from .embeddings import (
+    BatchedEmbeddings,
+    CachedEmbeddings,
+    EmbeddingProvider,
+    emb_factory,
+)
+from .ingest import IngestPipeline, IngestStats
 from .langextract import (
     AnnotatedDocument,
     Example,
     ExampleData,
     Extraction,
+    ExtractionProgress,
     LangExtractor,
 )
 from .rerank import LlmBaseRerank, RankResult, rerank_factory
@@ -14,12 +21,18 @@ __all__ = [
     "ExampleData",
     "Example",
     "Extraction",
+    "ExtractionProgress",
     "LangExtractor",
     # rerank
     "RankResult",
     "LlmBaseRerank",
     "rerank_factory",
     # embeddings
+    "BatchedEmbeddings",
+    "CachedEmbeddings",
     "EmbeddingProvider",
     "emb_factory",
+    # ingest
+    "IngestPipeline",
+    "IngestStats",
 ]
@@ -1,10 +1,280 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections.abc import Callable, MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Literal, Protocol, overload, runtime_checkable
 
-from cachetools import TTLCache, cached
+import numpy as np
+import openai
+from cachetools import TTLCache
 from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
+from langutil_infra.cache import ShardedCache, TTICache
+from langutil_infra.stats import cache_stats, cached
+
+logger = logging.getLogger(__name__)
 
 EmbeddingProvider = Literal["openai"]
+VectorDType = Literal["float32", "float16"]
+VectorCache = MutableMapping[bytes, np.ndarray]
+
+
+def vector_cache(
+    max_bytes: int = 256 * 2**20, ttl: float = 24 * 3600, shards: int = 16
+) -> VectorCache:
+    """Thread-safe in-memory vector cache bounded by ``max_bytes`` of vectors,
+    evicting entries unused for ``ttl`` seconds."""
+    return ShardedCache(
+        lambda: TTICache(
+            maxsize=max_bytes // shards, ttl=ttl, getsizeof=lambda v: v.nbytes
+        ),
+        shards,
+    )
+
+
+class CachedEmbeddings(Embeddings):
+    """Content-addressed vector cache in front of another ``Embeddings``.
+
+    Vectors are keyed by a hash of ``namespace`` (model, base URL and the
+    options shaping vectors, such as ``dimensions``) and the text, and stored as compact ``dtype`` arrays. All misses of one call are
+    deduplicated and embedded with a single upstream request. Hit ratios are
+    exported by ``langutil_infra.stats`` under ``stats_name``.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        namespace: str,
+        cache: VectorCache | None = None,
+        dtype: VectorDType = "float32",
+        stats_name: str = "langutil_llm.embeddings.vectors",
+    ) -> None:
+        self.embeddings = embeddings
+        self.namespace = namespace.encode()
+        self.cache = cache if cache is not None else vector_cache()
+        self.dtype = np.dtype(dtype)
+        self.stats = cache_stats(stats_name, self.cache)
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors, missing = self._lookup(texts, b"d")
+        if missing:
+            start = time.perf_counter()
+            embedded = self.embeddings.embed_documents(list(missing))
+            self._store(vectors, missing, embedded, start)
+        return [v.tolist() for v in vectors]  # type: ignore[union-attr]
+
+    def embed_query(self, text: str) -> list[float]:
+        vectors, missing = self._lookup([text], b"q")
+        if missing:
+            start = time.perf_counter()
+            embedded = [self.embeddings.embed_query(text)]
+            self._store(vectors, missing, embedded, start)
+        return vectors[0].tolist()  # type: ignore[union-attr]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors, missing = self._lookup(texts, b"d")
+        if missing:
+            start = time.perf_counter()
+            embedded = await self.embeddings.aembed_documents(list(missing))
+            self._store(vectors, missing, embedded, start)
+        return [v.tolist() for v in vectors]  # type: ignore[union-attr]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        vectors, missing = self._lookup([text], b"q")
+        if missing:
+            start = time.perf_counter()
+            embedded = [await self.embeddings.aembed_query(text)]
+            self._store(vectors, missing, embedded, start)
+        return vectors[0].tolist()  # type: ignore[union-attr]
+
+    def _key(self, text: str, kind: bytes) -> bytes:
+        h = hashlib.blake2b(self.namespace, digest_size=20)
+        h.update(kind)
+        h.update(text.encode())
+        return h.digest()
+
+    def _lookup(
+        self, texts: list[str], kind: bytes
+    ) -> tuple[list[np.ndarray | None], dict[str, tuple[bytes, list[int]]]]:
+        """Return the cached vectors (``None`` on a miss) and, for each
+        distinct missing text, its key and positions in ``texts``."""
+        vectors: list[np.ndarray | None] = []
+        missing: dict[str, tuple[bytes, list[int]]] = {}
+        for i, text in enumerate(texts):
+            key = self._key(text, kind)
+            vector = self.cache.get(key)
+            if vector is None:
+                missing.setdefault(text, (key, []))[1].append(i)
+            vectors.append(vector)
+        self.stats.calls += len(texts)
+        self.stats.misses += sum(len(p) for _, p in missing.values())
+        return vectors, missing
+
+    def _store(
+        self,
+        vectors: list[np.ndarray | None],
+        missing: dict[str, tuple[bytes, list[int]]],
+        embedded: list[list[float]],
+        start: float,
+    ) -> None:
+        self.stats.latency.observe(time.perf_counter() - start)
+        matrix = np.asarray(embedded, dtype=self.dtype)
+        for (key, positions), row in zip(missing.values(), matrix, strict=True):
+            vector = row.copy()  # don't keep the whole batch alive through a view
+            try:
+                self.cache[key] = vector
+            except ValueError:
+                pass  # value too large
+            for i in positions:
+                vectors[i] = vector
+
+
+def approx_tokens(text: str) -> int:
+    """Cheap token estimate: about 4 ASCII characters per token and one token
+    per other character, as CJK text runs close to a token per character.
+    It is not a bound, so leave headroom under the model's limit."""
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+class BatchedEmbeddings(Embeddings):
+    """Token-aware, concurrent batching in front of another ``Embeddings``.
+
+    Each call deduplicates its inputs and packs them into requests of at most
+    ``max_batch_items`` texts and ``max_batch_tokens`` tokens (as counted by
+    ``count_tokens``), sent with at most ``max_concurrency`` requests in
+    flight. A request failing transiently (timeout, connection error, 429 or
+    5xx) is retried on its own up to ``max_retries`` times; other errors are
+    raised at once. Results come back in input order.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_batch_items: int = 512,
+        max_batch_tokens: int = 8192,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        count_tokens: Callable[[str], int] = approx_tokens,
+    ) -> None:
+        self.embeddings = embeddings
+        self.max_batch_items = max_batch_items
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.count_tokens = count_tokens
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+    def batches(self, texts: list[str]) -> list[list[str]]:
+        """Pack the distinct ``texts`` into request-sized batches."""
+        batches: list[list[str]] = []
+        batch: list[str] = []
+        tokens = 0
+        for text in dict.fromkeys(texts):
+            n = self.count_tokens(text)
+            if batch and (
+                len(batch) >= self.max_batch_items or tokens + n > self.max_batch_tokens
+            ):
+                batches.append(batch)
+                batch, tokens = [], 0
+            batch.append(text)
+            tokens += n
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        batches = self.batches(texts)
+        if len(batches) <= 1 or self.max_concurrency <= 1:
+            results = [self._embed_batch(batch) for batch in batches]
+        else:
+            workers = min(self.max_concurrency, len(batches))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(self._embed_batch, batches))
+        return self._collect(texts, batches, results)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        batches = self.batches(texts)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(batch: list[str]) -> list[list[float]]:
+            async with semaphore:
+                return await self._aembed_batch(batch)
+
+        results = await asyncio.gather(*(run(batch) for batch in batches))
+        return self._collect(texts, batches, results)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self.embeddings.aembed_query(text)
+
+    def _embed_batch(self, batch: list[str]) -> list[list[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embeddings.embed_documents(batch)
+            except Exception as e:
+                if attempt == self.max_retries or not _transient(e):
+                    raise
+                logger.warning(f"Embedding batch of {len(batch)} failed, retrying: {e}")
+                time.sleep(self.retry_backoff * 2**attempt)
+        raise AssertionError("unreachable")
+
+    async def _aembed_batch(self, batch: list[str]) -> list[list[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self.embeddings.aembed_documents(batch)
+            except Exception as e:
+                if attempt == self.max_retries or not _transient(e):
+                    raise
+                logger.warning(f"Embedding batch of {len(batch)} failed, retrying: {e}")
+                await asyncio.sleep(self.retry_backoff * 2**attempt)
+        raise AssertionError("unreachable")
+
+    @staticmethod
+    def _collect(
+        texts: list[str],
+        batches: list[list[str]],
+        results: list[list[list[float]]],
+    ) -> list[list[float]]:
+        vectors: dict[str, list[float]] = {}
+        for batch, embedded in zip(batches, results, strict=True):
+            vectors.update(zip(batch, embedded, strict=True))
+        return [vectors[text] for text in texts]
+
+
+def _transient(error: Exception) -> bool:
+    """Whether ``error`` is worth retrying: timeouts, dropped connections,
+    rate limits and server errors. Anything else fails the same way again."""
+    if isinstance(error, (TimeoutError, ConnectionError, openai.APIConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and (status in (408, 429) or status >= 500)
+
+
+# Client options that change the vectors returned, not just how they are fetched
+_OUTPUT_OPTIONS = ("dimensions", "deployment", "model_kwargs")
+
+
+def _output_options(kwargs: dict[str, Any]) -> str:
+    """A stable serialization of the options in ``kwargs`` shaping vectors."""
+    options = {k: kwargs[k] for k in _OUTPUT_OPTIONS if kwargs.get(k) is not None}
+    return json.dumps(options, sort_keys=True, default=repr) if options else ""
 
 
 @runtime_checkable
@@ -20,24 +290,56 @@ class EmbFactory(Protocol):
 
 
 @overload
-def emb_factory() -> EmbFactory: ...
+def emb_factory(
+    *,
+    vectors: VectorCache | Literal[False] | None = None,
+    vector_dtype: VectorDType = "float32",
+    batching: dict[str, Any] | Literal[False] | None = None,
+) -> EmbFactory: ...
 @overload
-def emb_factory(maxsize: int, ttl: float) -> EmbFactory: ...
+def emb_factory(
+    maxsize: int,
+    ttl: float,
+    *,
+    vectors: VectorCache | Literal[False] | None = None,
+    vector_dtype: VectorDType = "float32",
+    batching: dict[str, Any] | Literal[False] | None = None,
+) -> EmbFactory: ...
 @overload
-def emb_factory(cache: Any) -> EmbFactory: ...
 def emb_factory(
-    maxsize: int | None = 10, ttl: float | None = 360, cache: Any | None = None
+    cache: Any,
+    *,
+    vectors: VectorCache | Literal[False] | None = None,
+    vector_dtype: VectorDType = "float32",
+    batching: dict[str, Any] | Literal[False] | None = None,
+) -> EmbFactory: ...
+def emb_factory(
+    maxsize: int | None = 10,
+    ttl: float | None = 360,
+    cache: Any | None = None,
+    *,
+    vectors: VectorCache | Literal[False] | None = None,
+    vector_dtype: VectorDType = "float32",
+    batching: dict[str, Any] | Literal[False] | None = None,
 ) -> EmbFactory:
+    """Build a cached factory of ``Embeddings`` clients.
+
+    Unless ``vectors`` is ``False``, each client is wrapped in
+    ``CachedEmbeddings`` sharing the ``vectors`` cache (a ``vector_cache()``
+    by default), so repeated texts are not sent upstream again. Unless
+    ``batching`` is ``False``, cache misses go through ``BatchedEmbeddings``
+    configured with the ``batching`` options.
+    """
     cache = cache if cache is not None else TTLCache(maxsize=maxsize, ttl=ttl)
+    if vectors is None:
+        vectors = vector_cache()
 
-    @cached(
-        cache,
-        key=lambda provider,
-        model,
-        base_url,
-        *args,
-        **kwargs: f"{provider}_{model}_{base_url}",
-    )
+    def factory_key(
+        provider: EmbeddingProvider, model: str, base_url: str, *_args, **kwargs
+    ) -> str:
+        return f"{provider}_{model}_{base_url}_{_output_options(kwargs)}"
+
+    @cached(cache, key=factory_key, name="langutil_llm.embeddings.emb_factory")
     def factory(
         provider: EmbeddingProvider,
         model: str,
@@ -57,6 +359,15 @@ def emb_factory(
             case _:
                 ...
 
+        if batching is not False:
+            embeddings = BatchedEmbeddings(embeddings, **(batching or {}))
+        if vectors is not False:
+            embeddings = CachedEmbeddings(
+                embeddings,
+                namespace=f"{model}|{base_url}|{_output_options(kwargs)}",
+                cache=vectors,
+                dtype=vector_dtype,
+            )
         return embeddings
 
     return factory
@@ -1,6 +1,23 @@
+import asyncio
 import os
+import time
 
-from langutil_llm.embeddings import emb_factory
+import numpy as np
+import openai
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_openai import OpenAIEmbeddings
+from langutil_infra import stats
+from pydantic import Field
+
+from langutil_llm.embeddings import (
+    BatchedEmbeddings,
+    CachedEmbeddings,
+    approx_tokens,
+    emb_factory,
+    vector_cache,
+)
+from langutil_llm.testing import FakeOpenAIServer
 
 MODEL_BASE_URL = os.getenv("MODEL_BASE_URL", "http://localhost:8750/v1")
 
@@ -32,3 +49,167 @@ def test_factory2():
     emb2 = factory(**factory_params, model="gpt-3.5-turbo")
 
     assert emb1 != emb2
+
+
+class _CountingEmbeddings(DeterministicFakeEmbedding):
+    batches: list[list[str]] = Field(default_factory=list)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.batches.append(texts)
+        return super().embed_documents(texts)
+
+
+def test_cached_embeddings():
+    upstream = _CountingEmbeddings(size=8)
+    embeddings = CachedEmbeddings(upstream, namespace="m|url", stats_name="test.emb")
+
+    first = embeddings.embed_documents(["a", "b", "a"])
+    assert upstream.batches == [["a", "b"]]
+    assert first[0] == first[2]
+
+    second = embeddings.embed_documents(["b", "c", "a"])
+    assert upstream.batches == [["a", "b"], ["c"]]
+    assert second[0] == first[1]
+    assert second[2] == first[0]
+    assert np.allclose(first[0], upstream.embed_query("a"), atol=1e-6)
+
+    snapshot = stats.snapshot()["test.emb"]
+    assert snapshot["misses"] == 4
+    assert snapshot["hits"] == 2
+    assert snapshot["size"] == 3 * 8 * 4
+
+
+def test_cached_embeddings_namespace():
+    upstream = _CountingEmbeddings(size=8)
+    cache = vector_cache()
+    a = CachedEmbeddings(upstream, namespace="model-a", cache=cache, dtype="float16")
+    b = CachedEmbeddings(upstream, namespace="model-b", cache=cache, dtype="float16")
+
+    a.embed_documents(["x"])
+    b.embed_documents(["x"])
+    a.embed_documents(["x"])
+    assert upstream.batches == [["x"], ["x"]]
+    assert all(v.dtype == np.float16 for v in cache.values())
+
+
+def test_factory_wraps_embeddings():
+    factory = emb_factory()
+    emb = factory(
+        provider="openai", model="gpt-4o", base_url=MODEL_BASE_URL, api_key="apikey"
+    )
+    assert isinstance(emb, CachedEmbeddings)
+    assert emb.model == "gpt-4o"
+
+    factory = emb_factory(vectors=False)
+    emb = factory(
+        provider="openai", model="gpt-4o", base_url=MODEL_BASE_URL, api_key="apikey"
+    )
+    assert not isinstance(emb, CachedEmbeddings)
+
+
+def test_factory_keys_output_options():
+    factory = emb_factory(batching=False)
+    with FakeOpenAIServer(dim=8) as server:
+        params = {"provider": "openai", "model": "m", "api_key": "apikey"}
+        full = factory(**params, base_url=server.base_url)
+        small = factory(**params, base_url=server.base_url, dimensions=4)
+        assert small is not full
+        assert len(full.embed_documents(["x"])[0]) == 8
+        assert len(small.embed_documents(["x"])[0]) == 4
+        assert len(server.requests) == 2
+
+
+def _openai(server: FakeOpenAIServer) -> OpenAIEmbeddings:
+    return OpenAIEmbeddings(
+        model="text-embedding-3-small",
+        openai_api_base=server.base_url,
+        openai_api_key="apikey",
+        check_embedding_ctx_length=False,
+        max_retries=0,
+    )
+
+
+def test_batches():
+    batched = BatchedEmbeddings(
+        DeterministicFakeEmbedding(size=8),
+        max_batch_items=3,
+        max_batch_tokens=10,
+        count_tokens=len,
+    )
+    assert batched.batches(
+        ["aa", "bb", "aa", "cc", "dd", "eeeeeeee", "ffffffffffff"]
+    ) == [
+        ["aa", "bb", "cc"],
+        ["dd", "eeeeeeee"],
+        ["ffffffffffff"],
+    ]
+
+
+def test_approx_tokens():
+    assert approx_tokens("hello world, how are you") == 7
+    # CJK runs about a token per character, not per 4 bytes
+    assert approx_tokens("国务院发布了关于推进数字政府建设的指导意见") == 22
+    assert approx_tokens("长江 is 6300 km") == 2 + 2 + 1
+
+
+def test_batched_embeddings_concurrent():
+    with FakeOpenAIServer(latency=0.2) as server:
+        batched = BatchedEmbeddings(
+            _openai(server), max_batch_items=4, max_concurrency=4
+        )
+        texts = [f"text {i % 16}" for i in range(40)]
+
+        start = time.perf_counter()
+        vectors = batched.embed_documents(texts)
+        elapsed = time.perf_counter() - start
+
+    assert len(server.requests) == 4
+    assert sorted(t for r in server.requests for t in r) == sorted(set(texts))
+    for text, vector in zip(texts, vectors, strict=True):
+        assert np.allclose(vector, server.vector(text), atol=1e-6)
+    # 4 requests of 0.2s each run side by side, not one after another
+    assert elapsed < 0.6
+
+
+def test_batched_embeddings_retry_failed_batch():
+    failed: set[str] = set()
+
+    def fail(inputs: list[str]) -> bool:
+        if "text 5" in inputs and "text 5" not in failed:
+            failed.add("text 5")
+            return True
+        return False
+
+    with FakeOpenAIServer(fail=fail) as server:
+        batched = BatchedEmbeddings(
+            _openai(server), max_batch_items=4, max_concurrency=2, retry_backoff=0
+        )
+        texts = [f"text {i}" for i in range(12)]
+        vectors = batched.embed_documents(texts)
+
+    # 3 batches plus one retry of the batch holding "text 5"
+    assert len(server.requests) == 4
+    assert server.requests.count(["text 4", "text 5", "text 6", "text 7"]) == 2
+    assert np.allclose(vectors[5], server.vector("text 5"), atol=1e-6)
+
+
+def test_batched_embeddings_no_retry_on_client_error():
+    with FakeOpenAIServer(fail=lambda inputs: 400 * ("bad" in inputs)) as server:
+        batched = BatchedEmbeddings(_openai(server), max_batch_items=2, retry_backoff=0)
+        with pytest.raises(openai.BadRequestError):
+            batched.embed_documents(["ok", "bad"])
+
+    assert server.requests == [["ok", "bad"]]
+
+
+def test_batched_embeddings_async():
+    with FakeOpenAIServer(latency=0.1) as server:
+        batched = BatchedEmbeddings(
+            _openai(server), max_batch_items=2, max_concurrency=3
+        )
+        texts = ["a", "b", "c", "d", "e", "f", "a"]
+        vectors = asyncio.run(batched.aembed_documents(texts))
+
+    assert len(server.requests) == 3
+    assert vectors[0] == vectors[6]
+    assert np.allclose(vectors[3], server.vector("d"), atol=1e-6)
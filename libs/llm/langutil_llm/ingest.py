@@ -0,0 +1,297 @@
+import asyncio
+import itertools
+import queue
+import threading
+import time
+from collections.abc import AsyncIterable, Iterable, Iterator, MutableMapping
+from typing import Any
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+_DONE = None
+
+
+class StageStats:
+    """Documents and batches through one stage, and the time its workers
+    spent busy. Updates are unlocked, so counts are approximate."""
+
+    __slots__ = ("batches", "busy", "docs", "workers")
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self.docs = 0
+        self.batches = 0
+        self.busy = 0.0
+
+    def observe(self, docs: int, seconds: float) -> None:
+        self.docs += docs
+        self.batches += 1
+        self.busy += seconds
+
+    def snapshot(self, elapsed: float) -> dict[str, Any]:
+        return {
+            "docs": self.docs,
+            "batches": self.batches,
+            # Observed rate, and the rate the stage sustains while busy
+            "docs_per_s": self.docs / elapsed if elapsed else 0.0,
+            "busy_docs_per_s": self.docs * self.workers / self.busy
+            if self.busy
+            else 0.0,
+            "utilization": self.busy / (elapsed * self.workers) if elapsed else 0.0,
+        }
+
+
+class IngestStats:
+    """Per-stage progress of one ``IngestPipeline`` run."""
+
+    __slots__ = ("embed", "finished", "insert", "read", "skipped", "started")
+
+    def __init__(self, embed_workers: int, insert_workers: int) -> None:
+        self.read = StageStats(1)
+        self.embed = StageStats(embed_workers)
+        self.insert = StageStats(insert_workers)
+        self.skipped = 0
+        self.started = time.perf_counter()
+        self.finished: float | None = None
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    def snapshot(self) -> dict[str, Any]:
+        elapsed = self.elapsed
+        return {
+            "elapsed": elapsed,
+            "skipped": self.skipped,
+            "read": self.read.snapshot(elapsed),
+            "embed": self.embed.snapshot(elapsed),
+            "insert": self.insert.snapshot(elapsed),
+        }
+
+
+class IngestPipeline:
+    """Stream documents into a vector store, embedding some batches while
+    others are being inserted.
+
+    Documents are cut into batches of ``batch_size``. ``embed_workers``
+    threads embed them with ``embeddings`` (``store.embeddings`` by default)
+    while ``insert_workers`` threads write them with ``store.add_embeddings``;
+    a store without ``add_embeddings`` gets ``add_documents`` and embeds on
+    its own. Each queue between stages holds at most ``queue_size`` batches,
+    so the slowest stage paces the reading of the input.
+
+    With a ``checkpoint`` mapping (such as a ``DiskCache``), the number of
+    input documents inserted without gaps is saved under ``job`` as batches
+    complete, and a later run skips that many documents of the same input.
+    Batches that completed after a failed one are inserted again by the next
+    run, so documents without an ``id`` get ``"<job>:<position in the
+    input>"``: stores that replace documents by id (like
+    ``LocalVectorStore``) then keep one copy of each, while stores assigning
+    their own ids (such as Milvus collections with ``auto_id``) may hold
+    duplicates of those batches. The first failure stops the run and is
+    raised once the workers exit.
+    """
+
+    def __init__(
+        self,
+        store: VectorStore,
+        embeddings: Embeddings | None = None,
+        batch_size: int = 64,
+        embed_workers: int = 2,
+        insert_workers: int = 1,
+        queue_size: int = 4,
+        checkpoint: MutableMapping[str, int] | None = None,
+        job: str = "ingest",
+    ) -> None:
+        self.store = store
+        self.embeddings = embeddings if embeddings is not None else store.embeddings
+        self.batch_size = batch_size
+        self.embed_workers = embed_workers
+        self.insert_workers = insert_workers
+        self.queue_size = queue_size
+        self.checkpoint = checkpoint
+        self.job = job
+        self.stats = IngestStats(embed_workers, insert_workers)
+
+    def run(self, documents: Iterable[Document]) -> IngestStats:
+        """Ingest ``documents``, returning the stats of the run."""
+        stats = self.stats = IngestStats(self.embed_workers, self.insert_workers)
+        offset = self.checkpoint.get(self.job, 0) if self.checkpoint else 0
+        stats.skipped = offset
+        embed_queue: queue.Queue[Any] = queue.Queue(self.queue_size)
+        insert_queue: queue.Queue[Any] = queue.Queue(self.queue_size)
+        failed = threading.Event()
+        errors: list[BaseException] = []
+        progress = _Progress(offset)
+
+        def worker(
+            stage: StageStats, work: Any, source: queue.Queue[Any], sink: Any
+        ) -> None:
+            while (item := source.get()) is not _DONE:
+                if failed.is_set():
+                    continue  # drain until told to stop
+                start = time.perf_counter()
+                try:
+                    result = work(*item)
+                except BaseException as e:
+                    errors.append(e)
+                    failed.set()
+                    continue
+                stage.observe(len(item[1]), time.perf_counter() - start)
+                sink(result)
+
+        def forward(item: Any) -> None:
+            _put(insert_queue, item, failed)
+
+        def commit(item: tuple[int, int]) -> None:
+            done = progress.complete(*item)
+            if done is not None and self.checkpoint is not None:
+                self.checkpoint[self.job] = done
+
+        embedders = [
+            threading.Thread(
+                target=worker,
+                args=(stats.embed, self.__embed, embed_queue, forward),
+                name=f"ingest-embed-{i}",
+                daemon=True,
+            )
+            for i in range(self.embed_workers)
+        ]
+        inserters = [
+            threading.Thread(
+                target=worker,
+                args=(stats.insert, self.__insert, insert_queue, commit),
+                name=f"ingest-insert-{i}",
+                daemon=True,
+            )
+            for i in range(self.insert_workers)
+        ]
+        for thread in embedders + inserters:
+            thread.start()
+
+        try:
+            batches = itertools.batched(
+                itertools.islice(documents, offset, None), self.batch_size, strict=False
+            )
+            position = offset
+            for seq in itertools.count():
+                start = time.perf_counter()
+                batch = next(batches, None)
+                if batch is None or failed.is_set():
+                    break
+                stats.read.observe(len(batch), time.perf_counter() - start)
+                if self.checkpoint is not None:
+                    batch = self.__with_ids(batch, position)
+                position += len(batch)
+                if not _put(embed_queue, (seq, list(batch)), failed):
+                    break
+        except BaseException as e:
+            errors.append(e)
+            failed.set()
+        finally:
+            for queue_, threads in (
+                (embed_queue, embedders),
+                (insert_queue, inserters),
+            ):
+                for _ in threads:
+                    queue_.put(_DONE)
+                for thread in threads:
+                    thread.join()
+            stats.finished = time.perf_counter()
+
+        if errors:
+            raise errors[0]
+        return stats
+
+    async def arun(
+        self, documents: Iterable[Document] | AsyncIterable[Document]
+    ) -> IngestStats:
+        """Like ``run``, also accepting an async iterable, read on the
+        calling event loop while the pipeline runs in a thread."""
+        if isinstance(documents, AsyncIterable):
+            documents = _sync_iter(documents, asyncio.get_running_loop())
+        return await asyncio.to_thread(self.run, documents)
+
+    def __with_ids(self, batch: Iterable[Document], position: int) -> list[Document]:
+        """``batch`` with ids derived from the input position where missing,
+        so a resumed run writes the same ids again."""
+        return [
+            doc
+            if doc.id is not None
+            else doc.model_copy(update={"id": f"{self.job}:{i}"})
+            for i, doc in enumerate(batch, position)
+        ]
+
+    def __embed(self, seq: int, batch: list[Document]) -> tuple[int, list, Any]:
+        if not hasattr(self.store, "add_embeddings"):
+            return seq, batch, None
+        vectors = self.embeddings.embed_documents([d.page_content for d in batch])
+        return seq, batch, vectors
+
+    def __insert(
+        self, seq: int, batch: list[Document], vectors: Any
+    ) -> tuple[int, int]:
+        kwargs: dict[str, Any] = {}
+        if all(d.id is not None for d in batch):
+            kwargs["ids"] = [d.id for d in batch]
+        if vectors is None:
+            self.store.add_documents(batch, **kwargs)
+        else:
+            self.store.add_embeddings(  # type: ignore[attr-defined]
+                texts=[d.page_content for d in batch],
+                embeddings=vectors,
+                metadatas=[d.metadata for d in batch],
+                **kwargs,
+            )
+        return seq, len(batch)
+
+
+class _Progress:
+    """Tracks the documents inserted without gaps: batches may complete out
+    of order, but the checkpoint only moves past contiguous ones."""
+
+    def __init__(self, offset: int) -> None:
+        self.lock = threading.Lock()
+        self.done = offset
+        self.next = 0
+        self.pending: dict[int, int] = {}
+
+    def complete(self, seq: int, docs: int) -> int | None:
+        """Record batch ``seq``; returns the new watermark if it moved."""
+        with self.lock:
+            self.pending[seq] = docs
+            if seq != self.next:
+                return None
+            while self.next in self.pending:
+                self.done += self.pending.pop(self.next)
+                self.next += 1
+            return self.done
+
+
+def _put(queue_: queue.Queue[Any], item: Any, failed: threading.Event) -> bool:
+    """Block until ``item`` is queued, giving up once the run has failed."""
+    while not failed.is_set():
+        try:
+            queue_.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _sync_iter(
+    documents: AsyncIterable[Document], loop: asyncio.AbstractEventLoop
+) -> Iterator[Document]:
+    iterator = aiter(documents)
+
+    async def next_document() -> Document:
+        return await anext(iterator)
+
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(next_document(), loop).result()
+        except StopAsyncIteration:
+            return
@@ -0,0 +1,79 @@
+"""Docs/s of serial ``add_documents`` calls vs ``IngestPipeline`` into a
+store with a fixed insert latency, embedding through a local stand-in for an
+OpenAI-compatible endpoint.
+
+Run with ``python -m langutil_llm.ingest_bench``.
+"""
+
+import time
+
+from langchain_core.documents import Document
+from langchain_openai import OpenAIEmbeddings
+
+from .ingest import IngestPipeline
+from .testing import FakeOpenAIServer
+
+DOCS = 2048
+BATCH_SIZE = 64
+EMBED_LATENCY = 0.03
+INSERT_LATENCY = 0.03
+
+
+class Store:
+    """Stands in for a vector database: every write costs ``INSERT_LATENCY``."""
+
+    def __init__(self, embeddings: OpenAIEmbeddings) -> None:
+        self.embeddings = embeddings
+        self.rows = 0
+
+    def add_embeddings(self, texts: list[str], **_kwargs) -> None:
+        time.sleep(INSERT_LATENCY)
+        self.rows += len(texts)
+
+    def add_documents(self, documents: list[Document]) -> None:
+        vectors = self.embeddings.embed_documents([d.page_content for d in documents])
+        self.add_embeddings(
+            texts=[d.page_content for d in documents],
+            embeddings=vectors,
+            metadatas=[d.metadata for d in documents],
+        )
+
+
+def main() -> None:
+    docs = [
+        Document(page_content=f"document {i} " * 8, metadata={"i": i})
+        for i in range(DOCS)
+    ]
+    with FakeOpenAIServer(latency=EMBED_LATENCY, dim=256) as server:
+        embeddings = OpenAIEmbeddings(
+            model="fake",
+            base_url=server.base_url,
+            api_key="sk-fake",
+            check_embedding_ctx_length=False,
+        )
+        store = Store(embeddings)
+        start = time.perf_counter()
+        for i in range(0, DOCS, BATCH_SIZE):
+            store.add_documents(docs[i : i + BATCH_SIZE])
+        serial = time.perf_counter() - start
+        print(f"serial add_documents    {DOCS / serial:8.0f} docs/s")
+
+        for embed_workers in (1, 2):
+            stats = IngestPipeline(
+                Store(embeddings), batch_size=BATCH_SIZE, embed_workers=embed_workers
+            ).run(docs)
+            snapshot = stats.snapshot()
+            print(
+                f"pipeline embed_workers={embed_workers} "
+                f"{DOCS / stats.elapsed:8.0f} docs/s"
+            )
+            for stage in ("read", "embed", "insert"):
+                s = snapshot[stage]
+                print(
+                    f"  {stage:<7} busy {s['busy_docs_per_s']:9.0f} docs/s  "
+                    f"utilization {s['utilization']:5.0%}"
+                )
+
+
+if __name__ == "__main__":
+    main()
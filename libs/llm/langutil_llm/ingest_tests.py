@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from langutil_llm.ingest import IngestPipeline
+
+
+class SlowEmbeddings(Embeddings):
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(self.latency)
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+class Store:
+    """Records ``add_embeddings`` calls, sleeping ``latency`` in each."""
+
+    def __init__(self, latency: float = 0.0, fail_at: int | None = None) -> None:
+        self.latency = latency
+        self.fail_at = fail_at
+        self.embeddings = SlowEmbeddings()
+        self.rows: list[tuple[str, list[float], dict]] = []
+        self.ids: list[str] = []
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def add_embeddings(
+        self, texts, embeddings, metadatas, ids=None, **_kwargs
+    ) -> list[str]:
+        time.sleep(self.latency)
+        with self.lock:
+            self.calls += 1
+            if self.calls == self.fail_at:
+                raise RuntimeError("insert failed")
+            self.rows.extend(zip(texts, embeddings, metadatas, strict=True))
+            self.ids.extend(ids or ())
+        return [str(i) for i in range(len(texts))]
+
+
+def documents(n: int) -> list[Document]:
+    return [Document(page_content="x" * i, metadata={"i": i}) for i in range(n)]
+
+
+def test_ingest_all_documents():
+    store = Store()
+    stats = IngestPipeline(store, batch_size=4).run(documents(10))
+    assert sorted(row[2]["i"] for row in store.rows) == list(range(10))
+    assert all(row[1] == [float(len(row[0])), 1.0] for row in store.rows)
+    snapshot = stats.snapshot()
+    assert snapshot["read"]["batches"] == snapshot["insert"]["batches"] == 3
+    assert snapshot["embed"]["docs"] == snapshot["insert"]["docs"] == 10
+    assert snapshot["insert"]["docs_per_s"] > 0
+
+
+def test_ingest_overlaps_embedding_and_insert():
+    store = Store(latency=0.02)
+    pipeline = IngestPipeline(
+        store, SlowEmbeddings(latency=0.02), batch_size=2, embed_workers=1
+    )
+    start = time.perf_counter()
+    pipeline.run(documents(20))
+    elapsed = time.perf_counter() - start
+    # 10 batches: 0.4s when the stages take turns, ~0.22s when they overlap
+    assert len(store.rows) == 20
+    assert elapsed < 0.32
+
+
+def test_ingest_backpressure():
+    store = Store()
+    release = threading.Event()
+    add_embeddings = store.add_embeddings
+
+    def blocked(*args, **kwargs):
+        release.wait()
+        return add_embeddings(*args, **kwargs)
+
+    store.add_embeddings = blocked
+    read = 0
+
+    def source():
+        nonlocal read
+        for doc in documents(1000):
+            read += 1
+            yield doc
+
+    pipeline = IngestPipeline(store, batch_size=10, embed_workers=1, queue_size=2)
+    thread = threading.Thread(target=pipeline.run, args=(source(),))
+    thread.start()
+    time.sleep(0.2)
+    # One batch per worker and per queue slot, plus the one being queued
+    assert read <= 10 * 7
+    release.set()
+    thread.join()
+    assert len(store.rows) == 1000
+
+
+def test_ingest_resumes_from_checkpoint():
+    checkpoint: dict[str, int] = {}
+    failing = Store(fail_at=3)
+    pipeline = IngestPipeline(
+        failing, batch_size=4, embed_workers=1, checkpoint=checkpoint, job="j"
+    )
+    with pytest.raises(RuntimeError, match="insert failed"):
+        pipeline.run(documents(20))
+    assert checkpoint["j"] == 8
+    assert len(failing.rows) == 8
+    assert failing.ids == [f"j:{i}" for i in range(8)]
+
+    store = Store()
+    stats = IngestPipeline(store, batch_size=4, checkpoint=checkpoint, job="j").run(
+        documents(20)
+    )
+    assert stats.skipped == 8
+    assert sorted(row[2]["i"] for row in store.rows) == list(range(8, 20))
+    # Ids follow the input position, so re-inserted batches replace themselves
+    assert sorted(store.ids) == sorted(f"j:{i}" for i in range(8, 20))
+    assert checkpoint["j"] == 20
+
+
+def test_ingest_async_source():
+    async def source():
+        for doc in documents(7):
+            await asyncio.sleep(0)
+            yield doc
+
+    async def main():
+        store = Store()
+        stats = await IngestPipeline(store, batch_size=3).arun(source())
+        return store, stats
+
+    store, stats = asyncio.run(main())
+    assert sorted(row[2]["i"] for row in store.rows) == list(range(7))
+    assert stats.read.batches == 3
+
+
+def test_ingest_without_add_embeddings():
+    class Plain:
+        embeddings = None
+
+        def __init__(self) -> None:
+            self.docs: list[Document] = []
+
+        def add_documents(self, docs: list[Document]) -> None:
+            self.docs.extend(docs)
+
+    store = Plain()
+    IngestPipeline(store, batch_size=4).run(documents(6))  # type: ignore[arg-type]
+    assert sorted(d.metadata["i"] for d in store.docs) == list(range(6))
@@ -0,0 +1,130 @@
+import re
+from collections import Counter
+from typing import Any, Literal
+
+import orjson
+
+Tier = Literal["strict", "fenced", "trimmed", "closed", "repaired"]
+
+_FENCE = re.compile(r"```[a-zA-Z0-9_-]*[ \t]*\n?(.*?)(?:```|$)", re.DOTALL)
+_CLOSERS = {"{": "}", "[": "]"}
+
+tier_counts: Counter[Tier] = Counter()
+
+
+def parse_json(text: str | bytes) -> Any:
+    """Decode JSON produced by an LLM, cheapest strategy first.
+
+    Tries strict ``orjson`` first, then cheap targeted fixes (code fences,
+    surrounding prose, truncated brackets), and ``json_repair`` last. Raises
+    ``ValueError`` if nothing yields JSON. See ``parse_json_tier``.
+    """
+    return parse_json_tier(text)[0]
+
+
+def parse_json_tier(text: str | bytes) -> tuple[Any, Tier]:
+    """Like ``parse_json``, also returning the tier that decoded ``text``.
+    Usage of each tier is counted in ``tier_counts``."""
+    try:
+        return _hit(orjson.loads(text), "strict")
+    except orjson.JSONDecodeError:
+        pass
+
+    if isinstance(text, bytes):
+        text = text.decode("utf-8", errors="replace")
+
+    if "```" in text:
+        match = _FENCE.search(text)
+        if match:
+            text = match.group(1)
+            try:
+                return _hit(orjson.loads(text), "fenced")
+            except orjson.JSONDecodeError:
+                pass
+
+    trimmed = _trim(text)
+    if trimmed is not None:
+        try:
+            return _hit(orjson.loads(trimmed), "trimmed")
+        except orjson.JSONDecodeError:
+            pass
+
+    closed = _close(text)
+    if closed is not None:
+        try:
+            return _hit(orjson.loads(closed), "closed")
+        except orjson.JSONDecodeError:
+            pass
+
+    from json_repair import repair_json
+
+    repaired = repair_json(text, skip_json_loads=True)
+    try:
+        return _hit(orjson.loads(repaired), "repaired")
+    except orjson.JSONDecodeError as e:
+        raise ValueError("Failed to repair or parse the JSON string.") from e
+
+
+def tier_stats() -> dict[str, Any]:
+    """Snapshot of how often each tier decoded an input."""
+    total = sum(tier_counts.values())
+    return {
+        tier: {"count": count, "ratio": count / total}
+        for tier, count in tier_counts.most_common()
+    }
+
+
+def _hit(value: Any, tier: Tier) -> tuple[Any, Tier]:
+    tier_counts[tier] += 1
+    return value, tier
+
+
+def _trim(text: str) -> str | None:
+    """Cut prose before the first and after the last bracket."""
+    start = min((i for i in (text.find("{"), text.find("[")) if i != -1), default=-1)
+    if start == -1:
+        return None
+    end = max(text.rfind("}"), text.rfind("]"))
+    if end <= start or (start == 0 and end == len(text) - 1):
+        return None
+    return text[start : end + 1]
+
+
+def _close(text: str) -> str | None:
+    """Close the strings and brackets left open by a truncated output."""
+    start = min((i for i in (text.find("{"), text.find("[")) if i != -1), default=-1)
+    if start == -1:
+        return None
+    text = text[start:]
+
+    stack: list[str] = []
+    in_string = escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+        elif ch in "]}":
+            if not stack or stack.pop() != ch:
+                return None
+            if not stack:
+                # Complete value followed by garbage; trimming handles that
+                return None
+    if not stack:
+        return None
+
+    if in_string:
+        text = text.removesuffix("\\") + '"'
+    text = text.rstrip()
+    if text.endswith(","):
+        text = text[:-1]
+    elif text.endswith(":"):
+        text += "null"
+    return text + "".join(reversed(stack))
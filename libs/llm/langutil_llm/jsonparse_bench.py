@@ -0,0 +1,80 @@
+"""Tiered ``parse_json`` vs always running ``json_repair``, on a corpus shaped
+like the LLM outputs we receive: mostly valid JSON plus fenced, chatty,
+truncated and loosely quoted messages.
+
+Run with ``python -m langutil_llm.jsonparse_bench``.
+"""
+
+import timeit
+
+import orjson
+from json_repair import repair_json
+
+from .jsonparse import parse_json, tier_counts, tier_stats
+
+_RECORD = {
+    "title": "江苏2023年分时段电价对居民售电情况的影响分析",
+    "keywords": ["time-of-use pricing", "residential electricity", "Jiangsu"],
+    "entities": [
+        {"name": "Jiangsu", "type": "province", "confidence": 0.97},
+        {"name": "2023", "type": "year", "confidence": 0.99},
+    ],
+    "summary": "Analysis of how time-of-use tariffs shifted household demand.",
+}
+_VALID = orjson.dumps(_RECORD).decode()
+_PRETTY = orjson.dumps(_RECORD, option=orjson.OPT_INDENT_2).decode()
+
+CORPUS = {
+    "valid": _VALID,
+    "valid, indented": _PRETTY,
+    "code fence": f"```json\n{_PRETTY}\n```",
+    "prose around": f"Sure! Here is the JSON you asked for:\n{_VALID}\nLet me know if you need more.",
+    "truncated": _VALID[: len(_VALID) * 2 // 3],
+    "single quotes": _VALID.replace('"', "'"),
+    "trailing comma": _VALID[:-1] + ",}",
+}
+# Roughly the mix we see: most outputs are valid JSON already
+WEIGHTS = {
+    "valid": 70,
+    "valid, indented": 10,
+    "code fence": 8,
+    "prose around": 5,
+    "truncated": 4,
+    "single quotes": 2,
+    "trailing comma": 1,
+}
+
+
+def _legacy(text: str):
+    return orjson.loads(repair_json(text, return_objects=False, skip_json_loads=True))
+
+
+def main() -> None:
+    print(f"{'sample':<18} {'json_repair':>12} {'parse_json':>12}")
+    total_legacy = total_tiered = 0.0
+    for name, text in CORPUS.items():
+        legacy = (
+            min(timeit.repeat(lambda t=text: _legacy(t), number=200, repeat=3)) / 200
+        )
+        tiered = (
+            min(timeit.repeat(lambda t=text: parse_json(t), number=200, repeat=3)) / 200
+        )
+        total_legacy += legacy * WEIGHTS[name]
+        total_tiered += tiered * WEIGHTS[name]
+        print(f"{name:<18} {legacy * 1e6:9.1f} us {tiered * 1e6:9.1f} us")
+
+    n = sum(WEIGHTS.values())
+    print(
+        f"{'weighted mean':<18} {total_legacy / n * 1e6:9.1f} us "
+        f"{total_tiered / n * 1e6:9.1f} us"
+    )
+
+    tier_counts.clear()
+    for name, weight in WEIGHTS.items():
+        for _ in range(weight):
+            parse_json(CORPUS[name])
+    print("tiers:", {tier: s["count"] for tier, s in tier_stats().items()})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import pytest
+
+from langutil_llm.jsonparse import parse_json, parse_json_tier, tier_counts, tier_stats
+
+
+@pytest.mark.parametrize(
+    ("text", "expected", "tier"),
+    [
+        ('{"a": 1}', {"a": 1}, "strict"),
+        (b'[{"a": 1}]', [{"a": 1}], "strict"),
+        ('```json\n{"a": [1, 2]}\n```', {"a": [1, 2]}, "fenced"),
+        ('Here you go:\n```\n{"a": 1}\n```\nAnything else?', {"a": 1}, "fenced"),
+        ('Sure! {"a": 1} Hope this helps.', {"a": 1}, "trimmed"),
+        ('{"a": [1, 2, {"b": "tru', {"a": [1, 2, {"b": "tru"}]}, "closed"),
+        ('[{"a": 1}, {"a": 2},', [{"a": 1}, {"a": 2}], "closed"),
+        ('{"a": "x", "b":', {"a": "x", "b": None}, "closed"),
+        ("{'a': True, \"b\": [1, 2,]}", {"a": True, "b": [1, 2]}, "repaired"),
+    ],
+)
+def test_tiers(text, expected, tier):
+    assert parse_json_tier(text) == (expected, tier)
+
+
+def test_tier_stats():
+    tier_counts.clear()
+    parse_json('{"a": 1}')
+    parse_json('{"a": 1}')
+    parse_json('{"a": 1')
+    stats = tier_stats()
+    assert stats["strict"]["count"] == 2
+    assert stats["closed"]["ratio"] == pytest.approx(1 / 3)
+
+
+def test_unparseable():
+    with pytest.raises(ValueError):
+        parse_json("no json here")
@@ -1,13 +1,30 @@
-import dataclasses
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import deque
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from functools import partial
 from textwrap import dedent
-from typing import Any, Literal
+from typing import Any, Literal, Self, overload
 
+import orjson
+from langchain_core.rate_limiters import InMemoryRateLimiter
 from langchain_core.runnables import RunnableSerializable
 from langchain_core.runnables.config import RunnableConfig
 from langextract import data as lx_data
 from langextract import extract
+from langextract import prompt_validation as pv
+from langextract.core.base_model import BaseLanguageModel
 from langextract.factory import ModelConfig, create_model
-from pydantic import BaseModel, model_validator
+from langextract.resolver import WordAligner
+from langutil_infra import TTICache
+from langutil_infra.stats import cached
+from pydantic import BaseModel, PrivateAttr, model_validator
 
 EXTRACT_PROMPT = dedent("""\
     Extract characters, emotions, and relationships in order of appearance.
@@ -18,6 +35,7 @@ LangAnnotatedDocument = lx_data.AnnotatedDocument
 LangExtractResult = LangAnnotatedDocument | list[LangAnnotatedDocument]
 LangExampleData = lx_data.ExampleData
 LangExtraction = lx_data.Extraction
+TokenizedTextMode = Literal["exclude", "lazy", "include"]
 
 
 class Example(BaseModel):
@@ -56,23 +74,227 @@ class Extraction(BaseModel):
     @classmethod
     def validate_environment(cls, data: Any) -> Any:
         if isinstance(data, LangExtraction):
-            return dataclasses.asdict(data)
+            return _extraction_fields(data)
         return data
 
+    @classmethod
+    def from_lang(cls, extraction: LangExtraction) -> Self:
+        """Build from a langextract extraction without validation. The
+        ``attributes`` dict is shared with ``extraction``, not copied."""
+        return cls.model_construct(**_extraction_fields(extraction))
+
 
 class AnnotatedDocument(BaseModel):
     text: str | None = None
     extractions: list[Extraction] | None = None
     document_id: str | None = None
     tokenized_text: dict[str, Any] | None = None
+    _lang_document: LangAnnotatedDocument | None = PrivateAttr(default=None)
 
     @model_validator(mode="before")
     @classmethod
     def validate_environment(cls, data: Any) -> Any:
         if isinstance(data, LangAnnotatedDocument):
-            return dataclasses.asdict(data)
+            return {
+                "text": data.text,
+                "extractions": [
+                    Extraction.from_lang(e) for e in data.extractions or []
+                ],
+                "document_id": data.document_id,
+            }
         return data
 
+    @classmethod
+    def from_lang(
+        cls,
+        document: LangAnnotatedDocument,
+        tokenized_text: TokenizedTextMode = "exclude",
+    ) -> Self:
+        """Build from a langextract document without deep-copying or
+        validating it.
+
+        ``tokenized_text`` is left out by default, as it dwarfs the rest of
+        a large document. ``"lazy"`` converts it on the first
+        ``load_tokenized_text()`` call, ``"include"`` converts it right away.
+        """
+        doc = cls.model_construct(
+            text=document.text,
+            extractions=[Extraction.from_lang(e) for e in document.extractions or []],
+            document_id=document.document_id,
+            tokenized_text=None,
+        )
+        if tokenized_text == "include":
+            doc.tokenized_text = _tokenized_text_fields(document.tokenized_text)
+        elif tokenized_text == "lazy":
+            doc._lang_document = document
+        return doc
+
+    def load_tokenized_text(self) -> dict[str, Any] | None:
+        """Return ``tokenized_text``, converting it first if this document
+        was built with ``tokenized_text="lazy"``."""
+        if self.tokenized_text is None and self._lang_document is not None:
+            self.tokenized_text = _tokenized_text_fields(
+                self._lang_document.tokenized_text
+            )
+            self._lang_document = None
+        return self.tokenized_text
+
+
+def _char_interval_fields(interval: Any) -> dict[str, Any] | None:
+    if interval is None:
+        return None
+    return {"start_pos": interval.start_pos, "end_pos": interval.end_pos}
+
+
+def _extraction_fields(extraction: LangExtraction) -> dict[str, Any]:
+    status = extraction.alignment_status
+    return {
+        "extraction_class": extraction.extraction_class,
+        "extraction_text": extraction.extraction_text,
+        "char_interval": _char_interval_fields(extraction.char_interval),
+        "alignment_status": None if status is None else status.value,
+        "extraction_index": extraction.extraction_index,
+        "group_index": extraction.group_index,
+        "description": extraction.description,
+        "attributes": extraction.attributes,
+    }
+
+
+def _tokenized_text_fields(tokenized_text: Any) -> dict[str, Any] | None:
+    if tokenized_text is None:
+        return None
+    return {
+        "text": tokenized_text.text,
+        "tokens": [
+            {
+                "index": token.index,
+                "token_type": int(token.token_type),
+                "char_interval": {
+                    "start_pos": token.char_interval.start_pos,
+                    "end_pos": token.char_interval.end_pos,
+                },
+                "first_token_after_newline": token.first_token_after_newline,
+            }
+            for token in tokenized_text.tokens
+        ],
+    }
+
+
+def _model_key(
+    provider: str,
+    model: str,
+    base_url: str,
+    api_key: str,
+    model_args: dict[str, Any] | None = None,
+) -> str:
+    # Clients embed their credentials, so never share one across API keys
+    key_id = hashlib.blake2b(api_key.encode(), digest_size=8).hexdigest()
+    args = orjson.dumps(model_args or {}, option=orjson.OPT_SORT_KEYS, default=repr)
+    return f"{provider}_{model}_{base_url}_{key_id}_{args.decode()}"
+
+
+@overload
+def model_factory(): ...
+@overload
+def model_factory(maxsize: int, ttl: float): ...
+@overload
+def model_factory(cache: Any): ...
+def model_factory(
+    maxsize: int | None = 10, ttl: float | None = 3600, cache: Any | None = None
+):
+    """Build a cached factory of langextract models, so extractors sharing a
+    provider, model and endpoint also share its HTTP client. Models idle for
+    ``ttl`` seconds are dropped."""
+    cache = cache if cache is not None else TTICache(maxsize=maxsize, ttl=ttl)
+
+    @cached(
+        cache,
+        key=_model_key,
+        lock=threading.Lock(),
+        name="langutil_llm.langextract.model_factory",
+    )
+    def factory(
+        provider: str,
+        model: str,
+        base_url: str,
+        api_key: str,
+        model_args: dict[str, Any] | None = None,
+    ) -> BaseLanguageModel:
+        config = ModelConfig(
+            model_id=model,
+            provider=provider,
+            provider_kwargs={
+                **(model_args or {}),
+                "base_url": base_url,
+                "api_key": api_key,
+            },
+        )
+        return create_model(config)
+
+    return factory
+
+
+_models = model_factory()
+
+
+class ExtractionProgress:
+    """Running counters of an extractor's documents. Safe to read from any
+    thread while a batch is in progress."""
+
+    __slots__ = ("_lock", "chars", "completed", "failed", "started", "submitted")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.chars = 0
+        self.started: float | None = None
+
+    @property
+    def pending(self) -> int:
+        return self.submitted - self.completed - self.failed
+
+    @property
+    def elapsed(self) -> float:
+        return 0.0 if self.started is None else time.monotonic() - self.started
+
+    @property
+    def throughput(self) -> float:
+        """Finished documents per second since the first submission."""
+        elapsed = self.elapsed
+        return (self.completed + self.failed) / elapsed if elapsed else 0.0
+
+    def submit(self) -> None:
+        with self._lock:
+            if self.started is None:
+                self.started = time.monotonic()
+            self.submitted += 1
+
+    def done(self, chars: int, error: bool = False) -> None:
+        with self._lock:
+            if error:
+                self.failed += 1
+            else:
+                self.completed += 1
+                self.chars += chars
+
+    def reset(self) -> None:
+        with self._lock:
+            self.submitted = self.completed = self.failed = self.chars = 0
+            self.started = None
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "pending": self.pending,
+            "chars": self.chars,
+            "elapsed": self.elapsed,
+            "docs_per_sec": self.throughput,
+        }
+
 
 class LangExtractor(RunnableSerializable[str, AnnotatedDocument]):
     prompt_template: str = EXTRACT_PROMPT
@@ -82,28 +304,397 @@ class LangExtractor(RunnableSerializable[str, AnnotatedDocument]):
     api_key: str
     model_provider: Literal["openai"] = "openai"
     model_args: dict[str, Any] | None = None
+    max_concurrency: int = 8
+    """Model requests in flight at once for one call, and documents extracted
+    at the same time by ``batch``, ``abatch`` and ``astream``, unless the
+    config sets ``max_concurrency``. The chunks of long documents share
+    these request slots with the other documents of the call."""
+    requests_per_second: float | None = None
+    """Upper bound on documents started per second, shared by every call of
+    this extractor."""
+    chunk_size: int | None = None
+    """Texts longer than this many characters are split at paragraph or
+    sentence boundaries and the chunks extracted concurrently."""
+    chunk_overlap: int = 200
+    """Characters shared by consecutive chunks, so entities crossing a chunk
+    boundary are seen whole by one of them."""
+    tokenized_text: TokenizedTextMode = "exclude"
+    """Whether results carry langextract's token list; see
+    ``AnnotatedDocument.from_lang``."""
 
-    def invoke(self, input: str, config: RunnableConfig | None = None, **kwargs: Any):
-        config = ModelConfig(
-            model_id=self.model,
-            provider=self.model_provider,
-            provider_kwargs={
-                **(self.model_args or {}),
-                "base_url": self.base_url,
-                "api_key": self.api_key,
-            },
+    _examples: list[LangExampleData] | None = PrivateAttr(default=None)
+    _limiter: InMemoryRateLimiter | None = PrivateAttr(default=None)
+    _progress: ExtractionProgress = PrivateAttr(default_factory=ExtractionProgress)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, _context: Any, /) -> None:
+        # Copies start over: ``model_copy(update=...)`` may change the examples
+        # or rate, and progress and rate limits belong to one extractor
+        self._examples = None
+        self._limiter = None
+        self._progress = ExtractionProgress()
+        self._lock = threading.Lock()
+
+    def __copy__(self) -> Self:
+        copied = super().__copy__()
+        copied.model_post_init(None)
+        return copied
+
+    def __deepcopy__(self, memo: dict[int, Any] | None = None) -> Self:
+        copied = self.__copy__()
+        object.__setattr__(copied, "__dict__", deepcopy(self.__dict__, memo))
+        return copied
+
+    @property
+    def _lang_examples(self) -> list[LangExampleData]:
+        """The examples converted to langextract objects. Their alignment
+        with the example texts is checked here once, not on every call."""
+        with self._lock:
+            if self._examples is None:
+                examples = [example.to_lang_example_data() for example in self.examples]
+                report = pv.validate_prompt_alignment(
+                    examples=examples,
+                    aligner=WordAligner(),
+                    policy=pv.AlignmentPolicy(),
+                )
+                pv.handle_alignment_report(
+                    report, level=pv.PromptValidationLevel.WARNING
+                )
+                self._examples = examples
+            return self._examples
+
+    @property
+    def _rate_limiter(self) -> InMemoryRateLimiter | None:
+        if self.requests_per_second is None:
+            return None
+        with self._lock:
+            if self._limiter is None:
+                self._limiter = InMemoryRateLimiter(
+                    requests_per_second=self.requests_per_second,
+                    check_every_n_seconds=min(0.1, 1 / self.requests_per_second),
+                )
+            return self._limiter
+
+    @property
+    def progress(self) -> ExtractionProgress:
+        """Progress and throughput of the documents this extractor processed."""
+        return self._progress
+
+    def invoke(self, input: str, _config: RunnableConfig | None = None, **_kwargs: Any):
+        return self._extract(
+            input, threading.Semaphore(self.max_concurrency), show_progress=True
+        )
+
+    async def ainvoke(
+        self, input: str, config: RunnableConfig | None = None, **_kwargs: Any
+    ):
+        return (await self.abatch([input], config))[0]
+
+    def batch(
+        self,
+        inputs: list[str],
+        config: RunnableConfig | list[RunnableConfig] | None = None,
+        *,
+        return_exceptions: bool = False,
+        **_kwargs: Any,
+    ) -> list[AnnotatedDocument | Any]:
+        """Extract ``inputs`` on a thread pool bounded by ``max_concurrency``.
+
+        With ``return_exceptions`` a failed document yields its exception in
+        place of its result instead of failing the whole batch.
+        """
+        if not inputs:
+            return []
+        concurrency = self._concurrency(config)
+        requests = threading.Semaphore(concurrency)
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(inputs))) as executor:
+            futures = [
+                executor.submit(self._extract_one, text, requests) for text in inputs
+            ]
+            try:
+                return [
+                    self._result(
+                        future.exception() or future.result(), return_exceptions
+                    )
+                    for future in futures
+                ]
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    async def abatch(
+        self,
+        inputs: list[str],
+        config: RunnableConfig | list[RunnableConfig] | None = None,
+        *,
+        return_exceptions: bool = False,
+        **_kwargs: Any,
+    ) -> list[AnnotatedDocument | Any]:
+        """Async ``batch``; at most ``max_concurrency`` documents run at once,
+        on threads of the call's own."""
+        if not inputs:
+            return []
+        concurrency = self._concurrency(config)
+        semaphore = asyncio.Semaphore(concurrency)
+        requests = threading.Semaphore(concurrency)
+        executor = ThreadPoolExecutor(max_workers=min(concurrency, len(inputs)))
+        try:
+            results = await asyncio.gather(
+                *(
+                    self._aextract_one(text, semaphore, requests, executor)
+                    for text in inputs
+                ),
+                return_exceptions=True,
+            )
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return [self._result(r, return_exceptions) for r in results]
+
+    async def astream(
+        self,
+        input: str | Iterable[str] | AsyncIterable[str],
+        config: RunnableConfig | None = None,
+        *,
+        return_exceptions: bool = False,
+        **_kwargs: Any,
+    ) -> AsyncIterator[AnnotatedDocument | Any]:
+        """Extract one document, or a stream of them, yielding results in
+        input order as soon as they and all documents before them are done.
+
+        Inputs are pulled lazily, keeping at most twice ``max_concurrency``
+        documents in flight, so arbitrarily long streams use bounded memory.
+        """
+        if isinstance(input, str):
+            input = [input]
+        concurrency = self._concurrency(config)
+        semaphore = asyncio.Semaphore(concurrency)
+        requests = threading.Semaphore(concurrency)
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        window: deque[asyncio.Task[AnnotatedDocument]] = deque()
+        texts = _aiter(input)
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(window) < 2 * concurrency:
+                    try:
+                        text = await anext(texts)
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    window.append(
+                        asyncio.ensure_future(
+                            self._aextract_one(text, semaphore, requests, executor)
+                        )
+                    )
+                if not window:
+                    return
+                task = window.popleft()
+                try:
+                    result = await task
+                except Exception as e:
+                    result = e
+                yield self._result(result, return_exceptions)
+        finally:
+            for task in window:
+                task.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _concurrency(self, config: RunnableConfig | list[RunnableConfig] | None) -> int:
+        if isinstance(config, list):
+            config = config[0] if config else None
+        return max((config or {}).get("max_concurrency") or self.max_concurrency, 1)
+
+    @staticmethod
+    def _result(result: Any, return_exceptions: bool) -> Any:
+        if isinstance(result, BaseException) and not return_exceptions:
+            raise result
+        return result
+
+    def _extract_one(
+        self, text: str, requests: threading.Semaphore
+    ) -> AnnotatedDocument:
+        self.progress.submit()
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire()
+        try:
+            result = self._extract(text, requests, show_progress=False)
+        except Exception:
+            self.progress.done(len(text), error=True)
+            raise
+        self.progress.done(len(text))
+        return result
+
+    async def _aextract_one(
+        self,
+        text: str,
+        semaphore: asyncio.Semaphore,
+        requests: threading.Semaphore,
+        executor: ThreadPoolExecutor,
+    ) -> AnnotatedDocument:
+        async with semaphore:
+            self.progress.submit()
+            if self._rate_limiter is not None:
+                await self._rate_limiter.aacquire()
+            try:
+                # langextract models are synchronous; the call's own threads
+                # keep it off the loop's default executor
+                result = await asyncio.get_running_loop().run_in_executor(
+                    executor, partial(self._extract, text, requests, False)
+                )
+            except Exception:
+                self.progress.done(len(text), error=True)
+                raise
+            self.progress.done(len(text))
+            return result
+
+    def _extract(self, input: str, requests: threading.Semaphore, show_progress: bool):
+        """Extract ``input``, holding one of the ``requests`` slots of the call
+        for each model request."""
+        if self.chunk_size is not None and len(input) > self.chunk_size:
+            return self._extract_chunked(input, requests)
+        with requests:
+            return self._extract_text(input, show_progress)
+
+    def _extract_chunked(
+        self, text: str, requests: threading.Semaphore
+    ) -> AnnotatedDocument:
+        chunks = split_text(text, self.chunk_size or len(text), self.chunk_overlap)
+
+        def extract_chunk(chunk: tuple[int, str]) -> AnnotatedDocument:
+            with requests:
+                return self._extract_text(chunk[1], show_progress=False)
+
+        # Chunk threads of concurrent documents wait on the same slots, so the
+        # call never has more than its concurrency of requests in flight
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_concurrency, len(chunks))
+        ) as executor:
+            docs = list(executor.map(extract_chunk, chunks))
+        return merge_documents(
+            text, [(offset, doc) for (offset, _), doc in zip(chunks, docs, strict=True)]
         )
-        model = create_model(config)
 
-        examples = [example.to_lang_example_data() for example in self.examples]
+    def _extract_text(self, input: str, show_progress: bool):
+        model = _models(
+            self.model_provider,
+            self.model,
+            self.base_url,
+            self.api_key,
+            self.model_args,
+        )
 
         result: LangExtractResult = extract(
             text_or_documents=input,
             prompt_description=self.prompt_template,
-            examples=examples,
+            examples=self._lang_examples,
             model=model,
+            prompt_validation_level=pv.PromptValidationLevel.OFF,
+            show_progress=show_progress,
         )
         if isinstance(result, list):
-            return [AnnotatedDocument.model_validate(doc) for doc in result]
+            return [
+                AnnotatedDocument.from_lang(doc, self.tokenized_text) for doc in result
+            ]
         else:
-            return AnnotatedDocument.model_validate(result)
+            return AnnotatedDocument.from_lang(result, self.tokenized_text)
+
+
+# Paragraph breaks, and whitespace after ASCII or CJK full-width sentence ends
+_BOUNDARY = re.compile(r"\n\s*\n|(?<=[.!?;])\s+|(?<=[\u3002\uff01\uff1f\uff1b])\s*")
+
+
+def split_text(text: str, chunk_size: int, overlap: int = 0) -> list[tuple[int, str]]:
+    """Split ``text`` into ``(offset, chunk)`` pairs of at most ``chunk_size``
+    characters, cut at paragraph or sentence boundaries where possible.
+
+    Consecutive chunks share about ``overlap`` characters, starting at a
+    sentence boundary when one falls inside the overlap.
+    """
+    if chunk_size <= overlap:
+        raise ValueError("chunk_size must be larger than overlap")
+    # Offsets at which a new sentence or paragraph starts
+    starts = [m.end() for m in _BOUNDARY.finditer(text) if 0 < m.end() < len(text)]
+
+    chunks = []
+    start = 0
+    while True:
+        limit = start + chunk_size
+        if limit >= len(text):
+            chunks.append((start, text[start:]))
+            return chunks
+        # Cut at the last boundary that keeps the chunk at least half full
+        i = bisect_right(starts, limit) - 1
+        end = starts[i] if i >= 0 and starts[i] > start + chunk_size // 2 else limit
+        chunks.append((start, text[start:end]))
+
+        # Next chunk starts at the first boundary inside the overlap
+        i = bisect_left(starts, end - overlap)
+        next_start = starts[i] if i < len(starts) and starts[i] < end else end - overlap
+        start = max(next_start, start + 1)
+
+
+def merge_documents(
+    text: str, chunks: Iterable[tuple[int, AnnotatedDocument]]
+) -> AnnotatedDocument:
+    """Merge documents extracted from chunks of ``text`` starting at the given
+    offsets into one document of the whole text.
+
+    ``char_interval`` offsets are rebased onto ``text``; an extraction found
+    again at the same place by an overlapping chunk is kept once. Extractions
+    are ordered by position and renumbered.
+    """
+    seen: set[tuple[Any, ...]] = set()
+    merged: list[Extraction] = []
+    group_offset = 0
+    document_id = None
+    for offset, doc in chunks:
+        document_id = document_id or doc.document_id
+        groups = 0
+        for extraction in doc.extractions or []:
+            interval = extraction.char_interval
+            if interval is not None and interval.get("start_pos") is not None:
+                interval = {
+                    **interval,
+                    "start_pos": interval["start_pos"] + offset,
+                    "end_pos": interval["end_pos"] + offset,
+                }
+                span = (interval["start_pos"], interval["end_pos"])
+            else:
+                interval = span = None
+            key = (extraction.extraction_class, extraction.extraction_text, span)
+            if key in seen:
+                continue
+            seen.add(key)
+            if extraction.group_index is not None:
+                groups = max(groups, extraction.group_index + 1)
+            merged.append(
+                extraction.model_copy(
+                    update={
+                        "char_interval": interval,
+                        "group_index": None
+                        if extraction.group_index is None
+                        else extraction.group_index + group_offset,
+                    }
+                )
+            )
+        group_offset += groups
+
+    # Unaligned extractions have no position; keep them last
+    merged.sort(
+        key=lambda e: (
+            len(text) if e.char_interval is None else e.char_interval["start_pos"]
+        )
+    )
+    for index, extraction in enumerate(merged, 1):
+        extraction.extraction_index = index
+    return AnnotatedDocument(text=text, extractions=merged, document_id=document_id)
+
+
+async def _aiter[T](items: Iterable[T] | AsyncIterable[T]) -> AsyncIterator[T]:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
@@ -0,0 +1,87 @@
+"""Cold vs warm ``LangExtractor.invoke`` latency against a local stand-in
+for an OpenAI-compatible endpoint.
+
+Cold calls start from an empty model cache and a fresh extractor, which is
+what every call used to pay. Run with ``python -m langutil_llm.langextract_bench``.
+"""
+
+import json
+import statistics
+import time
+
+from .langextract import Example, ExampleData, LangExtractor, _models
+from .testing import FakeOpenAIServer
+
+EXAMPLES = [
+    ExampleData(
+        text="ROMEO. But soft! What light through yonder window breaks? "
+        "It is the east, and Juliet is the sun.",
+        extractions=[
+            Example(
+                extraction_class="character",
+                extraction_text="ROMEO",
+                attributes={"emotional_state": "wonder"},
+            ),
+            Example(
+                extraction_class="emotion",
+                extraction_text="But soft!",
+                attributes={"feeling": "gentle awe"},
+            ),
+            Example(
+                extraction_class="relationship",
+                extraction_text="Juliet is the sun",
+                attributes={"type": "metaphor"},
+            ),
+        ],
+    ),
+] * 3
+
+TEXT = "Lady Juliet gazed longingly at the stars, her heart aching for Romeo"
+
+
+def _reply(_messages: list[dict]) -> str:
+    return json.dumps(
+        {
+            "extractions": [
+                {"character": "Juliet", "character_attributes": {"state": "longing"}}
+            ]
+        }
+    )
+
+
+def _extractor(base_url: str) -> LangExtractor:
+    return LangExtractor(model="m", base_url=base_url, api_key="k", examples=EXAMPLES)
+
+
+def _time(call, rounds: int) -> list[float]:
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main(rounds: int = 20) -> None:
+    with FakeOpenAIServer(reply=_reply) as server:
+        _extractor(server.base_url).invoke(TEXT)  # import and connect warm-up
+
+        def cold() -> None:
+            _models.cache_clear()
+            _extractor(server.base_url).invoke(TEXT)
+
+        warm_extractor = _extractor(server.base_url)
+        results = {
+            "cold": _time(cold, rounds),
+            "warm": _time(lambda: warm_extractor.invoke(TEXT), rounds),
+        }
+
+    for name, timings in results.items():
+        print(
+            f"{name:<5} median {statistics.median(timings) * 1e3:6.1f} ms  "
+            f"min {min(timings) * 1e3:6.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
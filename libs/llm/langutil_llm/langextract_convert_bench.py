@@ -0,0 +1,80 @@
+"""Converting langextract results into ``AnnotatedDocument``: the previous
+``dataclasses.asdict`` + validation path vs ``AnnotatedDocument.from_lang``.
+
+Documents are synthetic: repeated prose with one aligned extraction every
+few sentences, tokenized up front as langextract does during alignment.
+Run with ``python -m langutil_llm.langextract_convert_bench``.
+"""
+
+import dataclasses
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+from langextract import data as lx_data
+
+from .langextract import AnnotatedDocument
+
+SENTENCE = "Lady Juliet gazed longingly at the stars, her heart aching for Romeo. "
+
+
+def _document(size: int) -> lx_data.AnnotatedDocument:
+    text = SENTENCE * (size // len(SENTENCE))
+    extractions = [
+        lx_data.Extraction(
+            extraction_class="character",
+            extraction_text="Juliet",
+            char_interval=lx_data.CharInterval(start + 5, start + 11),
+            alignment_status=lx_data.AlignmentStatus.MATCH_EXACT,
+            extraction_index=i + 1,
+            group_index=i,
+            attributes={"emotional_state": "longing"},
+        )
+        for i, start in enumerate(range(0, len(text), len(SENTENCE) * 4))
+    ]
+    doc = lx_data.AnnotatedDocument(text=text, extractions=extractions)
+    _ = doc.tokenized_text
+    return doc
+
+
+def _legacy(doc: lx_data.AnnotatedDocument) -> AnnotatedDocument:
+    return AnnotatedDocument.model_validate(dataclasses.asdict(doc))
+
+
+def _elapsed(convert: Callable[[Any], Any], doc: Any) -> float:
+    start = time.perf_counter()
+    convert(doc)
+    return time.perf_counter() - start
+
+
+def _peak(convert: Callable[[Any], Any], doc: Any) -> int:
+    tracemalloc.start()
+    try:
+        convert(doc)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main() -> None:
+    converters: dict[str, Callable[[Any], Any]] = {
+        "asdict + validate": _legacy,
+        "from_lang": AnnotatedDocument.from_lang,
+        "from_lang lazy": lambda d: AnnotatedDocument.from_lang(d, "lazy"),
+        "from_lang include": lambda d: AnnotatedDocument.from_lang(d, "include"),
+    }
+    for size in (1 << 20, 4 << 20):
+        doc = _document(size)
+        print(
+            f"{size >> 20} MiB, {len(doc.extractions or [])} extractions, "
+            f"{len(doc.tokenized_text.tokens)} tokens"  # type: ignore[union-attr]
+        )
+        for name, convert in converters.items():
+            elapsed = min(_elapsed(convert, doc) for _ in range(3))
+            peak = _peak(convert, doc)
+            print(f"  {name:<18} {elapsed * 1e3:8.1f} ms  peak {peak / 2**20:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,327 @@
+import asyncio
+import itertools
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langextract import data as lx_data
+
+from langutil_llm import langextract
+from langutil_llm.langextract import (
+    AnnotatedDocument,
+    Example,
+    ExampleData,
+    LangExtractor,
+    model_factory,
+    split_text,
+)
+from langutil_llm.testing import FakeOpenAIServer
+
+EXAMPLES = [
+    ExampleData(
+        text="ROMEO. But soft! What light through yonder window breaks?",
+        extractions=[
+            Example(
+                extraction_class="character",
+                extraction_text="ROMEO",
+                attributes={"emotional_state": "wonder"},
+            ),
+        ],
+    ),
+]
+
+
+def reply(_messages):
+    return json.dumps(
+        {"extractions": [{"character": "Juliet", "character_attributes": {}}]}
+    )
+
+
+def test_model_factory():
+    factory = model_factory()
+    model = factory("openai", "m", "http://localhost/v1", "k")
+    assert factory("openai", "m", "http://localhost/v1", "k") is model
+    assert factory("openai", "m", "http://localhost/v1", "k2") is not model
+    assert factory("openai", "m", "http://localhost/v1", "k", {"a": 1}) is not model
+
+
+def test_extractor_reuses_model_and_examples(monkeypatch):
+    created = []
+    create_model = langextract.create_model
+    monkeypatch.setattr(
+        langextract,
+        "create_model",
+        lambda config: created.append(config) or create_model(config),
+    )
+    with FakeOpenAIServer(reply=reply) as server:
+        extractor = LangExtractor(
+            model="m", base_url=server.base_url, api_key="k", examples=EXAMPLES
+        )
+        doc = extractor.invoke("Lady Juliet gazed longingly at the stars")
+        examples = extractor._lang_examples
+        extractor.invoke("Juliet again")
+
+        other = LangExtractor(
+            model="m", base_url=server.base_url, api_key="k", examples=EXAMPLES
+        )
+        other.invoke("And Juliet once more")
+
+    assert [e.extraction_text for e in doc.extractions or []] == ["Juliet"]
+    assert extractor._lang_examples is examples
+    assert len(server.completions) == 3
+    assert len(created) == 1
+
+
+def test_copies_get_their_own_state():
+    extractor = LangExtractor(
+        model="m",
+        base_url="http://localhost/v1",
+        api_key="k",
+        examples=EXAMPLES,
+        requests_per_second=10,
+    )
+    examples = extractor._lang_examples
+    extractor.progress.submit()
+
+    copied = extractor.model_copy(update={"examples": [], "requests_per_second": 1})
+    assert copied._lang_examples == []
+    assert extractor._lang_examples is examples
+    assert copied._rate_limiter is not extractor._rate_limiter
+    assert copied._rate_limiter.requests_per_second == 1
+    assert copied.progress.submitted == 0
+
+    deep = extractor.model_copy(deep=True)
+    assert deep.examples == extractor.examples
+    assert deep._lang_examples is not examples
+    assert deep.progress is not extractor.progress
+
+
+def _extractor(base_url: str, **kwargs) -> LangExtractor:
+    return LangExtractor(
+        model="m", base_url=base_url, api_key="k", examples=EXAMPLES, **kwargs
+    )
+
+
+def test_batch_concurrent_ordered_with_errors():
+    texts = ["Juliet one", "Juliet BROKEN", "Juliet three", "Juliet four"]
+    with FakeOpenAIServer(
+        latency=0.2, reply=reply, fail=lambda prompts: "BROKEN" in prompts[-1]
+    ) as server:
+        extractor = _extractor(server.base_url, max_concurrency=4)
+        start = time.perf_counter()
+        results = extractor.batch(texts, return_exceptions=True)
+        elapsed = time.perf_counter() - start
+
+    assert [r.text if isinstance(r, AnnotatedDocument) else None for r in results] == [
+        "Juliet one",
+        None,
+        "Juliet three",
+        "Juliet four",
+    ]
+    assert isinstance(results[1], Exception)
+    assert elapsed < 0.6
+    progress = extractor.progress.snapshot()
+    assert progress["completed"] == 3
+    assert progress["failed"] == 1
+    assert progress["pending"] == 0
+    assert progress["docs_per_sec"] > 0
+
+
+def test_abatch_and_ainvoke():
+    async def run(extractor):
+        return await extractor.abatch(["Juliet a", "Juliet b", "Juliet c"]), (
+            await extractor.ainvoke("Juliet d")
+        )
+
+    with FakeOpenAIServer(latency=0.2, reply=reply) as server:
+        extractor = _extractor(server.base_url, max_concurrency=2)
+        start = time.perf_counter()
+        docs, doc = asyncio.run(run(extractor))
+        elapsed = time.perf_counter() - start
+
+    assert [d.text for d in docs] == ["Juliet a", "Juliet b", "Juliet c"]
+    assert doc.text == "Juliet d"
+    # Two rounds of two documents for abatch, one more for ainvoke
+    assert 0.55 < elapsed < 1.0
+
+
+def test_async_calls_use_their_own_threads():
+    async def run(extractor):
+        # A busy default executor must not cap the call's concurrency
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=1)
+        )
+        return await extractor.abatch([f"Juliet {i}" for i in range(4)])
+
+    with FakeOpenAIServer(latency=0.2, reply=reply) as server:
+        extractor = _extractor(server.base_url, max_concurrency=4)
+        start = time.perf_counter()
+        docs = asyncio.run(run(extractor))
+        elapsed = time.perf_counter() - start
+
+    assert len(docs) == 4
+    assert elapsed < 0.6
+
+
+def test_astream_in_order():
+    async def texts():
+        for i in range(6):
+            yield f"Juliet {i}"
+
+    async def run(extractor):
+        return [doc.text async for doc in extractor.astream(texts())]
+
+    with FakeOpenAIServer(latency=0.05, reply=reply) as server:
+        extractor = _extractor(server.base_url, max_concurrency=3)
+        texts_out = asyncio.run(run(extractor))
+
+    assert texts_out == [f"Juliet {i}" for i in range(6)]
+
+
+def test_rate_limit():
+    with FakeOpenAIServer(reply=reply) as server:
+        extractor = _extractor(server.base_url, requests_per_second=10)
+        start = time.perf_counter()
+        extractor.batch(["Juliet a", "Juliet b", "Juliet c", "Juliet d"])
+        elapsed = time.perf_counter() - start
+
+    assert elapsed > 0.3
+
+
+def test_split_text():
+    text = (
+        "Juliet went home. Romeo ran away!\n\nTybalt fought. 朱丽叶回家了。罗密欧跑了\uff01"
+        * 5
+    )
+    chunks = split_text(text, 60, 20)
+
+    assert len(chunks) > 1
+    assert chunks[0][0] == 0
+    assert sum(len(c) for _, c in chunks[-1:]) + chunks[-1][0] == len(text)
+    for (offset, chunk), (next_offset, _) in itertools.pairwise(chunks):
+        assert text[offset : offset + len(chunk)] == chunk
+        assert len(chunk) <= 60
+        # Consecutive chunks overlap and leave no gap
+        assert offset < next_offset <= offset + len(chunk)
+
+
+NAMES = [f"Person{i:02d}" for i in range(40)]
+
+
+def reply_names(messages):
+    question = messages[-1]["content"].rsplit("Q: ", 1)[1]
+    return json.dumps(
+        {
+            "extractions": [
+                {"character": name, "character_attributes": {}}
+                for name in re.findall(r"Person\d\d", question)
+            ]
+        }
+    )
+
+
+def test_long_document():
+    text = " ".join(f"{name} walked into the garden and sat down." for name in NAMES)
+    with FakeOpenAIServer(latency=0.2, reply=reply_names) as server:
+        extractor = _extractor(
+            server.base_url, chunk_size=500, chunk_overlap=100, max_concurrency=8
+        )
+        extractor.invoke(NAMES[0])  # provider plugins load on first use
+        server.completions.clear()
+        start = time.perf_counter()
+        doc = extractor.invoke(text)
+        elapsed = time.perf_counter() - start
+
+    assert len(server.completions) > 3
+    assert elapsed < 0.6
+    assert doc.text == text
+    extractions = doc.extractions or []
+    assert [e.extraction_text for e in extractions] == NAMES
+    for index, extraction in enumerate(extractions, 1):
+        interval = extraction.char_interval or {}
+        start_pos, end_pos = interval["start_pos"], interval["end_pos"]
+        assert text[start_pos:end_pos] == extraction.extraction_text
+        assert extraction.extraction_index == index
+
+
+def test_chunks_share_the_request_limit():
+    text = " ".join(f"{name} walked into the garden and sat down." for name in NAMES)
+    lock = threading.Lock()
+    in_flight = peak = 0
+
+    def reply_slowly(messages):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.05)
+        with lock:
+            in_flight -= 1
+        return reply_names(messages)
+
+    with FakeOpenAIServer(reply=reply_slowly) as server:
+        extractor = _extractor(
+            server.base_url, chunk_size=500, chunk_overlap=100, max_concurrency=3
+        )
+        docs = extractor.batch([text, text, text])
+
+    assert len(server.completions) > 9
+    assert [d.text for d in docs] == [text] * 3
+    assert peak == 3
+
+
+def _lang_document():
+    return lx_data.AnnotatedDocument(
+        document_id="doc_1",
+        text="Juliet loves Romeo",
+        extractions=[
+            lx_data.Extraction(
+                extraction_class="character",
+                extraction_text="Juliet",
+                char_interval=lx_data.CharInterval(0, 6),
+                alignment_status=lx_data.AlignmentStatus.MATCH_EXACT,
+                extraction_index=1,
+                group_index=0,
+                attributes={"role": "lover"},
+            ),
+            lx_data.Extraction(extraction_class="character", extraction_text="Paris"),
+        ],
+    )
+
+
+def test_from_lang():
+    lang = _lang_document()
+    doc = AnnotatedDocument.from_lang(lang)
+
+    assert doc == AnnotatedDocument.model_validate(lang)
+    assert doc.document_id == "doc_1"
+    assert doc.tokenized_text is None
+    juliet, paris = doc.extractions or []
+    assert juliet.char_interval == {"start_pos": 0, "end_pos": 6}
+    assert juliet.alignment_status == "match_exact"
+    assert juliet.attributes == {"role": "lover"}
+    assert paris.char_interval is None
+    assert paris.alignment_status is None
+    assert doc.model_dump()["extractions"][0]["alignment_status"] == "match_exact"
+
+
+def test_from_lang_tokenized_text():
+    included = AnnotatedDocument.from_lang(_lang_document(), "include")
+    tokens = (included.tokenized_text or {})["tokens"]
+    assert [t["char_interval"] for t in tokens] == [
+        {"start_pos": 0, "end_pos": 6},
+        {"start_pos": 7, "end_pos": 12},
+        {"start_pos": 13, "end_pos": 18},
+    ]
+
+    lazy = AnnotatedDocument.from_lang(_lang_document(), "lazy")
+    assert lazy.tokenized_text is None
+    assert lazy.load_tokenized_text() == included.tokenized_text
+    assert lazy.tokenized_text == included.tokenized_text
+
+
 # import os
 
 # from langutil_llm.langextract import Example, ExampleData, LangExtractor
@@ -0,0 +1,723 @@
+import heapq
+import math
+import random
+import shutil
+import threading
+import uuid
+from collections.abc import Callable, Hashable, Iterable, Sequence
+from pathlib import Path
+from typing import Any, Literal, Self
+
+import numpy as np
+import orjson
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+from langutil_infra.disk import dumps, loads
+
+Metric = Literal["l2", "cosine"]
+Filter = dict[str, Any] | Callable[[Document], bool]
+Distances = Callable[[np.ndarray, Sequence[int]], np.ndarray]
+
+
+class HNSWIndex:
+    """Hierarchical navigable small world graph over the rows of a matrix.
+
+    The index holds only the graph: ``distances(query, rows)`` computes the
+    distances (lower is closer) of ``query`` to the given rows and
+    ``vector(row)`` returns the vector of a row. Each node
+    links to its ``m`` closest neighbors found with ``ef_construction``
+    candidates (``2 * m`` on the bottom layer).
+    """
+
+    def __init__(
+        self,
+        distances: Distances,
+        vector: Callable[[int], np.ndarray],
+        m: int = 16,
+        ef_construction: int = 64,
+        seed: int = 0,
+    ) -> None:
+        self.distances = distances
+        self.vector = vector
+        self.m = m
+        self.ef_construction = ef_construction
+        self.layers: list[dict[int, list[int]]] = []
+        self.entry = -1
+        self.__ml = 1 / math.log(m)
+        self.__rng = random.Random(seed)
+
+    def __len__(self) -> int:
+        return len(self.layers[0]) if self.layers else 0
+
+    def add(self, node: int, vector: np.ndarray) -> None:
+        level = int(-math.log(1.0 - self.__rng.random()) * self.__ml)
+        top = len(self.layers) - 1
+        while len(self.layers) <= level:
+            self.layers.append({})
+        if self.entry < 0:
+            for layer in self.layers[: level + 1]:
+                layer[node] = []
+            self.entry = node
+            return
+
+        entry = [self.entry]
+        for depth in range(top, level, -1):
+            entry = [self.search_layer(vector, entry, 1, depth)[0][1]]
+        for depth in range(min(level, top), -1, -1):
+            found = self.search_layer(vector, entry, self.ef_construction, depth)
+            layer = self.layers[depth]
+            layer[node] = [n for _, n in found[: self.m]]
+            cap = 2 * self.m if depth == 0 else self.m
+            for neighbor in layer[node]:
+                links = layer[neighbor]
+                links.append(node)
+                if len(links) > cap:
+                    order = np.argsort(self.distances(self.vector(neighbor), links))
+                    layer[neighbor] = [links[i] for i in order[:cap]]
+            entry = [n for _, n in found]
+        for layer in self.layers[top + 1 : level + 1]:
+            layer[node] = []
+        if level > top:
+            self.entry = node
+
+    def search(
+        self,
+        vector: np.ndarray,
+        k: int,
+        ef: int,
+        accept: Callable[[int], bool] | None = None,
+    ) -> list[tuple[float, int]]:
+        """The ``k`` closest accepted nodes as ``(distance, node)`` pairs,
+        searching ``max(ef, k)`` candidates on the bottom layer."""
+        if self.entry < 0:
+            return []
+        entry = [self.entry]
+        for depth in range(len(self.layers) - 1, 0, -1):
+            entry = [self.search_layer(vector, entry, 1, depth)[0][1]]
+        found = self.search_layer(vector, entry, max(ef, k), 0)
+        if accept is not None:
+            found = [(d, n) for d, n in found if accept(n)]
+        return found[:k]
+
+    def search_layer(
+        self, vector: np.ndarray, entry: list[int], ef: int, depth: int
+    ) -> list[tuple[float, int]]:
+        layer = self.layers[depth]
+        visited = set(entry)
+        distances = self.distances(vector, entry).tolist()
+        candidates = list(zip(distances, entry, strict=True))
+        heapq.heapify(candidates)
+        results = [(-d, n) for d, n in candidates]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            distance, node = heapq.heappop(candidates)
+            if distance > -results[0][0] and len(results) >= ef:
+                break
+            neighbors = [n for n in layer.get(node, ()) if n not in visited]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+            bound = -results[0][0]
+            for d, n in zip(
+                self.distances(vector, neighbors).tolist(), neighbors, strict=True
+            ):
+                if len(results) < ef or d < bound:
+                    heapq.heappush(candidates, (d, n))
+                    heapq.heappush(results, (-d, n))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+                    bound = -results[0][0]
+        return sorted((-d, n) for d, n in results)
+
+    def state(self) -> dict[str, Any]:
+        return {
+            "m": self.m,
+            "ef_construction": self.ef_construction,
+            "layers": self.layers,
+            "entry": self.entry,
+        }
+
+    @classmethod
+    def from_state(
+        cls,
+        distances: Distances,
+        vector: Callable[[int], np.ndarray],
+        state: dict[str, Any],
+    ) -> Self:
+        index = cls(distances, vector, state["m"], state["ef_construction"])
+        index.layers = state["layers"]
+        index.entry = state["entry"]
+        return index
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector store keeping every vector in one float32 matrix.
+
+    Searches are exact, with one matrix product, which is faster than the
+    pure-Python ``HNSWIndex`` at the sizes this store is meant for. Writes
+    never build an index: ``build_index()`` adds one, maintained on later
+    inserts, that searches matching more than ``hnsw_threshold`` vectors go
+    through. Scores are L2 distances or, for ``"cosine"``, cosine
+    similarities.
+
+    ``filter`` is a mapping of metadata values that must all be equal (served
+    from an inverted index) or a predicate on ``Document``. Filters matching
+    few vectors are searched exactly over the matches.
+
+    ``save`` writes the collection to ``path``; ``load`` maps the vectors
+    back read-only until the next insert.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        metric: Metric = "l2",
+        hnsw_threshold: int = 10_000,
+        m: int = 16,
+        ef_construction: int = 64,
+        ef_search: int = 64,
+        path: str | Path | None = None,
+    ) -> None:
+        self.embedding = embedding
+        self.metric = metric
+        self.hnsw_threshold = hnsw_threshold
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.path = Path(path) if path is not None else None
+        self.lock = threading.RLock()
+        # One row per vector, with a last column holding its squared norm
+        # for L2 (zero for cosine): the distance ranks of a query are then a
+        # single product with ``__prepare(query)``.
+        self.__matrix = np.empty((0, 1), dtype=np.float32)
+        self.__alive = np.empty(0, dtype=bool)
+        self.__count = 0
+        self.__ids: list[str] = []
+        self.__texts: list[str] = []
+        self.__metadatas: list[dict[str, Any]] = []
+        self.__rows: dict[str, int] = {}
+        self.__postings: dict[str, dict[Hashable, list[int]]] = {}
+        self.__index: HNSWIndex | None = None
+        self.__views: dict[int, LocalStoreView] = {}
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return len(self.__rows)
+
+    @property
+    def indexed(self) -> bool:
+        """Whether searches go through the HNSW index."""
+        return self.__index is not None
+
+    def with_ef(self, ef: int) -> "LocalVectorStore | LocalStoreView":
+        """This store, or a handle on its data whose searches use ``ef``
+        instead of ``ef_search``; one handle per ``ef``."""
+        if ef == self.ef_search:
+            return self
+        with self.lock:
+            view = self.__views.get(ef)
+            if view is None:
+                view = self.__views[ef] = LocalStoreView(self, ef)
+            return view
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: list[dict] | None = None,
+        *,
+        ids: list[str] | None = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        texts = list(texts)
+        vectors = self.embedding.embed_documents(texts)
+        return self.add_embeddings(texts, vectors, metadatas, ids=ids, **kwargs)
+
+    def add_embeddings(
+        self,
+        texts: list[str],
+        embeddings: list[list[float]],
+        metadatas: list[dict] | None = None,
+        *,
+        ids: list[str] | None = None,
+        **_kwargs: Any,
+    ) -> list[str]:
+        """Add texts with precomputed vectors, replacing those with the same
+        ids."""
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+        if self.metric == "cosine":
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1, norms)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+        added = ids
+        # An id repeated in the batch keeps its last text, as if added in turn
+        last = {id_: i for i, id_ in enumerate(ids)}
+        if len(last) < len(ids):
+            rows = sorted(last.values())
+            matrix = matrix[rows]
+            texts = [texts[i] for i in rows]
+            metadatas = [metadatas[i] for i in rows]
+            ids = [ids[i] for i in rows]
+
+        with self.lock:
+            self.__delete(ids)
+            start = self.__count
+            self.__reserve(start + len(texts), matrix.shape[1])
+            end = start + len(texts)
+            self.__matrix[start:end, :-1] = matrix
+            if self.metric == "l2":
+                self.__matrix[start:end, -1] = np.einsum("ij,ij->i", matrix, matrix)
+            self.__alive[start:end] = True
+            self.__count = end
+            for row, (id_, text, metadata) in enumerate(
+                zip(ids, texts, metadatas, strict=True), start
+            ):
+                self.__ids.append(id_)
+                self.__texts.append(text)
+                self.__metadatas.append(metadata)
+                self.__rows[id_] = row
+                self.__post(row, metadata)
+            if self.__index is not None:
+                for row in range(start, end):
+                    self.__index.add(row, self.__vector(row))
+        return added
+
+    def build_index(self) -> None:
+        """Index every live vector in an HNSW graph. This takes seconds per
+        ten thousand vectors and blocks every other call of the store."""
+        with self.lock:
+            index = HNSWIndex(
+                self.__distances, self.__vector, self.m, self.ef_construction
+            )
+            for row in np.flatnonzero(self.__alive[: self.__count]).tolist():
+                index.add(row, self.__vector(row))
+            self.__index = index
+
+    def delete(self, ids: list[str] | None = None, **_kwargs: Any) -> bool | None:
+        if ids is None:
+            return False
+        with self.lock:
+            return self.__delete(ids) > 0
+
+    def get_by_ids(self, ids: Sequence[str], /) -> list[Document]:
+        with self.lock:
+            rows = [self.__rows[i] for i in ids if i in self.__rows]
+            return [self.__document(row) for row in rows]
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Filter | None = None, **kwargs: Any
+    ) -> list[Document]:
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score(query, k, filter, **kwargs)
+        ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Filter | None = None, **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        vector = self.embedding.embed_query(query)
+        return self.similarity_search_with_score_by_vector(vector, k, filter, **kwargs)
+
+    def similarity_search_by_vector(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        filter: Filter | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score_by_vector(
+                embedding, k, filter, **kwargs
+            )
+        ]
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        filter: Filter | None = None,
+        ef: int | None = None,
+        **_kwargs: Any,
+    ) -> list[tuple[Document, float]]:
+        """The ``k`` closest documents and their scores. ``ef`` overrides
+        ``ef_search`` for this query."""
+        with self.lock:
+            query = self.__query(embedding)
+            hits = self.__search(self.__prepare(query), k, filter, ef)
+            return [(self.__document(row), self.__score(d, query)) for d, row in hits]
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Filter | None = None,
+        **_kwargs: Any,
+    ) -> list[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding.embed_query(query), k, fetch_k, lambda_mult, filter
+        )
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Filter | None = None,
+        **_kwargs: Any,
+    ) -> list[Document]:
+        with self.lock:
+            query = self.__query(embedding)
+            hits = self.__search(self.__prepare(query), fetch_k, filter, None)
+            rows = [row for _, row in hits]
+            candidates = self.__matrix[rows, :-1]
+            chosen = maximal_marginal_relevance(
+                query, candidates, lambda_mult=lambda_mult, k=k
+            )
+            return [self.__document(rows[i]) for i in chosen]
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: list[dict] | None = None,
+        *,
+        ids: list[str] | None = None,
+        **kwargs: Any,
+    ) -> Self:
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        if self.metric == "cosine":
+            return lambda similarity: (similarity + 1) / 2
+        return self._euclidean_relevance_score_fn
+
+    def save(self, path: str | Path | None = None) -> None:
+        """Write the collection to the directory ``path`` (``self.path`` by
+        default), atomically: the files go to a new version directory under
+        ``path``, then the ``CURRENT`` file is switched to it and the
+        previous version removed."""
+        path = Path(path) if path is not None else self.path
+        if path is None:
+            raise ValueError("no path to save the vector store to")
+        version = f"v-{uuid.uuid4().hex}"
+        root = path / version
+        root.mkdir(parents=True)
+        with self.lock:
+            n = self.__count
+            config = {
+                "metric": self.metric,
+                "hnsw_threshold": self.hnsw_threshold,
+                "m": self.m,
+                "ef_construction": self.ef_construction,
+                "ef_search": self.ef_search,
+            }
+            documents = {
+                "ids": self.__ids,
+                "texts": self.__texts,
+                "metadatas": self.__metadatas,
+            }
+            np.save(root / "vectors.npy", self.__matrix[:n])
+            np.save(root / "alive.npy", self.__alive[:n])
+            (root / "config.json").write_bytes(orjson.dumps(config))
+            (root / "docs.json").write_bytes(orjson.dumps(documents))
+            index = self.__index.state() if self.__index is not None else None
+            (root / "hnsw.bin").write_bytes(dumps(index))
+        previous = _version(path)
+        _replace(path / "CURRENT", lambda f: f.write(version.encode()))
+        # Stores loaded from the previous version keep their maps on POSIX
+        if previous != path:
+            shutil.rmtree(previous, ignore_errors=True)
+        else:
+            for name in _FILES:
+                (path / name).unlink(missing_ok=True)
+        self.path = path
+
+    @staticmethod
+    def exists(path: str | Path) -> bool:
+        """Whether ``save`` wrote a collection to ``path``."""
+        return (_version(Path(path)) / "config.json").exists()
+
+    @classmethod
+    def load(cls, path: str | Path, embedding: Embeddings, mmap: bool = True) -> Self:
+        """Open a collection written by ``save``. With ``mmap`` the vectors
+        stay on disk, paged in as searches touch them."""
+        path = Path(path)
+        root = _version(path)
+        config = orjson.loads((root / "config.json").read_bytes())
+        documents = orjson.loads((root / "docs.json").read_bytes())
+        store = cls(embedding, path=path, **config)
+        matrix = np.load(root / "vectors.npy", mmap_mode="r" if mmap else None)
+        alive = np.load(root / "alive.npy")
+        store.__matrix = matrix
+        store.__alive = alive
+        store.__count = len(alive)
+        store.__ids = documents["ids"]
+        store.__texts = documents["texts"]
+        store.__metadatas = documents["metadatas"]
+        for row in np.flatnonzero(alive).tolist():
+            store.__rows[store.__ids[row]] = row
+            store.__post(row, store.__metadatas[row])
+        state = loads((root / "hnsw.bin").read_bytes())
+        if state is not None:
+            store.__index = HNSWIndex.from_state(
+                store.__distances, store.__vector, state
+            )
+        return store
+
+    def __reserve(self, size: int, dim: int) -> None:
+        capacity, current = self.__matrix.shape[0], self.__matrix.shape[1] - 1
+        if self.__count and current != dim:
+            raise ValueError(f"expected vectors of dimension {current}, got {dim}")
+        if size <= capacity and self.__matrix.flags.writeable:
+            return
+        capacity = max(size, 2 * capacity, 64)
+        n = self.__count
+        matrix = np.zeros((capacity, dim + 1), dtype=np.float32)
+        alive = np.zeros(capacity, dtype=bool)
+        if n:
+            matrix[:n] = self.__matrix[:n]
+            alive[:n] = self.__alive[:n]
+        self.__matrix, self.__alive = matrix, alive
+
+    def __delete(self, ids: Iterable[str]) -> int:
+        deleted = 0
+        for id_ in ids:
+            row = self.__rows.pop(id_, None)
+            if row is not None:
+                if not self.__alive.flags.writeable:
+                    self.__alive = self.__alive.copy()
+                self.__alive[row] = False
+                deleted += 1
+        return deleted
+
+    def __post(self, row: int, metadata: dict[str, Any]) -> None:
+        for key, value in metadata.items():
+            if isinstance(value, Hashable):
+                self.__postings.setdefault(key, {}).setdefault(value, []).append(row)
+
+    def __mask(self, filter: Filter | None) -> np.ndarray:
+        alive = self.__alive[: self.__count]
+        if filter is None:
+            return alive
+        if callable(filter):
+            rows = np.flatnonzero(alive).tolist()
+            mask = np.zeros(self.__count, dtype=bool)
+            mask[[row for row in rows if filter(self.__document(row))]] = True
+            return mask
+        mask = alive.copy()
+        for key, value in filter.items():
+            if isinstance(value, Hashable):
+                rows = self.__postings.get(key, {}).get(value, [])
+            else:
+                rows = [
+                    row
+                    for row in np.flatnonzero(mask).tolist()
+                    if self.__metadatas[row].get(key) == value
+                ]
+            allowed = np.zeros(self.__count, dtype=bool)
+            allowed[rows] = True
+            mask &= allowed
+        return mask
+
+    def __search(
+        self, query: np.ndarray, k: int, filter: Filter | None, ef: int | None
+    ) -> list[tuple[float, int]]:
+        if self.__count == 0 or k <= 0:
+            return []
+        mask = self.__mask(filter)
+        matches = int(mask.sum())
+        if self.__index is None or matches <= self.hnsw_threshold:
+            return self.__exact(query, k, np.flatnonzero(mask))
+
+        ef = max(ef or self.ef_search, k)
+        while True:
+            hits = self.__index.search(query, k, ef, accept=mask.__getitem__)
+            if len(hits) >= min(k, matches) or ef >= len(self.__index):
+                return hits
+            ef *= 4  # a selective filter left too few candidates
+
+    def __exact(
+        self, query: np.ndarray, k: int, rows: np.ndarray
+    ) -> list[tuple[float, int]]:
+        if not len(rows):
+            return []
+        if len(rows) == self.__count:
+            distances = self.__distances(query, slice(0, self.__count))
+        else:
+            distances = self.__distances(query, rows)
+        k = min(k, len(rows))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return list(zip(distances[top].tolist(), rows[top].tolist(), strict=True))
+
+    def __distances(self, prepared: np.ndarray, rows: Any) -> np.ndarray:
+        """Distances of a prepared query to ``rows``, shifted by a constant
+        per query: ``|x|^2 - 2 x.q`` for L2, ``-cos`` for cosine."""
+        return self.__matrix[rows] @ prepared
+
+    def __prepare(self, query: np.ndarray) -> np.ndarray:
+        if self.metric == "cosine":
+            return np.append(-query, np.float32(0))
+        return np.append(-2 * query, np.float32(1))
+
+    def __vector(self, row: int) -> np.ndarray:
+        """The prepared query of the vector in ``row``."""
+        return self.__prepare(self.__matrix[row, :-1])
+
+    def __query(self, embedding: list[float]) -> np.ndarray:
+        query = np.asarray(embedding, dtype=np.float32)
+        if self.metric == "cosine":
+            norm = np.linalg.norm(query)
+            query = query / (norm or 1)
+        return query
+
+    def __score(self, distance: float, query: np.ndarray) -> float:
+        if self.metric == "cosine":
+            return -distance
+        return math.sqrt(max(distance + float(query @ query), 0.0))
+
+    def __document(self, row: int) -> Document:
+        return Document(
+            id=self.__ids[row],
+            page_content=self.__texts[row],
+            metadata=self.__metadatas[row],
+        )
+
+
+class LocalStoreView(VectorStore):
+    """A handle on the data of a ``LocalVectorStore`` searching with its own
+    ``ef``; see ``LocalVectorStore.with_ef``. Everything else goes to the
+    store."""
+
+    def __init__(self, store: LocalVectorStore, ef: int) -> None:
+        self.store = store
+        self.ef_search = ef
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "store":
+            raise AttributeError(name)
+        return getattr(self.store, name)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.store.embeddings
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: list[dict] | None = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        return self.store.add_texts(texts, metadatas, **kwargs)
+
+    def delete(self, ids: list[str] | None = None, **kwargs: Any) -> bool | None:
+        return self.store.delete(ids, **kwargs)
+
+    def get_by_ids(self, ids: Sequence[str], /) -> list[Document]:
+        return self.store.get_by_ids(ids)
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> list[Document]:
+        kwargs.setdefault("ef", self.ef_search)
+        return self.store.similarity_search(query, k, **kwargs)
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        kwargs.setdefault("ef", self.ef_search)
+        return self.store.similarity_search_with_score(query, k, **kwargs)
+
+    def similarity_search_by_vector(
+        self, embedding: list[float], k: int = 4, **kwargs: Any
+    ) -> list[Document]:
+        kwargs.setdefault("ef", self.ef_search)
+        return self.store.similarity_search_by_vector(embedding, k, **kwargs)
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: list[float], k: int = 4, **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        kwargs.setdefault("ef", self.ef_search)
+        return self.store.similarity_search_with_score_by_vector(embedding, k, **kwargs)
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return self.store.max_marginal_relevance_search(
+            query, k, fetch_k, lambda_mult, **kwargs
+        )
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return self.store.max_marginal_relevance_search_by_vector(
+            embedding, k, fetch_k, lambda_mult, **kwargs
+        )
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: list[dict] | None = None,
+        *,
+        ids: list[str] | None = None,
+        ef: int | None = None,
+        **kwargs: Any,
+    ) -> Self:
+        """A view searching with ``ef`` of a new ``LocalVectorStore`` built
+        from ``texts`` with the other ``kwargs``."""
+        store = LocalVectorStore.from_texts(
+            texts, embedding, metadatas, ids=ids, **kwargs
+        )
+        return cls(store, store.ef_search if ef is None else ef)
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        return self.store._select_relevance_score_fn()
+
+
+_FILES = ("vectors.npy", "alive.npy", "config.json", "docs.json", "hnsw.bin")
+
+
+def _version(path: Path) -> Path:
+    """The directory holding the saved collection of ``path``: the version
+    named by its ``CURRENT`` file, else ``path`` itself (older layout)."""
+    try:
+        return path / (path / "CURRENT").read_text().strip()
+    except FileNotFoundError:
+        return path
+
+
+def _replace(path: Path, write: Callable[[Any], Any]) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as f:
+        write(f)
+    tmp.replace(path)
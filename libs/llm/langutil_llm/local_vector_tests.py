@@ -0,0 +1,190 @@
+import time
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from langutil_llm.ingest import IngestPipeline
+from langutil_llm.local_vector import LocalStoreView, LocalVectorStore
+from langutil_llm.vector import provider_factotry
+
+
+def random_store(
+    n: int, dim: int = 16, **kwargs
+) -> tuple[LocalVectorStore, np.ndarray]:
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    store = LocalVectorStore(DeterministicFakeEmbedding(size=dim), **kwargs)
+    store.add_embeddings(
+        [f"t{i}" for i in range(n)],
+        vectors.tolist(),
+        [{"i": i, "parity": i % 2, "tenant": f"t{i % 50}"} for i in range(n)],
+        ids=[str(i) for i in range(n)],
+    )
+    return store, vectors
+
+
+def test_exact_search_l2_and_cosine():
+    store, vectors = random_store(300)
+    query = vectors[7] + 0.01
+    hits = store.similarity_search_with_score_by_vector(query.tolist(), k=5)
+    expected = np.argsort(((vectors - query) ** 2).sum(axis=1))[:5]
+    assert [doc.id for doc, _ in hits] == [str(i) for i in expected]
+    assert hits[0][1] == pytest.approx(np.linalg.norm(vectors[7] - query), abs=1e-4)
+    assert not store.indexed
+
+    store, vectors = random_store(300, metric="cosine")
+    query = vectors[3] * 5
+    (doc, score), *_ = store.similarity_search_with_score_by_vector(query.tolist())
+    assert doc.id == "3"
+    assert score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_filters_deletes_and_upserts():
+    store, vectors = random_store(100)
+    query = vectors[10].tolist()
+    hits = store.similarity_search_by_vector(query, k=3, filter={"parity": 1})
+    assert all(doc.metadata["parity"] == 1 for doc in hits)
+    hits = store.similarity_search_by_vector(
+        query, k=3, filter=lambda doc: doc.metadata["i"] < 5
+    )
+    assert {doc.id for doc in hits} <= {"0", "1", "2", "3", "4"}
+    assert store.similarity_search_by_vector(query, filter={"parity": 7}) == []
+
+    assert store.similarity_search_by_vector(query, k=1)[0].id == "10"
+    assert store.delete(["10"])
+    assert store.similarity_search_by_vector(query, k=1)[0].id != "10"
+    assert store.get_by_ids(["10", "11"])[0].id == "11"
+
+    store.add_embeddings(["moved"], [query], [{"i": -1}], ids=["11"])
+    assert len(store) == 99
+    (doc,) = store.get_by_ids(["11"])
+    assert (doc.page_content, doc.metadata) == ("moved", {"i": -1})
+    assert store.similarity_search_by_vector(query, k=1)[0].id == "11"
+
+
+def test_repeated_ids_in_one_batch():
+    store, vectors = random_store(10)
+    ids = store.add_embeddings(
+        ["a", "b", "c"], vectors[:3].tolist(), ids=["x", "y", "x"]
+    )
+    assert ids == ["x", "y", "x"]
+    assert len(store) == 12
+    (doc,) = store.get_by_ids(["x"])
+    assert doc.page_content == "c"
+    hits = store.similarity_search_by_vector(vectors[0].tolist(), k=12)
+    assert [doc.id for doc in hits].count("x") == 1
+    assert store.delete(["x"])
+    assert "x" not in {
+        doc.id for doc in store.similarity_search_by_vector(vectors[2].tolist(), k=12)
+    }
+
+
+def test_search_at_threshold_size():
+    start = time.perf_counter()
+    store, vectors = random_store(10_000)
+    added = time.perf_counter() - start
+    assert store.hnsw_threshold == 10_000
+    assert not store.indexed
+    assert added < 2
+
+    rng = np.random.default_rng(1)
+    latencies = []
+    for query in rng.standard_normal((50, 16), dtype=np.float32):
+        start = time.perf_counter()
+        hits = store.similarity_search_by_vector(query.tolist(), k=10)
+        latencies.append(time.perf_counter() - start)
+        exact = np.argsort(((vectors - query) ** 2).sum(axis=1))[:10]
+        assert [d.id for d in hits] == [str(i) for i in exact]
+    assert np.median(latencies) < 0.005
+
+
+def test_hnsw_index():
+    store, vectors = random_store(1500, hnsw_threshold=500, ef_search=64)
+    assert not store.indexed
+    store.build_index()
+    assert store.indexed
+    rng = np.random.default_rng(1)
+    recall = []
+    for query in rng.standard_normal((20, 16), dtype=np.float32):
+        hits = store.similarity_search_by_vector(query.tolist(), k=10)
+        exact = np.argsort(((vectors - query) ** 2).sum(axis=1))[:10]
+        recall.append(len({d.id for d in hits} & {str(i) for i in exact}) / 10)
+    assert np.mean(recall) >= 0.9
+
+    # A selective filter is searched exactly over its matches
+    hits = store.similarity_search_by_vector(
+        vectors[0].tolist(), k=5, filter={"tenant": "t0"}
+    )
+    assert hits[0].id == "0"
+    assert len(hits) == 5
+    assert all(doc.metadata["tenant"] == "t0" for doc in hits)
+
+    # Later inserts go into the index
+    store.add_embeddings(["new"], [(vectors[5] + 0.001).tolist()], ids=["new"])
+    ids = [d.id for d in store.similarity_search_by_vector(vectors[5].tolist(), k=2)]
+    assert set(ids) == {"5", "new"}
+
+
+def test_save_and_mmap_load(tmp_path):
+    store, vectors = random_store(1200, hnsw_threshold=1000)
+    store.build_index()
+    store.delete(["3"])
+    store.save(tmp_path / "c")
+
+    loaded = LocalVectorStore.load(tmp_path / "c", store.embeddings)
+    assert loaded.indexed
+    assert len(loaded) == 1199
+    query = vectors[42].tolist()
+    assert [d.id for d in loaded.similarity_search_by_vector(query, k=3)] == [
+        d.id for d in store.similarity_search_by_vector(query, k=3)
+    ]
+    assert loaded.get_by_ids(["3"]) == []
+
+    loaded.add_embeddings(["x"], [query], ids=["x"])
+    loaded.delete(["42"])
+    assert loaded.similarity_search_by_vector(query, k=1)[0].id == "x"
+    loaded.save()
+    again = LocalVectorStore.load(tmp_path / "c", store.embeddings, mmap=False)
+    assert len(again) == 1199
+
+    # Each save writes a new version and switches CURRENT to it
+    versions = [p.name for p in (tmp_path / "c").iterdir() if p.is_dir()]
+    assert versions == [(tmp_path / "c" / "CURRENT").read_text()]
+    assert LocalVectorStore.exists(tmp_path / "c")
+    assert not LocalVectorStore.exists(tmp_path / "missing")
+
+
+def test_texts_and_mmr():
+    embeddings = DeterministicFakeEmbedding(size=8)
+    store = LocalVectorStore.from_texts(
+        ["apple", "banana", "cherry"], embeddings, [{"n": 1}, {"n": 2}, {"n": 3}]
+    )
+    assert store.similarity_search("banana", k=1)[0].page_content == "banana"
+    (doc, relevance), *_ = store.similarity_search_with_relevance_scores("cherry")
+    assert doc.page_content == "cherry"
+    assert relevance == pytest.approx(1.0)
+    docs = store.max_marginal_relevance_search("apple", k=2, fetch_k=3)
+    assert docs[0].page_content == "apple"
+    assert len(docs) == 2
+
+    view = LocalStoreView.from_texts(["apple", "banana"], embeddings, ef=8)
+    assert view.ef_search == 8
+    assert view.similarity_search("banana", k=1)[0].page_content == "banana"
+
+
+def test_factory_local_provider(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    factory = provider_factotry(local_dir=tmp_path)
+    store = factory("local", "docs", "tenant", embeddings)
+    assert factory("local", "docs", "tenant", embeddings) is store
+    assert factory("local", "docs", "other", embeddings) is not store
+
+    IngestPipeline(store, batch_size=2).run(
+        Document(page_content=f"doc {i}", metadata={"i": i}) for i in range(5)
+    )
+    store.save()
+    assert LocalVectorStore.exists(tmp_path / "tenant" / "docs")
+    loaded = LocalVectorStore.load(tmp_path / "tenant" / "docs", embeddings)
+    assert loaded.similarity_search("doc 3", k=1)[0].metadata == {"i": 3}
@@ -1,38 +1,832 @@
+import asyncio
+import copy
+import hashlib
+import itertools
+import logging
+import multiprocessing
 import os
+import queue
+import sys
+import threading
+import time
+import unicodedata
+from collections.abc import Callable, Iterable, Mapping, MutableMapping
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Any, Literal
 
-from cachetools import TTLCache, cached
+import orjson
+from cachetools import LRUCache, TTLCache
+from langutil_infra import ShardedCache, TTICache
+from langutil_infra.disk import dumps, loads
+from langutil_infra.stats import (
+    LATENCY_BUCKETS,
+    Histogram,
+    cache_stats,
+    cached,
+    is_enabled,
+)
+
+logger = logging.getLogger(__name__)
 
 NLP_Provider = Literal["ltp", "hanlp"]
+ParseFunc = Callable[[list[str], list[str]], Any]
+
+
+class Lexicon:
+    """An immutable custom-word list. ``digest`` hashes the normalized words,
+    so equal lexicons share it whatever their order or duplicates, and
+    compare and hash equal."""
+
+    __slots__ = ("digest", "words")
+
+    def __init__(self, words: Iterable[str] = ()) -> None:
+        self.words = tuple(sorted({w for w in words if w}))
+        self.digest = digest_words(self.words)
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Lexicon):
+            return NotImplemented
+        return self.digest == other.digest
+
+    def __hash__(self) -> int:
+        return hash(self.digest)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(words={len(self.words)}, digest={self.digest!r})"
+
+
+def digest_words(words: Iterable[str]) -> str:
+    """Version id of a custom-word list: a hash of its sorted unique words."""
+    normalized = sorted({w for w in words if w})
+    return hashlib.blake2b("\n".join(normalized).encode(), digest_size=16).hexdigest()
+
+
+class LTPModel:
+    """One loaded LTP checkpoint shared by every lexicon.
+
+    LTP applies custom words through the trie in its ``hook`` attribute, so
+    each lexicon is compiled once into its own trie (an overlay) and swapped
+    in for the duration of a ``pipeline`` call; the weights are never
+    reloaded. Overlays are kept in an LRU cache bounded by their total word
+    count, and calls are serialized per model.
+    """
+
+    def __init__(self, client: Any, max_overlay_words: int = 2_000_000) -> None:
+        self.client = client
+        self.lock = threading.Lock()
+        self.__base = client.hook
+        self.__overlays: LRUCache[str, tuple[Any, int]] = LRUCache(
+            maxsize=max_overlay_words, getsizeof=lambda overlay: max(overlay[1], 1)
+        )
+
+    def overlay(self, lexicon: Lexicon) -> Any:
+        """The trie holding ``lexicon``'s words, built on first use."""
+        with self.lock:
+            overlay = self.__overlays.get(lexicon.digest)
+            if overlay is not None:
+                return overlay[0]
+            client = self.client
+            client.hook = type(self.__base)()
+            try:
+                client.add_words(list(lexicon.words))
+                hook = client.hook
+            finally:
+                client.hook = self.__base
+            try:
+                self.__overlays[lexicon.digest] = (hook, len(lexicon))
+            except ValueError:
+                pass  # lexicon too large to keep, rebuild it next time
+            return hook
+
+    def pipeline(self, texts: list[str], tasks: list[str], lexicon: Lexicon) -> Any:
+        hook = self.overlay(lexicon) if lexicon.words else self.__base
+        with self.lock:
+            client = self.client
+            client.hook = hook
+            try:
+                return client.pipeline(texts, tasks)
+            finally:
+                client.hook = self.__base
+
+
+def _load_ltp(checkpoint: str) -> LTPModel:
+    from ltp import LTP
+
+    return LTPModel(LTP(checkpoint, local_files_only=True))
+
+
+# Loading a checkpoint takes seconds and hundreds of MB: keep one per
+# checkpoint and let concurrent first callers wait for a single load.
+_ltp_models: ShardedCache[str, LTPModel] = ShardedCache(
+    lambda: LRUCache(maxsize=4), shards=1
+)
+
+
+def _checkpoint(checkpoint: str | None) -> str:
+    return checkpoint or os.getenv("NLP", "LTP/small")
+
+
+def ltp_model(checkpoint: str | None = None) -> LTPModel:
+    """The shared model of ``checkpoint``, ``$NLP`` or ``LTP/small``."""
+    checkpoint = _checkpoint(checkpoint)
+    return _ltp_models.get_or_compute(checkpoint, lambda: _load_ltp(checkpoint))
+
+
+# LTP task names and the HanLP multi-task model components serving them
+HANLP_TASKS = {
+    "cws": "tok/fine",
+    "pos": "pos/ctb",
+    "ner": "ner/msra",
+    "srl": "srl",
+    "dep": "dep",
+    "sdp": "sdp",
+}
+
+
+class HanLPModel:
+    """One loaded HanLP multi-task model shared by every lexicon.
+
+    Takes the LTP task names (see ``HANLP_TASKS``; other names are passed to
+    HanLP as is) and returns a dict of the requested tasks, each holding
+    HanLP's output per text. Texts are run in batches of ``batch_size``.
+    Custom words are applied through the ``dict_combine`` trie of the
+    tokenizer, built once per lexicon and swapped in for each call like
+    ``LTPModel`` overlays.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        batch_size: int = 32,
+        tokenizer: str = HANLP_TASKS["cws"],
+        max_overlay_words: int = 2_000_000,
+    ) -> None:
+        self.client = client
+        self.batch_size = batch_size
+        self.tokenizer = tokenizer
+        self.lock = threading.Lock()
+        self.__base = client[tokenizer].dict_combine
+        self.__overlays: LRUCache[str, tuple[Any, int]] = LRUCache(
+            maxsize=max_overlay_words, getsizeof=lambda overlay: max(overlay[1], 1)
+        )
+
+    def overlay(self, lexicon: Lexicon) -> Any:
+        """The trie holding ``lexicon``'s words, built on first use."""
+        with self.lock:
+            overlay = self.__overlays.get(lexicon.digest)
+            if overlay is not None:
+                return overlay[0]
+            tok = self.client[self.tokenizer]
+            try:
+                # The setter compiles the words into a trie
+                tok.dict_combine = set(lexicon.words)
+                trie = tok.dict_combine
+            finally:
+                tok.dict_combine = self.__base
+            try:
+                self.__overlays[lexicon.digest] = (trie, len(lexicon))
+            except ValueError:
+                pass  # lexicon too large to keep, rebuild it next time
+            return trie
+
+    def pipeline(self, texts: list[str], tasks: list[str], lexicon: Lexicon) -> Any:
+        names = {task: HANLP_TASKS.get(task, task) for task in tasks}
+        if not texts:
+            return {task: [] for task in names}
+        trie = self.overlay(lexicon) if lexicon.words else self.__base
+        with self.lock:
+            tok = self.client[self.tokenizer]
+            tok.dict_combine = trie
+            try:
+                output = self.client(
+                    texts, tasks=list(set(names.values())), batch_size=self.batch_size
+                )
+            finally:
+                tok.dict_combine = self.__base
+        return {task: output[name] for task, name in names.items()}
+
+
+def _load_hanlp(checkpoint: str) -> HanLPModel:
+    import hanlp
+
+    return HanLPModel(hanlp.load(getattr(hanlp.pretrained.mtl, checkpoint, checkpoint)))
+
+
+_hanlp_models: ShardedCache[str, HanLPModel] = ShardedCache(
+    lambda: LRUCache(maxsize=4), shards=1
+)
+
+
+def _hanlp_checkpoint(checkpoint: str | None) -> str:
+    return checkpoint or os.getenv(
+        "HANLP", "CLOSE_TOK_POS_NER_SRL_DEP_SDP_CON_ELECTRA_SMALL_ZH"
+    )
+
+
+def hanlp_model(checkpoint: str | None = None) -> HanLPModel:
+    """The shared model of ``checkpoint`` (a ``hanlp.pretrained.mtl`` name, URL
+    or path), ``$HANLP`` or the small Chinese multi-task model."""
+    checkpoint = _hanlp_checkpoint(checkpoint)
+    return _hanlp_models.get_or_compute(checkpoint, lambda: _load_hanlp(checkpoint))
+
+
+def split_output(output: Any, sizes: list[int]) -> list[Any]:
+    """Split the ``pipeline`` output of a merged batch into one output per
+    request of ``sizes`` texts.
+
+    Handles sequences with one item per text, and mappings or objects (such
+    as ``LTPOutput``) whose values or attributes are such sequences.
+    """
+    bounds = []
+    start = 0
+    for size in sizes:
+        bounds.append((start, start + size))
+        start += size
+
+    if isinstance(output, list | tuple):
+        return [output[i:j] for i, j in bounds]
+    if isinstance(output, Mapping):
+        parts = [{k: v[i:j] for k, v in output.items()} for i, j in bounds]
+        try:
+            return [type(output)(part) for part in parts]
+        except TypeError:
+            return parts
+    parts = []
+    for i, j in bounds:
+        part = copy.copy(output)
+        for name, value in vars(output).items():
+            if isinstance(value, list | tuple):
+                setattr(part, name, value[i:j])
+        parts.append(part)
+    return parts
+
+
+class BatchStats:
+    """Batch sizes (in texts) and the time requests waited to be batched."""
+
+    __slots__ = ("batch_size", "batches", "queue_latency", "requests")
+
+    def __init__(self, max_batch_size: int) -> None:
+        bounds = [1]
+        while bounds[-1] < max_batch_size:
+            bounds.append(min(bounds[-1] * 2, max_batch_size))
+        self.batch_size = Histogram((*bounds, float("inf")))
+        self.queue_latency = Histogram(LATENCY_BUCKETS)
+        self.batches = 0
+        self.requests = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "requests_per_batch": self.requests / self.batches if self.batches else 0.0,
+            "batch_size": self.batch_size.snapshot(),
+            "queue_latency": self.queue_latency.snapshot(),
+        }
+
+
+class _Request:
+    __slots__ = ("args", "enqueued", "future", "key", "tasks", "texts")
+
+    def __init__(self, texts: list[str], tasks: list[str], args: tuple) -> None:
+        self.texts = texts
+        self.tasks = tasks
+        self.args = args
+        self.key = (tuple(tasks), *args)
+        self.future: Future[Any] = Future()
+        self.enqueued = time.monotonic()
+
+
+class BatchingParser:
+    """Front end that merges concurrent ``parse`` calls into larger batches.
+
+    Requests are queued to one worker thread. It waits at most ``max_wait``
+    seconds after the first queued request for others to join, then runs one
+    ``parse(texts, tasks, *args)`` call per distinct ``tasks`` list and extra
+    arguments (such as a ``Lexicon``, which must be hashable) with up to
+    ``max_batch_size`` texts, and hands each caller its slice of the output.
+    Call the instance from threads, or ``await aparse(...)`` from asyncio
+    code. The worker exits after ``idle_timeout`` seconds without requests
+    and is started again by the next one.
+    """
+
+    def __init__(
+        self,
+        parse: Callable[..., Any],
+        max_batch_size: int = 64,
+        max_wait: float = 0.005,
+        split: Callable[[Any, list[int]], list[Any]] = split_output,
+        idle_timeout: float = 60.0,
+    ) -> None:
+        self.parse = parse
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.split = split
+        self.idle_timeout = idle_timeout
+        self.stats = BatchStats(max_batch_size)
+        self.__queue: queue.SimpleQueue[_Request | None] = queue.SimpleQueue()
+        self.__lock = threading.Lock()
+        self.__worker: threading.Thread | None = None
+
+    def __call__(self, texts: list[str], tasks: list[str], *args: Any) -> Any:
+        return self.submit(texts, tasks, *args).result()
 
+    async def aparse(self, texts: list[str], tasks: list[str], *args: Any) -> Any:
+        return await asyncio.wrap_future(self.submit(texts, tasks, *args))
 
-def provider_factotry(maxsize: int = 100, ttl: float = 360):
+    def submit(self, texts: list[str], tasks: list[str], *args: Any) -> Future[Any]:
+        """Queue a request and return the future of its output."""
+        request = _Request(list(texts), list(tasks), args)
+        # Queued before the worker check: an idle worker only exits on an
+        # empty queue, so either it sees this request or we start another
+        self.__queue.put(request)
+        self.__start()
+        return request.future
+
+    def close(self) -> None:
+        """Stop the worker once the queued requests are done."""
+        with self.__lock:
+            worker, self.__worker = self.__worker, None
+            if worker is not None:
+                self.__queue.put(None)
+        if worker is not None:
+            worker.join()
+
+    def __start(self) -> None:
+        if self.__worker is not None:
+            return
+        with self.__lock:
+            if self.__worker is None:
+                self.__worker = threading.Thread(
+                    target=self.__run, name="nlp-batching", daemon=True
+                )
+                self.__worker.start()
+
+    def __retire(self, idle: bool) -> bool:
+        """Unregister this worker, unless ``idle`` and requests are queued."""
+        with self.__lock:
+            if idle and not self.__queue.empty():
+                return False
+            if self.__worker is threading.current_thread():
+                self.__worker = None
+            return True
+
+    def __run(self) -> None:
+        pending: dict[tuple, list[_Request]] = {}
+        closing = False
+        while not closing or pending:
+            if not pending:
+                try:
+                    first = self.__queue.get(timeout=self.idle_timeout)
+                except queue.Empty:
+                    if self.__retire(idle=True):
+                        return
+                    continue
+                if first is None:
+                    break
+                pending[first.key] = [first]
+                deadline = first.enqueued + self.max_wait
+            # Gather until the oldest request has waited max_wait or one
+            # group of tasks fills a batch. Requests that queued up while the
+            # previous batch ran are past their deadline but still join.
+            while not closing and not self.__full(pending):
+                timeout = deadline - time.monotonic()
+                try:
+                    if timeout > 0:
+                        request = self.__queue.get(timeout=timeout)
+                    else:
+                        request = self.__queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    closing = True
+                    break
+                pending.setdefault(request.key, []).append(request)
+
+            for key in list(pending):
+                batch = self.__take(pending, key)
+                self.__execute(batch)
+            if pending:
+                deadline = min(r.enqueued for rs in pending.values() for r in rs)
+                deadline += self.max_wait
+        self.__retire(idle=False)
+
+    def __full(self, pending: dict[tuple, list[_Request]]) -> bool:
+        return any(
+            sum(len(r.texts) for r in requests) >= self.max_batch_size
+            for requests in pending.values()
+        )
+
+    def __take(
+        self, pending: dict[tuple, list[_Request]], key: tuple
+    ) -> list[_Request]:
+        """Pop up to ``max_batch_size`` texts worth of requests for ``key``;
+        a single larger request forms a batch of its own."""
+        requests = pending[key]
+        size = 0
+        count = 0
+        for request in requests:
+            if count and size + len(request.texts) > self.max_batch_size:
+                break
+            size += len(request.texts)
+            count += 1
+        batch, rest = requests[:count], requests[count:]
+        if rest:
+            pending[key] = rest
+        else:
+            del pending[key]
+        return batch
+
+    def __execute(self, batch: list[_Request]) -> None:
+        now = time.monotonic()
+        stats = self.stats
+        sizes = [len(r.texts) for r in batch]
+        stats.batches += 1
+        stats.requests += len(batch)
+        stats.batch_size.observe(sum(sizes))
+        for request in batch:
+            stats.queue_latency.observe(now - request.enqueued)
+
+        try:
+            output = self.parse(
+                [t for r in batch for t in r.texts], batch[0].tasks, *batch[0].args
+            )
+            parts = self.split(output, sizes) if len(batch) > 1 else [output]
+        except BaseException as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        for request, part in zip(batch, parts, strict=True):
+            request.future.set_result(part)
+
+
+def concat_outputs(parts: list[Any]) -> Any:
+    """Inverse of ``split_output``: join per-chunk outputs into one."""
+    first = parts[0]
+    if isinstance(first, list | tuple):
+        return type(first)(item for part in parts for item in part)
+    if isinstance(first, Mapping):
+        merged = {k: [x for part in parts for x in part[k]] for k in first}
+        try:
+            return type(first)(merged)
+        except TypeError:
+            return merged
+    output = copy.copy(first)
+    for name, value in vars(first).items():
+        if isinstance(value, list | tuple):
+            setattr(output, name, [x for part in parts for x in getattr(part, name)])
+    return output
+
+
+# Functions run by ProcessPoolParser workers. Workers are forked, so they
+# inherit this registry, and with it the loaded models, copy-on-write.
+_fork_functions: dict[int, Callable[..., Any]] = {}
+_fork_tokens = itertools.count()
+
+
+def _init_worker() -> None:
+    # A forked child must not reuse the parent's intra-op thread pool
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(1)
+
+
+def _run_in_worker(token: int, texts: bytes, tasks: list[str], args: tuple) -> bytes:
+    return dumps(_fork_functions[token](orjson.loads(texts), tasks, *args))
+
+
+class ProcessPoolParser:
+    """Run ``function(texts, tasks, *args)`` on a pool of forked processes.
+
+    ``function`` and the model it closes over are loaded in this process
+    before the workers fork, so the weights are shared copy-on-write and
+    never pickled. Each call is split into chunks of ``chunk_size`` texts
+    spread over the workers; outputs are joined back in input order. Texts
+    travel as JSON and outputs as compressed pickles. If a worker dies the
+    pool is forked again and the lost chunks retried, up to ``max_restarts``
+    times per call. Fork the pool while no other thread is using the model.
+
+    ``retire()`` shuts the workers down once the calls in flight are done; a
+    later call forks them again for its own duration.
+    """
+
+    def __init__(
+        self,
+        function: Callable[..., Any],
+        processes: int | None = None,
+        chunk_size: int = 32,
+        max_restarts: int = 3,
+    ) -> None:
+        self.function = function
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.max_restarts = max_restarts
+        self.restarts = 0
+        self.__token = next(_fork_tokens)
+        self.__lock = threading.Lock()
+        self.__calls = 0
+        self.__retired = False
+        self.__pool: ProcessPoolExecutor | None = self.__fork()
+
+    @property
+    def running(self) -> bool:
+        """Whether the worker processes are up."""
+        return self.__pool is not None
+
+    def __call__(self, texts: list[str], tasks: list[str], *args: Any) -> Any:
+        with self.__lock:
+            if self.__pool is None:
+                self.__pool = self.__fork()
+            self.__calls += 1
+        try:
+            return self.__run(texts, tasks, args)
+        finally:
+            with self.__lock:
+                self.__calls -= 1
+                if self.__retired and not self.__calls:
+                    self.__shutdown()
+
+    def retire(self) -> None:
+        """Shut the workers down once no call is using them."""
+        with self.__lock:
+            self.__retired = True
+            if not self.__calls:
+                self.__shutdown()
+
+    def __run(self, texts: list[str], tasks: list[str], args: tuple) -> Any:
+        size = self.chunk_size
+        chunks = [texts[i : i + size] for i in range(0, len(texts), size)] or [[]]
+        outputs: list[Any] = [None] * len(chunks)
+        todo = list(range(len(chunks)))
+        attempt = 0
+        while True:
+            pool = self.__pool
+            futures = {}
+            for i in todo:
+                blob = orjson.dumps(chunks[i])
+                try:
+                    futures[i] = pool.submit(
+                        _run_in_worker, self.__token, blob, tasks, args
+                    )
+                except BrokenProcessPool:
+                    break
+            lost = [i for i in todo if i not in futures]
+            for i, future in futures.items():
+                try:
+                    outputs[i] = loads(future.result())
+                except BrokenProcessPool:
+                    lost.append(i)
+            if not lost:
+                return concat_outputs(outputs)
+            if attempt == self.max_restarts:
+                raise BrokenProcessPool(
+                    f"NLP worker crashed {attempt + 1} times processing this call"
+                )
+            attempt += 1
+            self.__restart(pool)
+            todo = sorted(lost)
+
+    def close(self) -> None:
+        with self.__lock:
+            pool, self.__pool = self.__pool, None
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            _fork_functions.pop(self.__token, None)
+
+    def __shutdown(self) -> None:
+        pool, self.__pool = self.__pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+        _fork_functions.pop(self.__token, None)
+
+    def __fork(self) -> ProcessPoolExecutor:
+        _fork_functions[self.__token] = self.function
+        return ProcessPoolExecutor(
+            self.processes,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+        )
+
+    def __restart(self, broken: ProcessPoolExecutor) -> None:
+        with self.__lock:
+            # Another caller may already have replaced the broken pool
+            if self.__pool is broken:
+                logger.warning("NLP worker pool broke, forking a new one")
+                broken.shutdown(wait=False, cancel_futures=True)
+                self.__pool = self.__fork()
+                self.restarts += 1
+
+
+class _PoolCache(LRUCache[tuple[str, int | None], ProcessPoolParser]):
+    """An LRU cache of pools retiring the ones it evicts."""
+
+    def popitem(self) -> tuple[tuple[str, int | None], ProcessPoolParser]:
+        key, pool = super().popitem()
+        pool.retire()
+        return key, pool
+
+
+_pools: ShardedCache[tuple[str, int | None], ProcessPoolParser] = ShardedCache(
+    lambda: _PoolCache(maxsize=4), shards=1
+)
+
+
+def _model_pool(
+    model_id: str, load: Callable[[], Any], processes: int | None
+) -> ProcessPoolParser:
+    return _pools.get_or_compute(
+        (model_id, processes), lambda: ProcessPoolParser(load().pipeline, processes)
+    )
+
+
+def ltp_pool(checkpoint: str | None = None, processes: int | None = None):
+    """The shared process pool running ``ltp_model(checkpoint)``."""
+    checkpoint = _checkpoint(checkpoint)
+    return _model_pool(f"ltp:{checkpoint}", lambda: ltp_model(checkpoint), processes)
+
+
+def hanlp_pool(checkpoint: str | None = None, processes: int | None = None):
+    """The shared process pool running ``hanlp_model(checkpoint)``."""
+    checkpoint = _hanlp_checkpoint(checkpoint)
+    return _model_pool(
+        f"hanlp:{checkpoint}", lambda: hanlp_model(checkpoint), processes
+    )
+
+
+ResultCache = MutableMapping[tuple[str, tuple[str, ...], str, str], Any]
+
+
+def result_cache(
+    maxsize: int = 200_000, ttl: float = 24 * 3600, shards: int = 16
+) -> ResultCache:
+    """A thread-safe cache of per-text NLP outputs holding up to ``maxsize``
+    texts; entries unused for ``ttl`` seconds expire."""
+    return ShardedCache(lambda: TTICache(maxsize=maxsize // shards, ttl=ttl), shards)
+
+
+class CachedParser:
+    """Memoize a parse function per text.
+
+    Outputs are cached per text under (NFC-normalized text, task set, model
+    id, lexicon digest). A call sends only its distinct missing texts to
+    ``parse``, as given, in one batch, and reassembles the outputs in input
+    order. Texts equal under NFC share one entry, holding the output of the
+    form parsed first. Callers get deep copies of the cached outputs unless
+    ``copy_outputs`` is False, in which case they must not mutate them.
+    """
+
+    def __init__(
+        self,
+        parse: ParseFunc,
+        model_id: str,
+        lexicon: str,
+        cache: ResultCache | None = None,
+        stats_name: str = "langutil_llm.nlp.results",
+        copy_outputs: bool = True,
+    ) -> None:
+        self.parse = parse
+        self.model_id = model_id
+        self.lexicon = lexicon
+        self.cache = cache if cache is not None else result_cache()
+        self.stats = cache_stats(stats_name, self.cache)
+        self.copy_outputs = copy_outputs
+
+    def __call__(self, texts: list[str], tasks: list[str]) -> Any:
+        if not texts:
+            return self.parse([], tasks)
+        task_set = tuple(sorted(set(tasks)))
+        cache = self.cache
+        keys = [
+            (unicodedata.normalize("NFC", text), task_set, self.model_id, self.lexicon)
+            for text in texts
+        ]
+        parts = [cache.get(key) for key in keys]
+
+        # The first text of each missing key is parsed for all its positions
+        missing: dict[tuple, list[int]] = {}
+        for i, part in enumerate(parts):
+            if part is None:
+                missing.setdefault(keys[i], []).append(i)
+        if missing:
+            misses = [texts[positions[0]] for positions in missing.values()]
+            start = time.perf_counter()
+            output = self.parse(misses, tasks)
+            if is_enabled():
+                self.stats.latency.observe(time.perf_counter() - start)
+            for (key, positions), part in zip(
+                missing.items(), split_output(output, [1] * len(misses)), strict=True
+            ):
+                try:
+                    cache[key] = part
+                except ValueError:
+                    pass  # value too large
+                for i in positions:
+                    parts[i] = part
+
+        if is_enabled():
+            self.stats.calls += len(texts)
+            self.stats.misses += len(missing)
+        output = concat_outputs(parts)
+        return copy.deepcopy(output) if self.copy_outputs else output
+
+
+def provider_factotry(
+    maxsize: int = 100,
+    ttl: float = 360,
+    batching: dict[str, Any] | None = None,
+    processes: int | None = None,
+    results: ResultCache | Literal[False] | None = None,
+):
+    """Build a cached factory of ``parse_func(texts, tasks)`` callables.
+
+    ``factotry("ltp" | "hanlp", words, checkpoint=None)`` returns a parser of
+    that backend and checkpoint with the custom ``words`` applied. With
+    ``batching`` (``BatchingParser`` options, ``{}`` for the defaults)
+    concurrent calls are merged into larger batches by one batcher per
+    model, serving the parsers of every lexicon; requests only share a batch
+    with those of the same lexicon and tasks. With
+    ``processes`` the model runs on that many forked worker processes, shared
+    by every lexicon of a checkpoint. Unless ``results`` is ``False``, outputs
+    are memoized per text in ``results`` (a ``result_cache()`` by default) and
+    only uncached texts reach the model.
+    """
     cache = TTLCache(maxsize=maxsize, ttl=ttl)
+    if results is None:
+        results = result_cache()
+    batchers: dict[str, BatchingParser] = {}
+    batchers_lock = threading.Lock()
 
     def _cache_key_generate(
         provider: NLP_Provider, words: list[str], **kwargs: Any
     ) -> str:
-        return f"{provider}_{words}"
+        return f"{provider}_{kwargs.get('checkpoint')}_{digest_words(words)}"
+
+    def model_parser(
+        model_id: str,
+        words: list[str],
+        load_model: Callable[[], Any],
+        load_pool: Callable[[], ProcessPoolParser],
+    ):
+        lexicon = Lexicon(words)
 
-    def ltp_parser(words: list[str]):
-        from ltp import LTP
+        # Looked up on every call, so parsers and batchers never pin a model
+        # or pool the shared caches have evicted
+        def pipeline(texts: list[str], tasks: list[str], lexicon: Lexicon):
+            if processes is not None:
+                return load_pool()(texts, tasks, lexicon)
+            return load_model().pipeline(texts, tasks, lexicon)
 
-        client = LTP(os.getenv("NLP", "LTP/small"), local_files_only=True)
-        client.add_words(words)
+        if processes is not None:
+            load_pool()
+        else:
+            load_model()
+
+        run: Callable[..., Any] = pipeline
+        if batching is not None:
+            with batchers_lock:
+                if model_id not in batchers:
+                    batchers[model_id] = BatchingParser(pipeline, **batching)
+                run = batchers[model_id]
 
         def parse_func(texts: list[str], tasks: list[str]):
-            return client.pipeline(texts, tasks)
+            return run(texts, tasks, lexicon)
 
         return parse_func
 
-    @cached(cache, key=_cache_key_generate)
+    @cached(cache, key=_cache_key_generate, name="langutil_llm.nlp.provider_factotry")
     def factotry(provider: NLP_Provider, words: list[str], **kwargs: Any):
+        checkpoint = kwargs.get("checkpoint")
         match provider:
             case "ltp":
-                return ltp_parser(words=words, **kwargs)
+                checkpoint = _checkpoint(checkpoint)
+                parse_func = model_parser(
+                    f"ltp:{checkpoint}",
+                    words,
+                    lambda: ltp_model(checkpoint),
+                    lambda: ltp_pool(checkpoint, processes),
+                )
             case "hanlp":
-                ...
+                checkpoint = _hanlp_checkpoint(checkpoint)
+                parse_func = model_parser(
+                    f"hanlp:{checkpoint}",
+                    words,
+                    lambda: hanlp_model(checkpoint),
+                    lambda: hanlp_pool(checkpoint, processes),
+                )
             case _:
-                ...
+                return None
+
+        if results is not False:
+            parse_func = CachedParser(
+                parse_func,
+                f"{provider}:{checkpoint}",
+                digest_words(words),
+                cache=results,
+            )
+        return parse_func
 
     return factotry
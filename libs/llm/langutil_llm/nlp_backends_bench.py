@@ -0,0 +1,157 @@
+"""Sentences/s, per-call latency and resident memory of the NLP backends on a
+shared corpus, for each task mix.
+
+Each backend is loaded in its own spawned process, so its memory is measured
+alone, and parsed without the result cache. ``--corpus`` reads one sentence
+per line; the default corpus is a small built-in one repeated.
+Run with ``python -m langutil_llm.nlp_backends_bench [--backends ltp hanlp]``.
+"""
+
+import argparse
+import multiprocessing
+import resource
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from .nlp import NLP_Provider, provider_factotry
+
+SENTENCES = [
+    "他叫汤姆去拿外衣。",
+    "我爱北京天安门。",
+    "国务院发布了关于推进数字政府建设的指导意见。",
+    "小明昨天在图书馆借了三本关于机器学习的书。",
+    "上海浦东新区的房价在过去十年里上涨了一倍多。",
+    "请把会议纪要在下班前发到我的邮箱。",
+    "这家公司的第三季度营收同比增长百分之十二。",
+    "长江全长约六千三百公里。",
+]
+
+TASK_MIXES = [
+    ("cws",),
+    ("cws", "pos"),
+    ("cws", "pos", "ner"),
+    ("cws", "pos", "ner", "dep"),
+    ("cws", "pos", "ner", "srl", "dep", "sdp"),
+]
+
+
+def _rss() -> float:
+    """Current resident memory in MiB."""
+    try:
+        pages = int(Path("/proc/self/statm").read_text().split()[1])
+        return pages * resource.getpagesize() / 2**20
+    except OSError:
+        return _peak_rss()
+
+
+def _peak_rss() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def _measure(
+    backend: NLP_Provider,
+    checkpoint: str | None,
+    corpus: list[str],
+    batch_size: int,
+    rounds: int,
+) -> list[dict[str, Any]]:
+    start = time.perf_counter()
+    parse = provider_factotry(results=False)(backend, [], checkpoint=checkpoint)
+    if parse is None:
+        raise ValueError(f"unknown backend {backend!r}")
+    parse(corpus[:batch_size], ["cws"])
+    load = time.perf_counter() - start
+    loaded = _rss()
+
+    batches = [corpus[i : i + batch_size] for i in range(0, len(corpus), batch_size)]
+    rows = []
+    for mix in TASK_MIXES:
+        tasks = list(mix)
+        parse(batches[0], tasks)  # warm up the heads of this mix
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for batch in batches:
+                begin = time.perf_counter()
+                parse(batch, tasks)
+                latencies.append(time.perf_counter() - begin)
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        rows.append(
+            {
+                "backend": backend,
+                "tasks": "+".join(mix),
+                "sentences_per_s": len(corpus) * rounds / elapsed,
+                "p50_ms": statistics.median(latencies) * 1e3,
+                "p99_ms": latencies[int(len(latencies) * 0.99)] * 1e3,
+                "load_s": load,
+                "rss_mib": loaded,
+                "peak_rss_mib": _peak_rss(),
+            }
+        )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--backends", nargs="+", default=["ltp", "hanlp"])
+    parser.add_argument("--ltp-checkpoint")
+    parser.add_argument("--hanlp-checkpoint")
+    parser.add_argument("--corpus", help="file with one sentence per line")
+    parser.add_argument("--sentences", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.corpus:
+        lines = Path(args.corpus).read_text(encoding="utf-8").splitlines()
+        corpus = [line.strip() for line in lines if line.strip()]
+    else:
+        corpus = [SENTENCES[i % len(SENTENCES)] for i in range(args.sentences)]
+    checkpoints = {"ltp": args.ltp_checkpoint, "hanlp": args.hanlp_checkpoint}
+
+    print(
+        f"{'backend':<8} {'tasks':<24} {'sent/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'load s':>7} {'RSS MiB':>8} {'peak MiB':>9}"
+    )
+    results: list[dict[str, Any]] = []
+    for backend in args.backends:
+        with ProcessPoolExecutor(
+            1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            future = executor.submit(
+                _measure,
+                backend,
+                checkpoints.get(backend),
+                corpus,
+                args.batch_size,
+                args.rounds,
+            )
+            try:
+                rows = future.result()
+            except Exception as e:
+                print(f"{backend:<8} skipped: {type(e).__name__}: {e}")
+                continue
+        for row in rows:
+            print(
+                f"{row['backend']:<8} {row['tasks']:<24} "
+                f"{row['sentences_per_s']:8.1f} {row['p50_ms']:8.1f} "
+                f"{row['p99_ms']:8.1f} {row['load_s']:7.1f} "
+                f"{row['rss_mib']:8.0f} {row['peak_rss_mib']:9.0f}"
+            )
+        results.extend(rows)
+
+    if len({row["backend"] for row in results}) > 1:
+        print("\nfastest backend per task mix:")
+        for mix in TASK_MIXES:
+            tasks = "+".join(mix)
+            rows = [row for row in results if row["tasks"] == tasks]
+            best = max(rows, key=lambda row: row["sentences_per_s"])
+            print(f"  {tasks:<24} {best['backend']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Throughput vs latency of ``parse_func`` called directly and through
+``BatchingParser``, with many concurrent callers of one or two sentences.
+
+The model is simulated (serialized calls costing a fixed overhead plus a
+per-text cost), standing in for an LTP checkpoint on one device.
+Run with ``python -m langutil_llm.nlp_bench``.
+"""
+
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .nlp import BatchingParser, ParseFunc
+
+CALL_OVERHEAD = 0.008
+PER_TEXT = 0.0003
+CLIENTS = 32
+DURATION = 2.0
+
+
+def _model() -> ParseFunc:
+    lock = threading.Lock()
+
+    def parse(texts: list[str], tasks: list[str]):
+        with lock:
+            time.sleep(CALL_OVERHEAD + PER_TEXT * len(texts))
+        return {task: [t[:2] for t in texts] for task in tasks}
+
+    return parse
+
+
+def _run(parse: ParseFunc) -> tuple[float, list[float]]:
+    latencies: list[float] = []
+    stop = time.monotonic() + DURATION
+
+    def client(i: int) -> None:
+        texts = ["他叫汤姆去拿外衣。"] * (1 + i % 2)
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            parse(texts, ["cws", "pos"])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(CLIENTS) as executor:
+        list(executor.map(client, range(CLIENTS)))
+    return len(latencies) / (time.perf_counter() - start), latencies
+
+
+def main() -> None:
+    print(f"{'mode':<22} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'texts/batch':>12}")
+    cases: list[tuple[str, ParseFunc, BatchingParser | None]] = [
+        ("direct", _model(), None)
+    ]
+    for max_wait in (0.001, 0.005, 0.02):
+        batcher = BatchingParser(_model(), max_batch_size=64, max_wait=max_wait)
+        cases.append((f"batched wait={max_wait * 1e3:g}ms", batcher, batcher))
+
+    for name, parse, batcher in cases:
+        throughput, latencies = _run(parse)
+        latencies.sort()
+        per_batch = "-"
+        if batcher is not None:
+            batcher.close()
+            size = batcher.stats.batch_size
+            per_batch = f"{size.sum / size.count:.1f}"
+        print(
+            f"{name:<22} {throughput:8.0f} "
+            f"{statistics.median(latencies) * 1e3:8.1f} "
+            f"{latencies[int(len(latencies) * 0.99)] * 1e3:8.1f} {per_batch:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
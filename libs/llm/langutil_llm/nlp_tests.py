@@ -0,0 +1,443 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from langutil_llm import nlp
+from langutil_llm.nlp import (
+    BatchingParser,
+    CachedParser,
+    HanLPModel,
+    Lexicon,
+    LTPModel,
+    ProcessPoolParser,
+    concat_outputs,
+    digest_words,
+    provider_factotry,
+    result_cache,
+    split_output,
+)
+
+
+class Hook:
+    def __init__(self) -> None:
+        self.words: list[str] = []
+
+
+class Client:
+    """Stands in for ``ltp.LTP``: custom words live in the ``hook`` trie."""
+
+    def __init__(self) -> None:
+        self.hook = Hook()
+        self.loads = 0
+
+    def add_words(self, words: list[str]) -> None:
+        self.loads += 1
+        self.hook.words.extend(words)
+
+    def pipeline(self, texts: list[str], tasks: list[str]):
+        return [(text, tuple(tasks), tuple(self.hook.words)) for text in texts]
+
+
+def test_lexicon_digest():
+    assert Lexicon(["b", "a", "a", ""]).words == ("a", "b")
+    assert Lexicon(["b", "a"]).digest == Lexicon(["a", "b", "b"]).digest
+    assert Lexicon(["a"]).digest != Lexicon(["a", "b"]).digest
+    assert digest_words(["b", "a"]) == Lexicon(["a", "b"]).digest
+
+
+def test_overlays_share_one_model():
+    client = Client()
+    model = LTPModel(client)
+    tenant_a = Lexicon(["苹果手机"])
+    tenant_b = Lexicon(["华为手机", "鸿蒙"])
+
+    assert model.pipeline(["t"], ["cws"], tenant_a) == [("t", ("cws",), ("苹果手机",))]
+    assert model.pipeline(["t"], ["cws"], tenant_b) == [
+        ("t", ("cws",), ("华为手机", "鸿蒙"))
+    ]
+    assert model.pipeline(["t"], ["cws"], Lexicon()) == [("t", ("cws",), ())]
+    model.pipeline(["t"], ["cws"], Lexicon(["苹果手机"]))
+
+    # Each lexicon is compiled once and the shared hook is left untouched
+    assert client.loads == 2
+    assert client.hook.words == []
+
+
+def test_overlays_bounded():
+    client = Client()
+    model = LTPModel(client, max_overlay_words=3)
+    for i in range(10):
+        model.pipeline(["t"], ["cws"], Lexicon([f"w{i}", f"x{i}"]))
+    model.pipeline(["t"], ["cws"], Lexicon(["w9", "x9"]))
+    assert client.loads == 10
+
+    too_large = Lexicon(["a", "b", "c", "d"])
+    model.pipeline(["t"], ["cws"], too_large)
+    assert model.pipeline(["t"], ["cws"], too_large)[0][2] == too_large.words
+
+
+def test_concurrent_lexicons():
+    model = LTPModel(Client())
+    lexicons = [Lexicon([f"w{i}"]) for i in range(8)]
+    errors = []
+
+    def run(lexicon: Lexicon) -> None:
+        for _ in range(50):
+            if model.pipeline(["t"], ["cws"], lexicon)[0][2] != lexicon.words:
+                errors.append(lexicon)
+
+    threads = [threading.Thread(target=run, args=(lx,)) for lx in lexicons]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+class Tokenizer:
+    def __init__(self) -> None:
+        self._dict: frozenset[str] | None = None
+
+    @property
+    def dict_combine(self) -> frozenset[str] | None:
+        return self._dict
+
+    @dict_combine.setter
+    def dict_combine(self, words) -> None:
+        # HanLP compiles plain sets into a trie and keeps tries as is
+        self._dict = words if isinstance(words, frozenset | None) else frozenset(words)
+
+
+class MultiTask:
+    """Stands in for a HanLP multi-task model."""
+
+    def __init__(self) -> None:
+        self.tok = Tokenizer()
+        self.calls: list[tuple[list[str], list[str], int]] = []
+
+    def __getitem__(self, task: str) -> Tokenizer:
+        assert task == "tok/fine"
+        return self.tok
+
+    def __call__(self, texts: list[str], tasks: list[str], batch_size: int):
+        self.calls.append((texts, sorted(tasks), batch_size))
+        words = sorted(self.tok.dict_combine or ())
+        output = {task: [task] * len(texts) for task in tasks}
+        output["tok/fine"] = [[t, *words] for t in texts]
+        return output
+
+
+def test_hanlp_model_tasks_and_lexicons():
+    client = MultiTask()
+    model = HanLPModel(client, batch_size=8)
+    output = model.pipeline(["a", "b"], ["cws", "pos", "con"], Lexicon())
+    assert output == {
+        "cws": [["a"], ["b"]],
+        "pos": ["pos/ctb"] * 2,
+        "con": ["con"] * 2,
+    }
+    assert client.calls == [(["a", "b"], ["con", "pos/ctb", "tok/fine"], 8)]
+
+    lexicon = Lexicon(["y", "x"])
+    assert model.pipeline(["a"], ["cws"], lexicon) == {"cws": [["a", "x", "y"]]}
+    assert model.overlay(lexicon) is model.overlay(Lexicon(["x", "y"]))
+    assert client.tok.dict_combine is None
+    assert model.pipeline(["a"], ["cws"], Lexicon()) == {"cws": [["a"]]}
+    assert model.pipeline([], ["cws", "ner"], lexicon) == {"cws": [], "ner": []}
+    assert len(client.calls) == 3
+
+
+def test_factory_hanlp_provider(monkeypatch):
+    client = MultiTask()
+    monkeypatch.setattr(nlp, "_load_hanlp", lambda _checkpoint: HanLPModel(client))
+    factory = provider_factotry(batching={"idle_timeout": 0.05})
+    parse = factory("hanlp", ["x"], checkpoint="test-hanlp")
+    assert factory("hanlp", ["x"], checkpoint="test-hanlp") is parse
+    assert parse(["a", "b"], ["cws"]) == {"cws": [["a", "x"], ["b", "x"]]}
+    assert parse(["b"], ["cws"]) == {"cws": [["b", "x"]]}
+    assert len(client.calls) == 1
+
+
+def _batching_threads() -> int:
+    return sum(t.name == "nlp-batching" for t in threading.enumerate())
+
+
+def test_factory_batches_every_lexicon_on_one_thread(monkeypatch):
+    client = MultiTask()
+    monkeypatch.setattr(nlp, "_load_hanlp", lambda _checkpoint: HanLPModel(client))
+    factory = provider_factotry(maxsize=2, batching={"idle_timeout": 0.2})
+    before = _batching_threads()
+    for i in range(10):
+        parse = factory("hanlp", [f"w{i}"], checkpoint="test-batching")
+        assert parse([f"t{i}"], ["cws"]) == {"cws": [[f"t{i}", f"w{i}"]]}
+    # Evicted parsers leave no worker behind; the model's batcher serves all
+    assert _batching_threads() - before <= 1
+    deadline = time.monotonic() + 2
+    while _batching_threads() > before and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert _batching_threads() == before
+
+
+class SlowParse:
+    """A model whose cost is dominated by a fixed per-call overhead."""
+
+    def __init__(self, overhead: float = 0.02) -> None:
+        self.overhead = overhead
+        self.calls: list[tuple[list[str], list[str]]] = []
+        self.lock = threading.Lock()
+
+    def __call__(self, texts: list[str], tasks: list[str]):
+        with self.lock:
+            self.calls.append((texts, tasks))
+            time.sleep(self.overhead)
+            if "boom" in texts:
+                raise RuntimeError("boom")
+            return {"cws": [f"{t}:{','.join(tasks)}" for t in texts]}
+
+
+def test_split_output():
+    class Output:
+        def __init__(self, cws, pos) -> None:
+            self.cws = cws
+            self.pos = pos
+            self.model = "small"
+
+    assert split_output([1, 2, 3], [1, 2]) == [[1], [2, 3]]
+    assert split_output({"cws": [1, 2, 3]}, [2, 1]) == [{"cws": [1, 2]}, {"cws": [3]}]
+    first, second = split_output(Output([1, 2, 3], ["a", "b", "c"]), [1, 2])
+    assert (first.cws, first.pos, first.model) == ([1], ["a"], "small")
+    assert (second.cws, second.pos) == ([2, 3], ["b", "c"])
+
+
+def test_batching_merges_concurrent_requests():
+    parse = SlowParse()
+    batcher = BatchingParser(parse, max_batch_size=16, max_wait=0.05)
+    with ThreadPoolExecutor(8) as executor:
+        outputs = list(
+            executor.map(lambda i: batcher([f"s{i}", f"t{i}"], ["cws"]), range(8))
+        )
+    batcher.close()
+
+    assert outputs == [{"cws": [f"s{i}:cws", f"t{i}:cws"]} for i in range(8)]
+    assert len(parse.calls) < 8
+    assert all(len(texts) <= 16 for texts, _ in parse.calls)
+    stats = batcher.stats.snapshot()
+    assert stats["requests"] == 8
+    assert stats["batches"] == len(parse.calls)
+    assert stats["queue_latency"]["count"] == 8
+
+
+def test_batching_groups_tasks_and_limits_size():
+    parse = SlowParse()
+    batcher = BatchingParser(parse, max_batch_size=4, max_wait=0.05)
+    futures = [batcher.submit([f"s{i}"], ["cws"]) for i in range(6)]
+    futures += [batcher.submit([f"p{i}"], ["cws", "pos"]) for i in range(2)]
+    futures.append(batcher.submit([f"l{i}" for i in range(6)], ["cws"]))
+    results = [f.result() for f in futures]
+    batcher.close()
+
+    assert results[0] == {"cws": ["s0:cws"]}
+    assert results[6] == {"cws": ["p0:cws,pos"]}
+    assert results[8] == {"cws": [f"l{i}:cws" for i in range(6)]}
+    for texts, tasks in parse.calls:
+        # Oversized requests run alone, others are capped at max_batch_size
+        assert len(texts) <= 4 or texts == [f"l{i}" for i in range(6)]
+        assert all(t.startswith("p") for t in texts) == (tasks == ["cws", "pos"])
+
+
+def test_batching_errors_and_async():
+    parse = SlowParse(overhead=0.01)
+    batcher = BatchingParser(parse, max_wait=0.05)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.aparse(["a"], ["cws"]),
+            batcher.aparse(["boom"], ["cws"]),
+            batcher.aparse(["b"], ["cws"]),
+            return_exceptions=True,
+        )
+
+    a, boom, b = asyncio.run(run())
+    batcher.close()
+
+    # A failing batch fails every request in it
+    assert isinstance(boom, RuntimeError)
+    assert isinstance(a, RuntimeError) and isinstance(b, RuntimeError)
+    assert len(parse.calls) == 1
+
+    assert batcher(["c"], ["cws"]) == {"cws": ["c:cws"]}
+    batcher.close()
+
+
+def test_batching_groups_extra_arguments_and_idles_out():
+    calls = []
+
+    def parse(texts, _tasks, lexicon):
+        calls.append((texts, lexicon))
+        time.sleep(0.01)
+        return [f"{t}:{len(lexicon)}" for t in texts]
+
+    before = _batching_threads()
+    batcher = BatchingParser(parse, max_wait=0.05, idle_timeout=0.05)
+    futures = [
+        batcher.submit(["a"], ["cws"], Lexicon(["x"])),
+        batcher.submit(["b"], ["cws"], Lexicon()),
+        batcher.submit(["c"], ["cws"], Lexicon(["x"])),
+    ]
+    assert [f.result() for f in futures] == [["a:1"], ["b:0"], ["c:1"]]
+    assert sorted(texts for texts, _ in calls) == [["a", "c"], ["b"]]
+
+    time.sleep(0.3)
+    assert _batching_threads() == before
+    assert batcher(["d"], ["cws"], Lexicon()) == ["d:0"]
+    batcher.close()
+
+
+def test_concat_outputs():
+    assert concat_outputs([[1], [2, 3]]) == [1, 2, 3]
+    assert concat_outputs([{"cws": [1]}, {"cws": [2]}]) == {"cws": [1, 2]}
+    output = {"cws": [1, 2, 3], "pos": ["a", "b", "c"]}
+    assert concat_outputs(split_output(output, [1, 1, 1])) == output
+
+
+def test_cached_parser_sends_only_misses():
+    parse = SlowParse(overhead=0)
+    cache = result_cache(maxsize=64, shards=4)
+    parser = CachedParser(parse, "ltp:small", digest_words([]), cache=cache)
+
+    assert parser(["a", "b"], ["cws"]) == {"cws": ["a:cws", "b:cws"]}
+    output = parser(["c", "a", "c", "b", "d"], ["cws"])
+    assert output == {"cws": ["c:cws", "a:cws", "c:cws", "b:cws", "d:cws"]}
+    assert parse.calls == [(["a", "b"], ["cws"]), (["c", "d"], ["cws"])]
+
+    # The task set is part of the key, not the task order
+    parser(["a"], ["pos", "cws"])
+    parser(["a"], ["cws", "pos", "cws"])
+    assert parse.calls[2:] == [(["a"], ["pos", "cws"])]
+
+    # Texts are parsed as given; NFC-equal texts share one cache entry
+    assert parser(["e\u0301"], ["cws"]) == {"cws": ["e\u0301:cws"]}
+    assert parse.calls[-1] == (["e\u0301"], ["cws"])
+    assert parser(["\u00e9"], ["cws"]) == {"cws": ["e\u0301:cws"]}
+    assert len(parse.calls) == 4
+
+    assert parser([], ["cws"]) == {"cws": []}
+    assert len(cache) == 6
+
+
+def test_cached_parser_copies_outputs():
+    def parse(texts, _tasks):
+        return {"cws": [[t] for t in texts]}
+
+    parser = CachedParser(parse, "ltp:small", digest_words([]))
+    parser(["a"], ["cws"])["cws"][0].append("mutated")
+    assert parser(["a"], ["cws"]) == {"cws": [["a"]]}
+
+    shared = CachedParser(parse, "ltp:small", digest_words([]), copy_outputs=False)
+    first = shared(["a"], ["cws"])
+    assert shared(["a"], ["cws"])["cws"][0] is first["cws"][0]
+
+
+def test_cached_parser_keys_model_and_lexicon():
+    parse = SlowParse(overhead=0)
+    cache = result_cache(maxsize=64, shards=4)
+    small = CachedParser(parse, "ltp:small", digest_words([]), cache=cache)
+    custom = CachedParser(parse, "ltp:small", digest_words(["ab"]), cache=cache)
+    base = CachedParser(parse, "ltp:base", digest_words([]), cache=cache)
+    for parser in (small, custom, base, small):
+        parser(["ab"], ["cws"])
+    assert len(parse.calls) == 3
+
+
+def test_cached_parser_bounded():
+    parse = SlowParse(overhead=0)
+    cache = result_cache(maxsize=8, shards=2)
+    parser = CachedParser(parse, "ltp:small", digest_words([]), cache=cache)
+    for i in range(100):
+        parser([str(i)], ["cws"])
+    assert len(cache) <= 8
+    parser(["0"], ["cws"])
+    assert len(parse.calls) == 101
+
+
+def test_process_pool_preserves_order():
+    # A closure cannot be pickled: it only reaches the workers by forking
+    model = {"suffix": "!"}
+
+    def parse(texts: list[str], _tasks: list[str], lexicon: Lexicon):
+        return {
+            "cws": [t + model["suffix"] for t in texts],
+            "pid": [os.getpid()] * len(texts),
+            "lexicon": [lexicon.digest] * len(texts),
+        }
+
+    pool = ProcessPoolParser(parse, processes=2, chunk_size=3)
+    try:
+        texts = [f"t{i}" for i in range(10)]
+        output = pool(texts, ["cws"], Lexicon(["a"]))
+        assert output["cws"] == [f"{t}!" for t in texts]
+        assert os.getpid() not in output["pid"]
+        assert set(output["lexicon"]) == {Lexicon(["a"]).digest}
+        assert pool([], ["cws"], Lexicon())["cws"] == []
+    finally:
+        pool.close()
+
+
+def test_process_pool_restarts_crashed_workers(tmp_path):
+    crashed = tmp_path / "crashed"
+
+    def parse(texts: list[str], _tasks: list[str]):
+        if "crash" in texts and not crashed.exists():
+            crashed.touch()
+            os._exit(1)
+        return list(texts)
+
+    pool = ProcessPoolParser(parse, processes=2, chunk_size=2)
+    try:
+        texts = ["a", "b", "crash", "c", "d", "e"]
+        assert pool(texts, ["cws"]) == texts
+        assert pool.restarts == 1
+        assert pool(["f"], ["cws"]) == ["f"]
+    finally:
+        pool.close()
+
+
+def test_process_pool_gives_up():
+    def parse(_texts: list[str], _tasks: list[str]):
+        os._exit(1)
+
+    pool = ProcessPoolParser(parse, processes=1, max_restarts=1)
+    try:
+        with pytest.raises(BrokenProcessPool):
+            pool(["a"], ["cws"])
+        assert pool.restarts == 1
+    finally:
+        pool.close()
+
+
+def test_evicted_pools_retire(monkeypatch):
+    monkeypatch.setattr(
+        nlp, "_pools", nlp.ShardedCache(lambda: nlp._PoolCache(maxsize=1), shards=1)
+    )
+
+    class Model:
+        def pipeline(self, texts, _tasks, _lexicon):
+            return list(texts)
+
+    first = nlp._model_pool("a", Model, 1)
+    assert first(["x"], ["cws"], Lexicon()) == ["x"]
+    second = nlp._model_pool("b", Model, 1)
+    try:
+        assert not first.running
+        assert second.running
+        # A caller still holding the retired pool gets workers for its call
+        assert first(["y"], ["cws"], Lexicon()) == ["y"]
+        assert not first.running
+    finally:
+        first.close()
+        second.close()
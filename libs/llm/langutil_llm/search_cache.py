@@ -0,0 +1,357 @@
+import functools
+import hashlib
+import inspect
+import json
+import threading
+import time
+from collections.abc import Callable, Iterable
+from typing import Any, Self
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langutil_infra.cache import ShardedCache, TTICache
+from langutil_infra.stats import cache_stats
+
+Hits = list[tuple[Document, float]]
+
+# Writes of wrapped stores that ``VectorStore`` does not declare, which
+# ``CachedVectorStore`` forwards as they are but for invalidating its results
+_WRITES = frozenset({"aadd_embeddings", "aupsert", "upsert"})
+
+
+class _Neighbors:
+    """The unit vectors of the latest ``size`` queries of one (collection,
+    filter, k) group, and the result keys they were cached under."""
+
+    def __init__(self, size: int) -> None:
+        self.lock = threading.Lock()
+        self.size = size
+        self.vectors: np.ndarray | None = None
+        self.keys: list[Any] = []
+        self.next = 0
+
+    def nearest(self, vector: np.ndarray) -> tuple[float, Any]:
+        with self.lock:
+            if self.vectors is None:
+                return -1.0, None
+            similarities = self.vectors[: len(self.keys)] @ vector
+            best = int(similarities.argmax())
+            return float(similarities[best]), self.keys[best]
+
+    def add(self, vector: np.ndarray, key: Any) -> None:
+        with self.lock:
+            if self.vectors is None:
+                self.vectors = np.empty((self.size, len(vector)), dtype=np.float32)
+            self.vectors[self.next] = vector
+            if len(self.keys) < self.size:
+                self.keys.append(key)
+            else:
+                self.keys[self.next] = key
+            self.next = (self.next + 1) % self.size
+
+
+class SearchCache:
+    """Similarity search results of vector collections.
+
+    Results are kept under (collection, write generation, search settings,
+    query, filter, k) for up to ``maxsize`` searches, and expire after
+    ``ttl`` idle seconds. ``invalidate(collection)`` moves the collection to
+    a new generation, so its older results are never served again and age
+    out of the cache.
+
+    With a ``threshold``, a query missing the cache is embedded and served
+    the results of the most similar of the last ``neighbors`` queries with
+    the same collection, filter and k, when their cosine similarity reaches
+    ``threshold``.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 10_000,
+        ttl: float = 600,
+        threshold: float | None = None,
+        neighbors: int = 256,
+        shards: int = 16,
+        stats_name: str = "langutil_llm.search_cache.results",
+    ) -> None:
+        self.threshold = threshold
+        self.neighbors = neighbors
+        self.results: ShardedCache[Any, Hits] = ShardedCache(
+            lambda: TTICache(maxsize=max(maxsize // shards, 1), ttl=ttl), shards
+        )
+        self.groups: ShardedCache[Any, _Neighbors] = ShardedCache(
+            lambda: TTICache(maxsize=max(maxsize // neighbors, 64), ttl=ttl), shards
+        )
+        self.stats = cache_stats(stats_name, self.results)
+        self.semantic_hits = 0
+        self.__lock = threading.Lock()
+        self.__generations: dict[str, int] = {}
+
+    def generation(self, collection: str) -> int:
+        return self.__generations.get(collection, 0)
+
+    def invalidate(self, collection: str) -> None:
+        """Stop serving the results cached for ``collection``."""
+        with self.__lock:
+            self.__generations[collection] = self.generation(collection) + 1
+
+    def search(
+        self,
+        key: Any,
+        search: Callable[[], Hits],
+        embed: Callable[[], list[float]] | None = None,
+    ) -> Hits:
+        """The cached results of ``key``, else those of a similar query (when
+        ``embed`` returns the query vector), else the results of ``search``,
+        which runs after ``embed`` and may reuse its vector."""
+        results = self.results.get(key)
+        self.stats.calls += 1
+        if results is not None:
+            return results
+
+        group = neighbors = vector = None
+        if self.threshold is not None and embed is not None:
+            vector = np.asarray(embed(), dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            vector = vector / norm if norm else vector
+            group = key[:-2] + key[-1:]  # the key without the query
+            neighbors = self.groups.get_or_compute(
+                group, lambda: _Neighbors(self.neighbors)
+            )
+            similarity, similar = neighbors.nearest(vector)
+            if similar is not None and similarity >= self.threshold:
+                results = self.results.get(similar)
+                if results is not None:
+                    self.semantic_hits += 1
+                    return results
+
+        self.stats.misses += 1
+        start = time.perf_counter()
+        results = search()
+        self.stats.latency.observe(time.perf_counter() - start)
+        self.results[key] = results
+        if neighbors is not None and vector is not None:
+            neighbors.add(vector, key)
+        return results
+
+    def snapshot(self) -> dict[str, Any]:
+        return {**self.stats.snapshot(), "semantic_hits": self.semantic_hits}
+
+
+def _filter_key(kwargs: dict[str, Any]) -> str | None:
+    """A stable key of the search options, or None when they include
+    values (such as predicates) that cannot be compared."""
+    try:
+        return json.dumps(kwargs, sort_keys=True)
+    except TypeError:
+        return None
+
+
+class CachedVectorStore(VectorStore):
+    """Serve the similarity searches of ``store`` from a ``SearchCache``.
+
+    ``collection`` names the data of ``store`` in ``cache``: every handle of
+    a collection shares its results, and writes through any of them
+    invalidate it. ``namespace`` separates handles searching the same data
+    with different settings. Searches whose options cannot be serialized
+    (a predicate filter) and MMR searches bypass the cache. Writes made
+    outside these handles are only seen once their results expire. Cached
+    documents are shared between callers and must not be mutated.
+    """
+
+    def __init__(
+        self,
+        store: VectorStore,
+        cache: SearchCache,
+        collection: str,
+        namespace: str = "",
+    ) -> None:
+        self.store = store
+        self.cache = cache
+        self.collection = collection
+        self.namespace = namespace
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "store":
+            raise AttributeError(name)
+        attr = getattr(self.store, name)
+        if name in _WRITES and callable(attr):
+            return self.__invalidating(attr)
+        return attr
+
+    @property
+    def embeddings(self) -> Embeddings | None:
+        return self.store.embeddings
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: list[dict] | None = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        try:
+            return self.store.add_texts(texts, metadatas, **kwargs)
+        finally:
+            self.cache.invalidate(self.collection)
+
+    def add_embeddings(self, *args: Any, **kwargs: Any) -> list[str]:
+        try:
+            return self.store.add_embeddings(*args, **kwargs)  # type: ignore[attr-defined]
+        finally:
+            self.cache.invalidate(self.collection)
+
+    def delete(self, ids: list[str] | None = None, **kwargs: Any) -> bool | None:
+        try:
+            return self.store.delete(ids, **kwargs)
+        finally:
+            self.cache.invalidate(self.collection)
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> list[Document]:
+        vector: list[float] | None = None
+
+        def embed() -> list[float]:
+            nonlocal vector
+            vector = self.__embed(query)
+            return vector
+
+        def search() -> Hits:
+            if vector is not None:
+                docs = self.store.similarity_search_by_vector(vector, k, **kwargs)
+            else:
+                docs = self.store.similarity_search(query, k, **kwargs)
+            return [(doc, 0.0) for doc in docs]
+
+        hits = self.__search("docs", query, k, kwargs, search, embed)
+        return [doc for doc, _ in hits]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> Hits:
+        vector: list[float] | None = None
+
+        def embed() -> list[float]:
+            nonlocal vector
+            vector = self.__embed(query)
+            return vector
+
+        def search() -> Hits:
+            by_vector = getattr(
+                self.store, "similarity_search_with_score_by_vector", None
+            )
+            if vector is not None and by_vector is not None:
+                return by_vector(vector, k, **kwargs)
+            return self.store.similarity_search_with_score(query, k, **kwargs)
+
+        return self.__search("scores", query, k, kwargs, search, embed)
+
+    def similarity_search_by_vector(
+        self, embedding: list[float], k: int = 4, **kwargs: Any
+    ) -> list[Document]:
+        def search() -> Hits:
+            docs = self.store.similarity_search_by_vector(embedding, k, **kwargs)
+            return [(doc, 0.0) for doc in docs]
+
+        query = hashlib.blake2b(
+            np.asarray(embedding, dtype=np.float32).tobytes(), digest_size=16
+        ).digest()
+        hits = self.__search("vector", query, k, kwargs, search, lambda: embedding)
+        return [doc for doc, _ in hits]
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return self.store.max_marginal_relevance_search(
+            query, k, fetch_k, lambda_mult, **kwargs
+        )
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return self.store.max_marginal_relevance_search_by_vector(
+            embedding, k, fetch_k, lambda_mult, **kwargs
+        )
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: list[dict] | None = None,
+        *,
+        store_cls: type[VectorStore],
+        cache: SearchCache,
+        collection: str,
+        namespace: str = "",
+        **kwargs: Any,
+    ) -> Self:
+        """Build a ``store_cls`` store with its ``from_texts`` and the other
+        ``kwargs``, and cache its searches in ``cache``."""
+        store = store_cls.from_texts(texts, embedding, metadatas, **kwargs)
+        return cls(store, cache, collection, namespace)
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        return self.store._select_relevance_score_fn()
+
+    def __invalidating(self, write: Callable[..., Any]) -> Callable[..., Any]:
+        if inspect.iscoroutinefunction(write):
+
+            @functools.wraps(write)
+            async def awrite(*args: Any, **kwargs: Any) -> Any:
+                try:
+                    return await write(*args, **kwargs)
+                finally:
+                    self.cache.invalidate(self.collection)
+
+            return awrite
+
+        @functools.wraps(write)
+        def invalidate(*args: Any, **kwargs: Any) -> Any:
+            try:
+                return write(*args, **kwargs)
+            finally:
+                self.cache.invalidate(self.collection)
+
+        return invalidate
+
+    def __embed(self, query: str) -> list[float]:
+        if self.store.embeddings is None:
+            raise ValueError("the store has no embeddings to compare queries with")
+        return self.store.embeddings.embed_query(query)
+
+    def __search(
+        self,
+        kind: str,
+        query: Any,
+        k: int,
+        kwargs: dict[str, Any],
+        search: Callable[[], Hits],
+        embed: Callable[[], list[float]],
+    ) -> Hits:
+        options = _filter_key(kwargs)
+        if options is None:
+            return search()
+        key = (
+            self.collection,
+            self.cache.generation(self.collection),
+            self.namespace,
+            kind,
+            options,
+            query,
+            k,
+        )
+        embeddable = kind == "vector" or self.store.embeddings is not None
+        return self.cache.search(key, search, embed if embeddable else None)
@@ -0,0 +1,174 @@
+import asyncio
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from langutil_llm.local_vector import LocalVectorStore
+from langutil_llm.search_cache import CachedVectorStore, SearchCache
+from langutil_llm.vector import provider_factotry
+
+
+class CountingEmbeddings(Embeddings):
+    """Embeds "<a> <b>" as the unit vector at angle (a + b / 10) degrees."""
+
+    def __init__(self) -> None:
+        self.queries = 0
+
+    def vector(self, text: str) -> list[float]:
+        a, b = (int(part) for part in text.split())
+        angle = np.radians(a + b / 10)
+        return [float(np.cos(angle)), float(np.sin(angle))]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        self.queries += 1
+        return self.vector(text)
+
+
+class Counting(LocalVectorStore):
+    searches = 0
+
+    def similarity_search_with_score_by_vector(self, *args, **kwargs):
+        self.searches += 1
+        return super().similarity_search_with_score_by_vector(*args, **kwargs)
+
+
+def cached_store(**kwargs) -> tuple[CachedVectorStore, Counting, SearchCache]:
+    embeddings = CountingEmbeddings()
+    store = Counting(embeddings, metric="cosine")
+    store.add_texts(
+        [f"{a} 0" for a in range(0, 90, 10)],
+        [{"a": a, "even": a % 20 == 0} for a in range(0, 90, 10)],
+    )
+    cache = SearchCache(**kwargs)
+    return CachedVectorStore(store, cache, "c"), store, cache
+
+
+def test_exact_hits_skip_embedding_and_search():
+    cached, store, cache = cached_store()
+    first = cached.similarity_search("31 0", k=2)
+    assert [d.page_content for d in first] == ["30 0", "40 0"]
+    assert cached.similarity_search("31 0", k=2) == first
+    assert (store.searches, store.embeddings.queries) == (1, 1)
+
+    # Filter and k are part of the key
+    assert cached.similarity_search("31 0", k=1)[0].page_content == "30 0"
+    hits = cached.similarity_search("31 0", k=2, filter={"even": True})
+    assert [d.page_content for d in hits] == ["40 0", "20 0"]
+    cached.similarity_search("31 0", k=2, filter={"even": True})
+    assert store.searches == 3
+
+    # Scores and vectors are cached on their own
+    (_, score), _ = cached.similarity_search_with_score("31 0", k=2)
+    cached.similarity_search_with_score("31 0", k=2)
+    cached.similarity_search_by_vector([1.0, 0.0], k=1)
+    cached.similarity_search_by_vector([1.0, 0.0], k=1)
+    assert store.searches == 5
+    assert score == pytest.approx(np.cos(np.radians(1)))
+    assert cache.snapshot()["hits"] == 4
+
+    # Predicates can't be keyed, so they are never cached
+    cached.similarity_search("31 0", k=1, filter=lambda _doc: True)
+    cached.similarity_search("31 0", k=1, filter=lambda _doc: True)
+    assert store.searches == 7
+
+
+def test_writes_invalidate_the_collection():
+    cached, store, cache = cached_store()
+    other = CachedVectorStore(store, cache, "c")
+    unrelated = CachedVectorStore(store, cache, "d")
+    assert other.similarity_search("33 0", k=1)[0].page_content == "30 0"
+    unrelated.similarity_search("33 0", k=1)
+
+    ids = cached.add_texts(["33 0"])
+    assert other.similarity_search("33 0", k=1)[0].page_content == "33 0"
+    unrelated.similarity_search("33 0", k=1)
+    assert store.searches == 3
+
+    cached.delete(ids)
+    assert other.similarity_search("33 0", k=1)[0].page_content == "30 0"
+    assert store.searches == 4
+
+
+class Upserting(Counting):
+    def upsert(self, texts: list[str], ids: list[str]) -> list[str]:
+        return self.add_texts(texts, ids=ids)
+
+    async def aupsert(self, texts: list[str], ids: list[str]) -> list[str]:
+        return self.upsert(texts, ids)
+
+
+def test_forwarded_writes_invalidate():
+    store = Upserting(CountingEmbeddings(), metric="cosine")
+    store.add_texts(["30 0", "60 0"], ids=["a", "b"])
+    cached = CachedVectorStore(store, SearchCache(), "c")
+    assert cached.similarity_search("33 0", k=1)[0].page_content == "30 0"
+
+    cached.upsert(["33 0"], ids=["b"])
+    assert cached.similarity_search("33 0", k=1)[0].page_content == "33 0"
+    asyncio.run(cached.aupsert(["31 0"], ids=["a"]))
+    assert cached.similarity_search("33 0", k=1)[0].page_content == "33 0"
+    assert cached.similarity_search("30 0", k=1)[0].page_content == "31 0"
+    assert store.searches == 4
+
+
+def test_from_texts():
+    cache = SearchCache()
+    cached = CachedVectorStore.from_texts(
+        ["10 0", "50 0"],
+        CountingEmbeddings(),
+        store_cls=Counting,
+        cache=cache,
+        collection="c",
+        metric="cosine",
+    )
+    assert isinstance(cached.store, Counting)
+    assert cached.store.metric == "cosine"
+    assert cached.similarity_search("12 0", k=1)[0].page_content == "10 0"
+    assert cached.similarity_search("12 0", k=1)[0].page_content == "10 0"
+    assert cached.store.searches == 1
+
+
+def test_semantic_hits_within_threshold():
+    # "50 1" and "50 0" are 0.1 degrees apart, "55 0" five degrees
+    cached, store, cache = cached_store(threshold=0.9999)
+    hits = cached.similarity_search("50 0", k=3)
+    assert cached.similarity_search("50 1", k=3) == hits
+    assert store.searches == 1
+    assert cache.snapshot()["semantic_hits"] == 1
+
+    cached.similarity_search("55 0", k=3)
+    cached.similarity_search("50 1", k=2)
+    cached.similarity_search("50 1", k=3, filter={"even": True})
+    assert store.searches == 4
+
+    cached.add_texts(["50 3"])
+    assert cached.similarity_search("50 2", k=1)[0].page_content == "50 3"
+
+
+def test_cache_is_bounded():
+    cached, store, cache = cached_store(maxsize=16, shards=1)
+    for b in range(40):
+        cached.similarity_search(f"10 {b}", k=1)
+    assert len(cache.results) == 16
+    cached.similarity_search("10 0", k=1)
+    assert store.searches == 41
+
+
+def test_factory_results_cache(tmp_path):
+    embeddings = CountingEmbeddings()
+    cache = SearchCache()
+    factory = provider_factotry(local_dir=tmp_path, results=cache)
+    store = factory("local", "docs", "db", embeddings)
+    assert isinstance(store, CachedVectorStore)
+    store.add_texts(["10 0", "20 0"])
+    assert store.similarity_search("12 0", k=1)[0].page_content == "10 0"
+
+    # A write through another handle invalidates the first one's results
+    factory("local", "docs", "db", embeddings).add_texts(["12 0"])
+    assert store.similarity_search("12 0", k=1)[0].page_content == "12 0"
+    store.save()
+    assert LocalVectorStore.exists(tmp_path / "db" / "docs")
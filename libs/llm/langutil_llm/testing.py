@@ -0,0 +1,225 @@
+"""Local stand-in for an OpenAI-compatible server, for tests and benchmarks."""
+
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Self
+
+import numpy as np
+
+
+class _InjectedFailure(Exception):
+    def __init__(self, status: int) -> None:
+        super().__init__("injected failure")
+        self.status = status
+
+
+class FakeOpenAIServer:
+    """Serve ``POST /v1/embeddings`` with deterministic vectors (cut to the
+    requested ``dimensions``) and ``POST /v1/chat/completions`` with the text
+    returned by ``reply``.
+
+    Every request sleeps ``latency`` seconds first. Requests for which
+    ``fail`` returns ``True`` get a 500 response, or the status code it
+    returns instead, telling OpenAI clients not to retry it. The inputs of each
+    embeddings request are recorded in ``requests``, the messages of each
+    chat request in ``completions``.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        dim: int = 8,
+        fail: Callable[[list[str]], bool | int] | None = None,
+        reply: Callable[[list[dict[str, Any]]], str] | None = None,
+    ) -> None:
+        self.latency = latency
+        self.dim = dim
+        self.fail = fail
+        self.reply = reply
+        self.requests: list[list[str]] = []
+        self.completions: list[list[dict[str, Any]]] = []
+        self.__lock = threading.Lock()
+        self.__server = ThreadingHTTPServer(("127.0.0.1", 0), self.__handler())
+        self.__server.daemon_threads = True
+        self.__thread = threading.Thread(
+            target=self.__server.serve_forever, daemon=True
+        )
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self) -> Self:
+        self.__thread.start()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def vector(self, text: str) -> np.ndarray:
+        """The embedding the server returns for ``text``."""
+        seed = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest())
+        return np.random.default_rng(seed).standard_normal(self.dim, dtype=np.float32)
+
+    def embeddings(self, body: dict[str, Any]) -> dict[str, Any]:
+        inputs = body["input"]
+        inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+        with self.__lock:
+            self.requests.append(inputs)
+        self.__inject(inputs)
+
+        data = []
+        for i, text in enumerate(inputs):
+            vector = self.vector(str(text))[: body.get("dimensions")]
+            embedding: Any = (
+                base64.b64encode(vector.tobytes()).decode()
+                if body.get("encoding_format") == "base64"
+                else vector.tolist()
+            )
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        tokens = sum(len(str(t)) // 4 + 1 for t in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", ""),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    def chat_completions(self, body: dict[str, Any]) -> dict[str, Any]:
+        messages = body["messages"]
+        with self.__lock:
+            self.completions.append(messages)
+        prompts = [str(m.get("content", "")) for m in messages]
+        self.__inject(prompts)
+
+        content = "{}" if self.reply is None else self.reply(messages)
+        prompt_tokens = sum(len(p) // 4 + 1 for p in prompts)
+        completion_tokens = len(content) // 4 + 1
+        return {
+            "id": f"chatcmpl-{len(self.completions)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", ""),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def __inject(self, inputs: list[str]) -> None:
+        status = False if self.fail is None else self.fail(inputs)
+        if status:
+            raise _InjectedFailure(500 if status is True else status)
+
+    def __handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+        routes = {
+            "/v1/embeddings": self.embeddings,
+            "/v1/chat/completions": self.chat_completions,
+        }
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this, delayed
+            # ACKs add ~40ms to every keep-alive response.
+            disable_nagle_algorithm = True
+
+            def do_POST(self) -> None:
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                time.sleep(server.latency)
+                route = routes.get(self.path)
+                try:
+                    if route is None:
+                        status, payload = 404, {"error": {"message": "not found"}}
+                    else:
+                        status, payload = 200, route(body)
+                except _InjectedFailure as e:
+                    status, payload = e.status, {"error": {"message": str(e)}}
+                except Exception as e:
+                    status, payload = 500, {"error": {"message": str(e)}}
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                if status >= 400:
+                    self.send_header("x-should-retry", "false")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        return Handler
+
+
+class FakeMilvusServer:
+    """Local stand-in for Milvus servers as seen by ``MilvusPool``.
+
+    ``connect(uri, database, alias)`` opens a ``FakeMilvusClient`` unless the
+    server is ``down``. As in pymilvus, clients of one alias share its
+    channel: closing any of them closes them all. Clients answer
+    ``get_server_version`` after ``latency`` seconds until they are closed,
+    dropped or the server goes down.
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.down = False
+        self.clients: list[FakeMilvusClient] = []
+        self.aliases: set[str] = set()
+
+    @property
+    def connections(self) -> int:
+        """The number of open clients."""
+        return sum(not c.closed for c in self.clients)
+
+    def connect(
+        self, uri: str, database: str, alias: str = "default"
+    ) -> "FakeMilvusClient":
+        if self.down:
+            raise ConnectionError(f"cannot connect to {uri}")
+        self.aliases.add(alias)
+        client = FakeMilvusClient(self, uri, database, alias)
+        self.clients.append(client)
+        return client
+
+
+class FakeMilvusClient:
+    def __init__(
+        self, server: FakeMilvusServer, uri: str, database: str, alias: str
+    ) -> None:
+        self.server = server
+        self.uri = uri
+        self.database = database
+        self.alias = alias
+        self.dropped = False
+        self.pings = 0
+
+    @property
+    def closed(self) -> bool:
+        return self.alias not in self.server.aliases
+
+    def get_server_version(self) -> str:
+        time.sleep(self.server.latency)
+        self.pings += 1
+        if self.closed or self.dropped or self.server.down:
+            raise ConnectionError("connection lost")
+        return "v2.6.3"
+
+    def close(self) -> None:
+        self.server.aliases.discard(self.alias)
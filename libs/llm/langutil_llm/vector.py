@@ -1,21 +1,440 @@
-from typing import Literal
+import itertools
+import logging
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from collections.abc import Callable, Mapping
+from pathlib import Path
+from typing import Any, Literal, NamedTuple
 
-from cachetools import TTLCache, cached
 from langchain_core.embeddings import Embeddings
-from langchain_milvus.vectorstores.milvus import Milvus
+from langchain_core.vectorstores import VectorStore
+from langutil_infra import ShardedCache, TTICache
+from langutil_infra.stats import cached
 
-VectorProvider = Literal["milvus"]
+from .local_vector import LocalStoreView, LocalVectorStore
+from .search_cache import CachedVectorStore, SearchCache
 
+logger = logging.getLogger(__name__)
 
-def provider_factotry(maxsize: int = 10, ttl: float = 360):
-    cache = TTLCache(maxsize=maxsize, ttl=ttl)
+VectorProvider = Literal["milvus", "local"]
+Connect = Callable[[str, str, str], Any]
 
-    def cache_key(
-        provider, name, database, host="localhost", port=19530, *args, **kwargs
-    ) -> str:
-        return f"{provider}_{name}_{database}_{host}_{port}"
 
-    @cached(cache, key=cache_key)
+class SearchParams(NamedTuple):
+    """How a collection is indexed and searched.
+
+    ``metric`` is a Milvus metric type (``"L2"``, ``"IP"`` or ``"COSINE"``).
+    ``ef`` is the HNSW candidate list of a search and ``nprobe`` the IVF
+    clusters probed: larger values trade latency for recall. ``m``,
+    ``ef_construction`` and ``nlist`` only apply when a collection is
+    created; existing collections keep the index they were built with.
+    """
+
+    metric: str = "L2"
+    index_type: str = "HNSW"
+    ef: int = 250
+    nprobe: int = 16
+    m: int = 8
+    ef_construction: int = 64
+    nlist: int = 128
+
+    def milvus_search(self) -> dict[str, Any]:
+        """``search_params`` of a Milvus collection."""
+        if self.index_type == "HNSW":
+            params = {"ef": self.ef}
+        elif self.index_type.startswith("IVF"):
+            params = {"nprobe": self.nprobe}
+        else:
+            params = {}
+        return {"metric_type": self.metric, "params": params}
+
+    def milvus_index(self) -> dict[str, Any]:
+        """``index_params`` of a Milvus collection."""
+        if self.index_type == "HNSW":
+            params = {"M": self.m, "efConstruction": self.ef_construction}
+        elif self.index_type.startswith("IVF"):
+            params = {"nlist": self.nlist}
+        else:
+            params = {}
+        return {
+            "metric_type": self.metric,
+            "index_type": self.index_type,
+            "params": params,
+        }
+
+    def local(self) -> dict[str, Any]:
+        """``LocalVectorStore`` arguments. Local stores search exactly unless
+        ``build_index()`` is called; ``"FLAT"`` keeps them exact even then."""
+        metric = {"L2": "l2", "COSINE": "cosine"}.get(self.metric.upper())
+        if metric is None:
+            raise ValueError(f"local stores do not support metric {self.metric!r}")
+        if self.index_type not in ("HNSW", "FLAT"):
+            raise ValueError(
+                f"local stores do not support index type {self.index_type!r}"
+            )
+        kwargs: dict[str, Any] = {
+            "metric": metric,
+            "m": self.m,
+            "ef_construction": self.ef_construction,
+            "ef_search": self.ef,
+        }
+        if self.index_type == "FLAT":
+            kwargs["hnsw_threshold"] = sys.maxsize
+        return kwargs
+
+
+def _connect(uri: str, database: str, alias: str) -> Any:
+    from pymilvus import MilvusClient
+
+    # pymilvus shares one channel among the clients of an alias, and closing
+    # any of them removes it. Each pooled connection has an alias of its own,
+    # so retiring one never cuts off its replacement; the stores opened on it
+    # pass the same alias to reuse its channel.
+    return MilvusClient(uri=uri, db_name=database, alias=alias)
+
+
+# Unique across pools, as pymilvus aliases are process-wide
+_connection_ids = itertools.count()
+
+
+def _alias(id: int) -> str:
+    return f"langutil-{id}"
+
+
+class PooledConnection:
+    """One open connection of a ``MilvusPool``, bound to a database and
+    registered with pymilvus as ``alias``. ``handles`` counts the live
+    collection handles opened on it."""
+
+    __slots__ = ("checked", "client", "database", "handles", "id", "uri")
+
+    def __init__(self, id: int, uri: str, database: str, client: Any, now: float):
+        self.id = id
+        self.uri = uri
+        self.database = database
+        self.client = client
+        self.checked = now
+        self.handles = 0
+
+    @property
+    def alias(self) -> str:
+        return _alias(self.id)
+
+
+class _Host:
+    __slots__ = (
+        "acquires",
+        "connections",
+        "connects",
+        "evictions",
+        "failures",
+        "latency",
+        "lock",
+        "retired",
+    )
+
+    def __init__(self) -> None:
+        # Reentrant: handles can be collected, and release their connection,
+        # while this thread holds the lock
+        self.lock = threading.RLock()
+        self.connections: OrderedDict[str, PooledConnection] = OrderedDict()
+        self.retired: set[PooledConnection] = set()
+        self.acquires = 0
+        self.connects = 0
+        self.evictions = 0
+        self.failures = 0
+        self.latency = 0.0
+
+
+class MilvusPool:
+    """Milvus connections shared by every collection handle of a process.
+
+    Each host keeps at most ``max_connections`` connections, one per
+    database, and retires the least recently used one beyond that. The pool
+    outlives the handles built on it, so expiring a handle never drops its
+    connection. Before a connection idle for ``health_interval`` seconds is
+    reused it is pinged; a connection failing the ping is retired and opened
+    again. A retired connection is no longer handed out, and is closed once
+    the handles registered on it with ``hold`` are gone, as closing a client
+    disconnects every handle sharing its channel. ``connect(uri, database,
+    alias)`` opens a client registered under ``alias``, with
+    ``get_server_version()`` and ``close()`` methods.
+    """
+
+    def __init__(
+        self,
+        connect: Connect = _connect,
+        max_connections: int = 16,
+        health_interval: float = 30.0,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_connections < 1:
+            raise ValueError("max_connections must be a positive integer")
+        self.connect = connect
+        self.max_connections = max_connections
+        self.health_interval = health_interval
+        self.timer = timer
+        self.__lock = threading.Lock()
+        self.__hosts: dict[str, _Host] = {}
+
+    def acquire(
+        self, host: str = "localhost", port: int = 19530, database: str = ""
+    ) -> PooledConnection:
+        """A healthy connection to ``database`` on ``host:port``."""
+        uri = f"http://{host}:{port}"
+        state = self.__host(uri)
+        with state.lock:
+            state.acquires += 1
+            connection = state.connections.get(database)
+            if connection is not None:
+                state.connections.move_to_end(database)
+                if self.timer() - connection.checked < self.health_interval:
+                    return connection
+                if self.__ping(state, connection) is None:
+                    return connection
+                self.__close(state, connection)
+
+            while len(state.connections) >= self.max_connections:
+                _, evicted = state.connections.popitem(last=False)
+                logger.info(
+                    "Closing idle Milvus connection %s/%s", uri, evicted.database
+                )
+                state.evictions += 1
+                self.__close(state, evicted)
+
+            id = next(_connection_ids)
+            client = self.connect(uri, database, _alias(id))
+            state.connects += 1
+            connection = PooledConnection(id, uri, database, client, self.timer())
+            state.connections[database] = connection
+            return connection
+
+    def hold(self, connection: PooledConnection, handle: Any) -> None:
+        """Keep ``connection`` open for as long as ``handle`` is alive."""
+        state = self.__host(connection.uri)
+        with state.lock:
+            try:
+                weakref.finalize(handle, self.__release, state, connection)
+            except TypeError:
+                return  # not weakly referenceable, so never tracked
+            connection.handles += 1
+
+    def check(self) -> dict[str, dict[str, Any]]:
+        """Ping every connection, closing the failing ones. Returns the
+        health of each connection keyed by ``"<uri>/<database>"``."""
+        report = {}
+        for uri, state in self.__states():
+            with state.lock:
+                for connection in list(state.connections.values()):
+                    start = time.perf_counter()
+                    error = self.__ping(state, connection)
+                    report[f"{uri}/{connection.database}"] = {
+                        "healthy": error is None,
+                        "latency": time.perf_counter() - start,
+                        "error": None if error is None else repr(error),
+                    }
+                    if error is not None:
+                        self.__close(state, connection)
+        return report
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Utilization of the pool, keyed by host uri."""
+        return {
+            uri: {
+                "connections": len(state.connections),
+                "max_connections": self.max_connections,
+                "utilization": len(state.connections) / self.max_connections,
+                "acquires": state.acquires,
+                "connects": state.connects,
+                "reuse_ratio": 1 - state.connects / state.acquires
+                if state.acquires
+                else 0.0,
+                "evictions": state.evictions,
+                "retired": len(state.retired),
+                "health_failures": state.failures,
+                "ping_latency": state.latency,
+            }
+            for uri, state in self.__states()
+        }
+
+    def close(self) -> None:
+        """Close every connection, including those still held by handles."""
+        for _, state in self.__states():
+            with state.lock:
+                for connection in [*state.connections.values(), *state.retired]:
+                    connection.handles = 0
+                    self.__close(state, connection)
+
+    def __host(self, uri: str) -> _Host:
+        with self.__lock:
+            state = self.__hosts.get(uri)
+            if state is None:
+                state = self.__hosts[uri] = _Host()
+            return state
+
+    def __states(self) -> list[tuple[str, _Host]]:
+        with self.__lock:
+            return list(self.__hosts.items())
+
+    def __ping(self, state: _Host, connection: PooledConnection) -> Exception | None:
+        start = time.perf_counter()
+        try:
+            connection.client.get_server_version()
+        except Exception as e:
+            logger.warning(
+                "Milvus connection %s/%s failed its health check: %r",
+                connection.uri,
+                connection.database,
+                e,
+            )
+            state.failures += 1
+            return e
+        state.latency = time.perf_counter() - start
+        connection.checked = self.timer()
+        return None
+
+    def __release(self, state: _Host, connection: PooledConnection) -> None:
+        with state.lock:
+            connection.handles -= 1
+            if connection in state.retired:
+                self.__close(state, connection)
+
+    def __close(self, state: _Host, connection: PooledConnection) -> None:
+        """Retire ``connection``, closing it unless handles still use it."""
+        if state.connections.get(connection.database) is connection:
+            del state.connections[connection.database]
+        if connection.handles > 0:
+            state.retired.add(connection)
+            return
+        state.retired.discard(connection)
+        try:
+            connection.client.close()
+        except Exception:
+            logger.debug("Error closing a Milvus connection", exc_info=True)
+
+
+# Connections are process-wide: every factory shares them.
+_pool = MilvusPool()
+
+
+def milvus_pool() -> MilvusPool:
+    """The connection pool shared by the vector stores of this process."""
+    return _pool
+
+
+def _milvus_store(
+    connection: PooledConnection,
+    name: str,
+    embeddings: Embeddings,
+    description: str | None,
+    params: SearchParams,
+) -> VectorStore:
+    from langchain_milvus.vectorstores.milvus import Milvus
+
+    return Milvus(
+        embedding_function=embeddings,
+        collection_name=name,
+        collection_description=description,
+        connection_args={
+            "uri": connection.uri,
+            "db_name": connection.database,
+            "alias": connection.alias,
+        },
+        enable_dynamic_field=True,
+        auto_id=True,
+        index_params=params.milvus_index(),
+        search_params=params.milvus_search(),
+    )
+
+
+# Local stores hold their data, so they live as long as the process
+_local_stores: ShardedCache[tuple[str, str, str], LocalVectorStore] = ShardedCache(
+    dict, shards=4
+)
+
+
+def local_store(
+    name: str,
+    database: str,
+    embeddings: Embeddings,
+    local_dir: str | Path | None = None,
+    params: SearchParams | None = None,
+) -> LocalVectorStore | LocalStoreView:
+    """The process-wide ``LocalVectorStore`` of ``database``/``name``. Under a
+    ``local_dir`` it is loaded from, and saved by ``save()`` to,
+    ``local_dir/database/name``.
+
+    ``params`` configure a new store; an existing one must have been built
+    with the same metric. Searching with another ``ef`` than the store's
+    goes through a view of it (``with_ef``), so handles never change the
+    settings of each other."""
+    path = Path(local_dir, database, name) if local_dir is not None else None
+    kwargs = (params or SearchParams()).local()
+
+    def open_local() -> LocalVectorStore:
+        if path is not None and LocalVectorStore.exists(path):
+            return LocalVectorStore.load(path, embeddings)
+        return LocalVectorStore(embeddings, path=path, **kwargs)
+
+    store = _local_stores.get_or_compute((str(path), database, name), open_local)
+    if store.metric != kwargs["metric"]:
+        raise ValueError(
+            f"local collection {database}/{name} uses the {store.metric} metric, "
+            f"not {kwargs['metric']}"
+        )
+    return store.with_ef(kwargs["ef_search"])
+
+
+def provider_factotry(
+    maxsize: int = 256,
+    ttl: float = 3600,
+    pool: MilvusPool | None = None,
+    local_dir: str | Path | None = None,
+    search: Mapping[str, SearchParams] | None = None,
+    results: SearchCache | None = None,
+):
+    """Build a cached factory of collection handles.
+
+    Milvus handles are created on demand and dropped after ``ttl`` idle
+    seconds; they are cheap because every handle of a host and database
+    shares one connection of ``pool`` (``milvus_pool()`` by default).
+    ``"local"`` collections are in-process ``LocalVectorStore``s, persisted
+    under ``local_dir`` when it is set; ``host`` and ``port`` are ignored.
+
+    A collection is searched with the ``params`` passed to the factory, else
+    with ``search[name]``, else with the default ``SearchParams()``.
+
+    With a ``results`` cache, handles are ``CachedVectorStore``s sharing it:
+    repeated searches are served from the cache until a write through any
+    handle of the collection invalidates its results.
+    """
+    cache = TTICache(maxsize=maxsize, ttl=ttl)
+    pool = pool or milvus_pool()
+    search = search or {}
+
+    # Keyed by connection: a handle stays on the connection it was opened
+    # on, which the pool keeps open until the handle is gone
+    def cache_key(name, connection, _embeddings, _description, params) -> tuple:
+        return ("milvus", name, connection.id, params)
+
+    @cached(cache, key=cache_key, name="langutil_llm.vector.provider_factotry")
+    def milvus_store(
+        name: str,
+        connection: PooledConnection,
+        embeddings: Embeddings,
+        description: str | None,
+        params: SearchParams,
+    ):
+        store = _milvus_store(connection, name, embeddings, description, params)
+        pool.hold(connection, store)
+        if results is None:
+            return store
+        collection = f"milvus:{connection.uri}/{connection.database}/{name}"
+        return CachedVectorStore(store, results, collection, repr(params))
+
     def factory(
         provider: VectorProvider,
         name: str,
@@ -24,23 +443,20 @@ def provider_factotry(maxsize: int = 10, ttl: float = 360):
         description: str | None = "",
         host: str | None = "localhost",
         port: int | None = 19530,
+        params: SearchParams | None = None,
     ):
+        params = params or search.get(name) or SearchParams()
         match provider:
             case "milvus":
-                return Milvus(
-                    embedding_function=embeddings,
-                    collection_name=name,
-                    collection_description=description,
-                    connection_args={
-                        "uri": f"http://{host}:{port}",
-                        "host": host,
-                        "port": port,
-                        "db_name": database,
-                    },
-                    enable_dynamic_field=True,
-                    auto_id=True,
-                    search_params={"metric_type": "L2", "params": {"ef": 250}},
-                )
+                # Also keeps the connection of a cached handle open and healthy
+                connection = pool.acquire(host or "localhost", port or 19530, database)
+                return milvus_store(name, connection, embeddings, description, params)
+            case "local":
+                store = local_store(name, database, embeddings, local_dir, params)
+                if results is None:
+                    return store
+                collection = f"local:{local_dir}/{database}/{name}"
+                return CachedVectorStore(store, results, collection, repr(params))
             case _:
                 ...
 
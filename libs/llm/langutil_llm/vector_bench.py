@@ -0,0 +1,174 @@
+"""Recall@k against p50/p99 search latency of a vector collection for each
+``ef``, with exact brute-force neighbors as ground truth, to pick the
+cheapest ``ef`` meeting a recall target.
+
+The collection is filled with random vectors through the vector factory and
+searched once per ``ef`` with ``SearchParams(ef=...)``. The default provider
+is an in-process ``local`` store; ``--provider milvus --host ... --port ...``
+measures a server, creating (and then dropping) the collection ``--name``.
+Run with ``python -m langutil_llm.vector_bench [--efs 16 32 64 128 250]``.
+"""
+
+import argparse
+import statistics
+import time
+from collections.abc import Sequence
+from typing import Any
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.vectorstores import VectorStore
+
+from .vector import SearchParams, provider_factotry
+
+
+def exact_neighbors(
+    vectors: np.ndarray, queries: np.ndarray, k: int, metric: str = "L2"
+) -> np.ndarray:
+    """Rows of the ``k`` nearest ``vectors`` of each query, nearest first."""
+    if metric.upper() == "COSINE":
+        vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    if metric.upper() == "L2":
+        # |v|^2 - 2 q.v ranks like |v - q|^2
+        distances = (vectors**2).sum(axis=1) - 2 * queries @ vectors.T
+    else:
+        distances = -queries @ vectors.T
+    nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(distances, nearest, axis=1).argsort(axis=1)
+    return np.take_along_axis(nearest, order, axis=1)
+
+
+def evaluate(
+    store: VectorStore, queries: np.ndarray, truth: np.ndarray, k: int
+) -> dict[str, float]:
+    """Recall@k and latency of ``store``, whose documents carry their row
+    in the ``"i"`` metadata field."""
+    latencies = []
+    recall = []
+    for query, expected in zip(queries.tolist(), truth.tolist(), strict=True):
+        start = time.perf_counter()
+        docs = store.similarity_search_by_vector(query, k=k)
+        latencies.append(time.perf_counter() - start)
+        found = {doc.metadata["i"] for doc in docs}
+        recall.append(len(found.intersection(expected)) / k)
+    latencies.sort()
+    return {
+        "recall": statistics.fmean(recall),
+        "p50_ms": statistics.median(latencies) * 1e3,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1e3,
+        "qps": len(latencies) / sum(latencies),
+    }
+
+
+def sweep(
+    open_store: Any,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    efs: Sequence[int],
+    metric: str = "L2",
+) -> list[dict[str, Any]]:
+    """Fill the store returned by ``open_store(SearchParams)`` with
+    ``vectors``, then evaluate it once per ``ef``. The first row, with an
+    ``ef`` of None, is the latency of brute force in numpy."""
+    truth = exact_neighbors(vectors, queries, k, metric)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        exact_neighbors(vectors, query[None], k, metric)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    rows: list[dict[str, Any]] = [
+        {
+            "ef": None,
+            "recall": 1.0,
+            "p50_ms": statistics.median(latencies) * 1e3,
+            "p99_ms": latencies[int(len(latencies) * 0.99)] * 1e3,
+            "qps": len(latencies) / sum(latencies),
+        }
+    ]
+
+    store = open_store(SearchParams(metric=metric))
+    batch = 1000
+    for i in range(0, len(vectors), batch):
+        ids = range(i, min(i + batch, len(vectors)))
+        store.add_embeddings(
+            texts=[str(row) for row in ids],
+            embeddings=vectors[i : i + batch].tolist(),
+            metadatas=[{"i": row} for row in ids],
+        )
+    build_index = getattr(store, "build_index", None)
+    if build_index is not None:
+        build_index()  # local stores only search through an index on request
+    for ef in efs:
+        store = open_store(SearchParams(metric=metric, ef=ef))
+        store.similarity_search_by_vector(queries[0].tolist(), k=k)  # warm up
+        rows.append({"ef": ef, **evaluate(store, queries, truth, k)})
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--provider", choices=["local", "milvus"], default="local")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=19530)
+    parser.add_argument("--database", default="default")
+    parser.add_argument("--name", default="langutil_vector_bench")
+    parser.add_argument("--metric", default="L2", choices=["L2", "COSINE", "IP"])
+    parser.add_argument("--vectors", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=32)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--efs", type=int, nargs="+", default=[16, 32, 64, 128, 250])
+    parser.add_argument("--target", type=float, default=0.95, help="recall@k")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.vectors, args.dim), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    embeddings = DeterministicFakeEmbedding(size=args.dim)
+    factory = provider_factotry()
+
+    def open_store(params: SearchParams) -> VectorStore:
+        return factory(
+            args.provider,
+            args.name,
+            args.database,
+            embeddings,
+            host=args.host,
+            port=args.port,
+            params=params,
+        )
+
+    start = time.perf_counter()
+    try:
+        rows = sweep(open_store, vectors, queries, args.k, args.efs, args.metric)
+    finally:
+        if args.provider == "milvus":
+            open_store(SearchParams(metric=args.metric)).client.drop_collection(
+                args.name
+            )
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{args.provider}: {args.vectors} x {args.dim} {args.metric}, "
+        f"{args.queries} queries, k={args.k} ({elapsed:.1f}s with the build)"
+    )
+    print(f"{'ef':>6} {f'recall@{args.k}':>10} {'p50 ms':>8} {'p99 ms':>8} {'qps':>8}")
+    for row in rows:
+        ef = "exact" if row["ef"] is None else str(row["ef"])
+        print(
+            f"{ef:>6} {row['recall']:10.3f} {row['p50_ms']:8.2f} "
+            f"{row['p99_ms']:8.2f} {row['qps']:8.0f}"
+        )
+    meeting = [row for row in rows[1:] if row["recall"] >= args.target]
+    if meeting:
+        best = min(meeting, key=lambda row: row["ef"])
+        print(f"\ncheapest ef with recall@{args.k} >= {args.target}: {best['ef']}")
+    else:
+        print(f"\nno ef reaches recall@{args.k} >= {args.target}")
+
+
+if __name__ == "__main__":
+    main()
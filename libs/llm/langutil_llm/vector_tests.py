@@ -0,0 +1,243 @@
+import gc
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from langutil_llm import vector
+from langutil_llm.testing import FakeMilvusServer
+from langutil_llm.vector import MilvusPool, SearchParams, provider_factotry
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_pool_shares_connections():
+    server = FakeMilvusServer()
+    pool = MilvusPool(server.connect)
+    first = pool.acquire("milvus", 19530, "tenant")
+    assert pool.acquire("milvus", 19530, "tenant") is first
+    assert (first.uri, first.database) == ("http://milvus:19530", "tenant")
+    pool.acquire("milvus", 19530, "other")
+    assert server.connections == 2
+
+    stats = pool.stats()["http://milvus:19530"]
+    assert stats["connections"] == 2
+    assert stats["acquires"] == 3
+    assert stats["connects"] == 2
+    assert stats["utilization"] == 2 / 16
+
+    pool.close()
+    assert server.connections == 0
+
+
+def test_pool_bounded_per_host():
+    server = FakeMilvusServer()
+    pool = MilvusPool(server.connect, max_connections=2)
+    a = pool.acquire("h1", 1, "a")
+    pool.acquire("h1", 1, "b")
+    pool.acquire("h1", 1, "a")
+    pool.acquire("h1", 1, "c")  # evicts b, the least recently used
+    pool.acquire("h2", 1, "b")
+    assert pool.acquire("h1", 1, "a") is a
+    assert [(c.uri, c.database) for c in server.clients if c.closed] == [
+        ("http://h1:1", "b")
+    ]
+    assert pool.stats()["http://h1:1"]["evictions"] == 1
+    assert pool.stats()["http://h2:1"]["connections"] == 1
+
+    with pytest.raises(ValueError):
+        MilvusPool(server.connect, max_connections=0)
+
+
+def test_pool_health_checks():
+    server = FakeMilvusServer()
+    clock = Clock()
+    pool = MilvusPool(server.connect, health_interval=30, timer=clock)
+    first = pool.acquire("h", 1, "db")
+    first.client.dropped = True
+
+    # Checked recently: reused without a ping
+    clock.now = 10
+    assert pool.acquire("h", 1, "db") is first
+    assert first.client.pings == 0
+
+    # Idle too long: pinged, found broken and reopened
+    clock.now = 45
+    second = pool.acquire("h", 1, "db")
+    assert second is not first
+    assert first.client.closed
+    assert pool.stats()["http://h:1"]["health_failures"] == 1
+
+    report = pool.check()
+    assert report["http://h:1/db"]["healthy"]
+    server.down = True
+    report = pool.check()
+    assert not report["http://h:1/db"]["healthy"]
+    assert "connection lost" in report["http://h:1/db"]["error"]
+    assert pool.stats()["http://h:1"]["connections"] == 0
+    with pytest.raises(ConnectionError):
+        pool.acquire("h", 1, "db")
+
+
+def test_pool_replacement_survives_its_predecessor():
+    class Handle:
+        pass
+
+    server = FakeMilvusServer()
+    clock = Clock()
+    pool = MilvusPool(server.connect, health_interval=30, timer=clock)
+    old = pool.acquire("h", 1, "db")
+    handle = Handle()
+    pool.hold(old, handle)
+
+    old.client.dropped = True
+    clock.now = 60
+    new = pool.acquire("h", 1, "db")
+    assert new is not old
+    assert new.alias != old.alias
+    assert not old.client.closed
+
+    # Closing the retired client must not disconnect its replacement
+    del handle
+    gc.collect()
+    assert old.client.closed
+    assert new.client.get_server_version()
+    assert pool.check()["http://h:1/db"]["healthy"]
+
+
+def test_factory_handles_share_the_pool(monkeypatch):
+    opened = []
+
+    def store(connection, name, _embeddings, _description, _params):
+        opened.append((connection.uri, connection.database, name))
+        return object()
+
+    monkeypatch.setattr(vector, "_milvus_store", store)
+    server = FakeMilvusServer()
+    pool = MilvusPool(server.connect)
+    factory = provider_factotry(maxsize=4, pool=pool)
+
+    handles = [factory("milvus", f"c{i}", "tenant", None) for i in range(8)]
+    assert factory("milvus", "c7", "tenant", None) is handles[7]
+    assert len(opened) == 8
+    assert server.connections == 1
+
+    # Handles expired from the factory cache are reopened on the same connection
+    factory("milvus", "c0", "tenant", None)
+    assert len(opened) == 9
+    assert server.connections == 1
+    assert len(server.clients) == 1
+
+
+def test_factory_connections_outlive_their_handles(monkeypatch):
+    class Store:
+        def __init__(self, connection) -> None:
+            self.client = connection.client
+
+    monkeypatch.setattr(
+        vector, "_milvus_store", lambda connection, *_args: Store(connection)
+    )
+    server = FakeMilvusServer()
+    clock = Clock()
+    pool = MilvusPool(server.connect, max_connections=1, timer=clock)
+    factory = provider_factotry(maxsize=1, pool=pool)
+
+    a = factory("milvus", "docs", "a", None)
+    factory("milvus", "docs", "b", None)  # evicts the connection of a
+    assert not a.client.closed
+    assert pool.stats()["http://localhost:19530"]["retired"] == 1
+
+    # A broken connection is replaced, but stays open for its handles
+    b = factory("milvus", "docs", "b", None)
+    b.client.dropped = True
+    clock.now = 60
+    fresh = factory("milvus", "docs", "b", None)
+    assert fresh is not b
+    assert fresh.client is not b.client
+    assert not b.client.closed
+
+    client = a.client
+    del a
+    gc.collect()
+    assert client.closed
+    assert not b.client.closed
+    client = b.client
+    del b
+    gc.collect()
+    assert client.closed
+    assert server.connections == 1
+    assert pool.stats()["http://localhost:19530"]["retired"] == 0
+
+
+def test_search_params():
+    default = SearchParams()
+    assert default.milvus_search() == {"metric_type": "L2", "params": {"ef": 250}}
+    assert default.milvus_index() == {
+        "metric_type": "L2",
+        "index_type": "HNSW",
+        "params": {"M": 8, "efConstruction": 64},
+    }
+    ivf = SearchParams(metric="IP", index_type="IVF_FLAT", nprobe=8)
+    assert ivf.milvus_search() == {"metric_type": "IP", "params": {"nprobe": 8}}
+    assert ivf.milvus_index()["params"] == {"nlist": 128}
+
+    assert SearchParams(metric="COSINE", ef=32).local()["metric"] == "cosine"
+    assert SearchParams(index_type="FLAT").local()["hnsw_threshold"] > 10**9
+    with pytest.raises(ValueError, match="metric"):
+        ivf.local()
+
+
+def test_factory_search_params_per_collection(monkeypatch):
+    opened = []
+
+    def store(_connection, name, _embeddings, _description, params):
+        opened.append((name, params))
+        return object()
+
+    monkeypatch.setattr(vector, "_milvus_store", store)
+    fast = SearchParams(ef=32)
+    factory = provider_factotry(
+        pool=MilvusPool(FakeMilvusServer().connect), search={"faq": fast}
+    )
+    faq = factory("milvus", "faq", "db", None)
+    factory("milvus", "docs", "db", None)
+    assert opened == [("faq", fast), ("docs", SearchParams())]
+
+    # Each setting gets its own handle
+    assert factory("milvus", "faq", "db", None) is faq
+    assert factory("milvus", "faq", "db", None, params=SearchParams()) is not faq
+    assert opened[-1] == ("faq", SearchParams())
+
+
+def test_factory_local_search_params(monkeypatch):
+    embeddings = DeterministicFakeEmbedding(size=4)
+    factory = provider_factotry(search={"cos": SearchParams(metric="COSINE")})
+    store = factory("local", "cos", "search_params", embeddings)
+    assert (store.metric, store.ef_search) == ("cosine", 250)
+
+    # Another ef gets its own handle on the same data, leaving the store as is
+    params = SearchParams(metric="COSINE", ef=16)
+    fast = factory("local", "cos", "search_params", embeddings, params=params)
+    assert fast is not store
+    assert factory("local", "cos", "search_params", embeddings, params=params) is fast
+    assert (fast.ef_search, store.ef_search) == (16, 250)
+    fast.add_texts(["a", "b"])
+    assert len(store) == 2
+    searched = []
+    search = store.similarity_search_with_score_by_vector
+    monkeypatch.setattr(
+        store,
+        "similarity_search_with_score_by_vector",
+        lambda *args, **kwargs: (
+            searched.append(kwargs["ef"]) or search(*args, **kwargs)
+        ),
+    )
+    assert fast.similarity_search("a", k=1)[0].page_content == "a"
+    assert searched == [16]
+    with pytest.raises(ValueError, match="cosine metric"):
+        factory("local", "cos", "search_params", embeddings, params=SearchParams())
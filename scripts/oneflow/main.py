@@ -9,6 +9,7 @@ import json
 
 DEFAULT_CODE = """from typing import Any
 from json_repair import repair_json
+import json
 from pyiter import it
 import requests
 import uuid
@@ -23,7 +24,11 @@ def parse_flow_output(data: dict[str, Any]) -> dict[str, Any]:
             lambda x: x["component_id"] == component_id
         )["message"]
 
-        parsed = repair_json(message, return_objects=True, skip_json_loads=False)
+        try:
+            # Most messages are already valid JSON; only repair the rest.
+            parsed = json.loads(message)
+        except ValueError:
+            parsed = repair_json(message, return_objects=True, skip_json_loads=True)
         if isinstance(parsed, dict):
             return parsed
     else: